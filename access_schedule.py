@@ -0,0 +1,146 @@
+"""
+Weekly access schedules for ESP32 MicroPython
+Each user gets a 168-bit hour-of-week bitmap, so an unlock check is one bit test
+"""
+
+from micropython import const
+import machine
+import time
+from flash_store import atomic_write
+
+HOURS_PER_WEEK = const(168)
+SCHEDULE_SIZE = const(21)  # 168 bits
+MAX_USERS = const(8)
+
+SCHEDULE_FILE = "schedules.bin"
+
+# Seconds between 1970-01-01 and 2000-01-01 (older ESP32 ports use a 2000 epoch)
+_EPOCH_2000 = const(946684800)
+_EPOCH_OFFSET = _EPOCH_2000 if time.gmtime(0)[0] == 2000 else 0
+
+# The RTC restarts at 2000-01-01 after power loss, anything earlier is unsynced
+_MIN_SYNCED_YEAR = const(2024)
+
+
+def hour_of_week(t=None):
+    """Hour index 0..167 with Monday 00:00 as hour 0"""
+    tm = time.localtime() if t is None else time.localtime(t)
+    return tm[6] * 24 + tm[3]
+
+
+def compile_schedule(windows):
+    """Compile (days_mask, start_hour, end_hour) windows into a bitmap
+
+    days_mask bit 0 is Monday, end_hour is exclusive (0..24).
+    """
+    bits = bytearray(SCHEDULE_SIZE)
+    for days, start, end in windows:
+        for day in range(7):
+            if days & (1 << day):
+                for hour in range(start, end):
+                    i = day * 24 + hour
+                    bits[i >> 3] |= 1 << (i & 7)
+    return bytes(bits)
+
+
+def set_rtc_time(unix_time, utc_offset_min=0):
+    """Set the RTC from a Unix timestamp, stored as local time"""
+    tm = time.gmtime(unix_time - _EPOCH_OFFSET + utc_offset_min * 60)
+    machine.RTC().datetime((tm[0], tm[1], tm[2], tm[6], tm[3], tm[4], tm[5], 0))
+
+
+def rtc_local_time():
+    """Current RTC time in seconds since 1970, in local time
+
+    Not a true Unix timestamp: set_rtc_time() stores local time, so this is
+    off by the UTC offset. Fine for intervals and for display next to it.
+    """
+    return time.time() + _EPOCH_OFFSET
+
+
+def clock_synced():
+    """True once the RTC has been set since the last power loss"""
+    return time.localtime()[0] >= _MIN_SYNCED_YEAR
+
+
+class AccessSchedule:
+    """Per-user hour-of-week bitmaps persisted as one compact binary file
+
+    File layout: 1 byte active-user mask followed by MAX_USERS * 21 bytes.
+    Users without a schedule have unrestricted access. Until the clock has
+    been set after a power loss the hour of week is unknown, so scheduled
+    users are denied (the admin PIN is never scheduled and can set it).
+    Changes stay in RAM until flush(), which the write-behind store runs
+    at idle points.
+    """
+
+    def __init__(self, path=SCHEDULE_FILE):
+        self._path = path
+        self._active = 0
+        self._bits = bytearray(MAX_USERS * SCHEDULE_SIZE)
+        self._dirty = False
+        self.load()
+
+    def allows(self, user_id, how=None):
+        """Check whether user_id may unlock at hour-of-week `how` (default: now)"""
+        if not self._active & (1 << user_id):
+            return True
+        if how is None:
+            if not clock_synced():
+                return False
+            how = hour_of_week()
+        return bool(self._bits[user_id * SCHEDULE_SIZE + (how >> 3)] & (1 << (how & 7)))
+
+    def get(self, user_id):
+        """Return the user's bitmap, or None when unrestricted"""
+        if not 0 <= user_id < MAX_USERS:
+            raise ValueError("user id")
+        if not self._active & (1 << user_id):
+            return None
+        start = user_id * SCHEDULE_SIZE
+        return bytes(self._bits[start:start + SCHEDULE_SIZE])
+
+    def set(self, user_id, blob):
+        """Install a 21-byte bitmap for user_id"""
+        if not 0 <= user_id < MAX_USERS:
+            raise ValueError("user id")
+        if len(blob) != SCHEDULE_SIZE:
+            raise ValueError("schedule size")
+        start = user_id * SCHEDULE_SIZE
+        self._bits[start:start + SCHEDULE_SIZE] = blob
+        self._active |= 1 << user_id
+        self._dirty = True
+
+    def clear(self, user_id):
+        """Remove the user's schedule (unrestricted access)"""
+        if not 0 <= user_id < MAX_USERS:
+            raise ValueError("user id")
+        start = user_id * SCHEDULE_SIZE
+        self._bits[start:start + SCHEDULE_SIZE] = bytes(SCHEDULE_SIZE)
+        self._active &= ~(1 << user_id)
+        self._dirty = True
+
+    def load(self):
+        try:
+            with open(self._path, 'rb') as f:
+                data = f.read()
+            if len(data) == 1 + len(self._bits):
+                self._active = data[0]
+                self._bits[:] = data[1:]
+        except OSError:
+            pass
+
+    def dirty(self):
+        return self._dirty
+
+    def flush(self):
+        """Persist pending changes; no flash access when nothing changed"""
+        if not self._dirty:
+            return True
+        try:
+            atomic_write(self._path, bytes((self._active,)) + self._bits)
+            self._dirty = False
+            return True
+        except Exception as e:
+            print(f"Schedule: Save error: {e}")
+            return False
@@ -0,0 +1,116 @@
+"""
+Usage-adaptive idle timeout for ESP32 MicroPython
+Picks the deep-sleep timeout with the lowest expected energy from a history of activity gaps
+"""
+
+from micropython import const
+import struct
+import time
+
+# Gap histogram bins: bin i holds gaps shorter than GAP_EDGES[i] seconds,
+# the last bin everything longer. GAP_MID is the gap assumed for each bin.
+GAP_EDGES = (2, 5, 10, 20, 30, 60, 120, 300, 600, 1800, 3600)
+GAP_MID = (1, 3, 7, 15, 25, 45, 90, 210, 450, 1200, 2700, 7200)
+BINS = const(12)
+
+# Contexts: 4 quarter-days x (after an unlock, anything else)
+CONTEXTS = const(8)
+
+# RTC region: last activity (uint32 s) + its context, then uint8 bin counts
+_HEAD = "<IB"
+_HEAD_SIZE = const(8)
+STATE_SIZE = _HEAD_SIZE + CONTEXTS * BINS
+
+# Energy model (mA / mAs), measure on your board and adjust
+IDLE_MA = 20.0     # Awake and idle: light-sleep naps + BLE advertising
+DEEP_MA = 0.15     # Deep sleep
+WAKE_MAS = 90.0    # Deep-sleep wake: ~1.5s boot at ~60mA
+
+MIN_SAMPLES = const(8)  # Below this, use the default timeout
+
+
+def expected_cost(counts, timeout, idle_ma=IDLE_MA, deep_ma=DEEP_MA, wake_mas=WAKE_MAS):
+    """Energy (mAs, unnormalised) of sleeping after timeout seconds idle"""
+    cost = 0.0
+    for count, gap in zip(counts, GAP_MID):
+        if not count:
+            continue
+        if gap <= timeout:
+            cost += count * idle_ma * gap  # Stayed awake, user came back
+        else:
+            cost += count * (idle_ma * timeout + deep_ma * (gap - timeout) + wake_mas)
+    return cost
+
+
+class AdaptiveIdle:
+    """Idle timeout chosen per context from gaps between user activity
+
+    state is a STATE_SIZE buffer (an rtc_state region) so the history and
+    the last activity time survive deep sleep; a gap that spans a deep
+    sleep is measured from the RTC clock on the next wake. Only idle
+    periods are recorded: a gap shorter than lo is a pause within one
+    session (key presses, commands), costs the same under every allowed
+    timeout and would only bury the real gaps. Counts are halved when one
+    saturates, so old habits fade.
+    """
+
+    def __init__(self, state, lo, hi, default, clock=time.time):
+        self._state = state
+        self._clock = clock
+        self.context = struct.unpack_from(_HEAD, state, 0)[1] % CONTEXTS
+        self.set_bounds(lo, hi, default)
+
+    def set_bounds(self, lo, hi, default):
+        """Fixed limits for the chosen timeout; default applies until history builds up"""
+        self.lo = lo
+        self.hi = max(lo, hi)
+        self.default = default
+        self._choose()
+
+    def activity(self, unlock=False):
+        """Record the idle period since the previous activity; returns the timeout"""
+        now = self._clock()
+        last, last_ctx = struct.unpack_from(_HEAD, self._state, 0)
+        gap = now - last
+        changed = False
+        if last and gap >= max(self.lo, 1):
+            self._record(last_ctx % CONTEXTS, gap)
+            changed = True
+        ctx = (now // 21600 % 4) * 2 + (1 if unlock else 0)
+        struct.pack_into(_HEAD, self._state, 0, now, ctx)
+        if changed or ctx != self.context:
+            self.context = ctx
+            self._choose()
+        return self.timeout
+
+    def _record(self, ctx, gap):
+        b = 0
+        while b < len(GAP_EDGES) and gap >= GAP_EDGES[b]:
+            b += 1
+        base = _HEAD_SIZE + ctx * BINS
+        if self._state[base + b] == 255:
+            for i in range(base, base + BINS):
+                self._state[i] >>= 1
+        self._state[base + b] += 1
+
+    def counts(self, ctx=None):
+        base = _HEAD_SIZE + (self.context if ctx is None else ctx) * BINS
+        return bytes(self._state[base:base + BINS])
+
+    def _choose(self):
+        counts = self.counts()
+        self.samples = sum(counts)
+        if self.samples < MIN_SAMPLES:
+            self.timeout = min(max(self.default, self.lo), self.hi)
+            return
+        best, best_cost = self.lo, None
+        for t in (self.lo,) + GAP_EDGES + (self.hi,):
+            if not self.lo <= t <= self.hi:
+                continue
+            cost = expected_cost(counts, t)
+            if best_cost is None or cost < best_cost:
+                best, best_cost = t, cost
+        self.timeout = best
+
+    def status(self):
+        return f"IDLE_TO:{self.timeout}s,CTX:{self.context},N:{self.samples}"
@@ -0,0 +1,175 @@
+"""
+Append-only audit log for ESP32 MicroPython
+Fixed-size packed records in a preallocated circular file, buffered in RAM
+"""
+
+from micropython import const
+import struct
+import time
+
+AUDIT_FILE = "audit.bin"
+AUDIT_CAPACITY = const(10240)  # records kept in flash (~80KB)
+AUDIT_BUFFER = const(32)       # records held in RAM between flushes
+
+# Record: timestamp, event, user id, channel, argument
+_RECORD_FMT = "<IBBBB"
+RECORD_SIZE = const(8)
+
+# Streamed log frame: marker byte, sequence of first record, records
+LOG_FRAME = const(0x01)
+_FRAME_HEADER_FMT = "<BI"
+_FRAME_HEADER_SIZE = const(5)
+
+# Header: magic, capacity, total records ever written, reserved
+_HEADER_FMT = "<4sIII"
+_HEADER_SIZE = const(16)
+_MAGIC = b"ALOG"
+
+# Event codes
+EV_BOOT = const(1)
+EV_WAKE = const(2)
+EV_UNLOCK = const(3)
+EV_LOCK = const(4)
+EV_FAILED_ATTEMPT = const(5)
+EV_LOCKOUT = const(6)
+EV_PASSWORD_CHANGE = const(7)
+EV_ADMIN_RESET = const(8)
+EV_SLEEP = const(9)
+EV_SCHEDULE_DENIED = const(10)
+EV_TIME_SET = const(11)
+EV_SCHEDULE_SET = const(12)
+EV_CONFIG_SET = const(13)
+EV_DOOR_CLOSED = const(14)  # arg = seconds the door was open (max 255)
+EV_IDLE_DISCONNECT = const(15)
+EV_LOW_BATTERY = const(16)  # arg = percent
+EV_BONDS_CLEARED = const(17)
+
+# Channels
+CH_SYSTEM = const(0)
+CH_KEYPAD = const(1)
+CH_BLE = const(2)
+CH_CONSOLE = const(3)  # Wired UART/USB console
+
+# Special user ids
+USER_ADMIN = const(0xFE)
+USER_NONE = const(0xFF)
+
+
+class AuditLog:
+    """Circular audit log with RAM write buffer
+
+    log() only packs into a preallocated RAM buffer; flash is touched by
+    flush(), which runs when the buffer fills and before deep sleep. If
+    that flush fails the oldest buffered record is dropped (counted in
+    lost) so logging never raises into the caller.
+    """
+
+    def __init__(self, path=AUDIT_FILE, capacity=AUDIT_CAPACITY,
+                 buffer_records=AUDIT_BUFFER, clock=time.time):
+        self._path = path
+        self._clock = clock
+        self.capacity = capacity
+        self.total = 0  # records committed to flash
+        self._buf = bytearray(buffer_records * RECORD_SIZE)
+        self._pending = 0
+        self.lost = 0  # records dropped because flash could not be written
+        self._open()
+
+    def _open(self):
+        try:
+            with open(self._path, 'rb') as f:
+                magic, capacity, total, _ = struct.unpack(_HEADER_FMT, f.read(_HEADER_SIZE))
+            if magic == _MAGIC and capacity == self.capacity:
+                self.total = total
+                return
+        except (OSError, ValueError):
+            pass
+        self._format()
+
+    def _format(self):
+        """Preallocate the whole region so later writes never grow the file"""
+        zeros = bytes(RECORD_SIZE * 64)
+        with open(self._path, 'wb') as f:
+            f.write(struct.pack(_HEADER_FMT, _MAGIC, self.capacity, 0, 0))
+            remaining = self.capacity
+            while remaining > 0:
+                n = min(remaining, 64)
+                f.write(zeros[:n * RECORD_SIZE])
+                remaining -= n
+        self.total = 0
+
+    def log(self, event, user=USER_NONE, channel=CH_SYSTEM, arg=0):
+        """Buffer one record; flushes only when the RAM buffer is full"""
+        if self._pending * RECORD_SIZE >= len(self._buf) and not self.flush():
+            # Keep the newest records; the next flush retries the rest
+            self._buf[:-RECORD_SIZE] = self._buf[RECORD_SIZE:]
+            self._pending -= 1
+            self.lost += 1
+        struct.pack_into(_RECORD_FMT, self._buf, self._pending * RECORD_SIZE,
+                         int(self._clock()), event, user, channel, arg & 0xFF)
+        self._pending += 1
+
+    def flush(self):
+        """Write buffered records and the new header in one file session"""
+        if not self._pending:
+            return True
+        try:
+            with open(self._path, 'r+b') as f:
+                done = 0
+                while done < self._pending:
+                    slot = (self.total + done) % self.capacity
+                    n = min(self._pending - done, self.capacity - slot)
+                    f.seek(_HEADER_SIZE + slot * RECORD_SIZE)
+                    f.write(memoryview(self._buf)[done * RECORD_SIZE:(done + n) * RECORD_SIZE])
+                    done += n
+                self.total += self._pending
+                f.seek(0)
+                f.write(struct.pack(_HEADER_FMT, _MAGIC, self.capacity, self.total, 0))
+            self._pending = 0
+            return True
+        except Exception as e:
+            print(f"Audit: Flush error: {e}")
+            return False
+
+    def first_seq(self):
+        """Sequence number of the oldest record still stored"""
+        return max(0, self.total - self.capacity)
+
+    def pending(self):
+        return self._pending
+
+    def read(self, offset, count, chunk_records=16):
+        """Yield (seq, bytes) chunks of stored records from sequence `offset`
+
+        Reads one chunk per step so RAM use stays at chunk_records * 8 bytes
+        no matter how many records are requested. Records older than the
+        retained window are skipped.
+        """
+        self.flush()
+        seq = max(offset, self.first_seq())
+        end = min(offset + count, self.total)
+        while seq < end:
+            # Records may have been overwritten while the caller was paused
+            seq = max(seq, self.first_seq())
+            if seq >= end:
+                break
+            slot = seq % self.capacity
+            n = min(chunk_records, end - seq, self.capacity - slot)
+            with open(self._path, 'rb') as f:
+                f.seek(_HEADER_SIZE + slot * RECORD_SIZE)
+                data = f.read(n * RECORD_SIZE)
+            yield seq, data
+            seq += n
+
+
+def log_frames(log, offset, count, payload_size):
+    """Yield (frame, next_seq) notifications of at most payload_size bytes
+
+    Each frame is LOG_FRAME, the little-endian uint32 sequence number of its
+    first record, then whole 8-byte records. A client that loses the link
+    resumes by requesting the sequence after the last record it received.
+    """
+    per_frame = max(1, (payload_size - _FRAME_HEADER_SIZE) // RECORD_SIZE)
+    for seq, data in log.read(offset, count, per_frame):
+        frame = struct.pack(_FRAME_HEADER_FMT, LOG_FRAME, seq) + data
+        yield frame, seq + len(data) // RECORD_SIZE
@@ -0,0 +1,106 @@
+"""
+Battery voltage monitor for ESP32 MicroPython
+Rare oversampled ADC reads, filtered and cached, with a low-battery flag
+"""
+
+from micropython import const
+import struct
+import time
+
+# name: ((mV, percent), ...) highest first, linear in between
+CURVES = {
+    'lipo': ((4200, 100), (4100, 90), (3950, 75), (3800, 50), (3700, 30),
+             (3600, 15), (3450, 5), (3300, 0)),            # 1S LiPo / 18650
+    'aa4': ((6400, 100), (6000, 80), (5400, 50), (4800, 20),
+            (4400, 5), (4000, 0)),                          # 4x AA alkaline
+}
+
+SAMPLE_INTERVAL_S = const(300)
+OVERSAMPLE = const(16)
+LOW_HYSTERESIS = const(5)  # Percent above the threshold to leave low mode
+
+# RTC region: filtered mV (uint16) + time of the last sample (uint32)
+_STATE = "<HI"
+STATE_SIZE = const(8)
+
+
+def percent_from_mv(curve, mv):
+    points = CURVES[curve]
+    if mv >= points[0][0]:
+        return 100
+    for (hi_mv, hi_pct), (lo_mv, lo_pct) in zip(points, points[1:]):
+        if mv >= lo_mv:
+            return lo_pct + (hi_pct - lo_pct) * (mv - lo_mv) // (hi_mv - lo_mv)
+    return 0
+
+
+class BatteryMonitor:
+    """Battery voltage through an ADC divider, sampled every interval_s
+
+    Each sample averages OVERSAMPLE reads with the extremes dropped, then
+    feeds a 1/4 exponential filter. The filtered value is cached (in an
+    rtc_state region when given) so a wake from deep sleep does not need a
+    fresh read. Skip sampling while the relay is on: the coil sags the rail.
+    """
+
+    def __init__(self, adc, divider=2.0, curve='lipo', low_pct=20,
+                 interval_s=SAMPLE_INTERVAL_S, state=None, clock=time.time):
+        if curve not in CURVES:
+            raise ValueError("battery curve")
+        self._adc = adc
+        self._divider = divider
+        self.curve = curve
+        self.low_pct = low_pct
+        self._interval_s = interval_s
+        self._state = state
+        self._clock = clock
+        self.mv = None
+        self._sampled_at = 0
+        self.low = False
+        self.samples = 0
+        if state is not None:
+            mv, sampled_at = struct.unpack_from(_STATE, state, 0)
+            if mv:
+                self.mv = mv
+                self._sampled_at = sampled_at
+                self._update_low()
+
+    def due(self):
+        age = self._clock() - self._sampled_at
+        return self.mv is None or not 0 <= age < self._interval_s
+
+    def poll(self, busy=False):
+        """Sample if the cached value is stale; returns True on a new sample"""
+        if busy or not self.due():
+            return False
+        self.sample()
+        return True
+
+    def sample(self):
+        reads = sorted(self._adc.read_uv() for _ in range(OVERSAMPLE))
+        uv = sum(reads[1:-1]) // (OVERSAMPLE - 2)
+        mv = int(uv * self._divider / 1000)
+        self.mv = mv if self.mv is None else (self.mv * 3 + mv) // 4
+        self._sampled_at = self._clock()
+        self.samples += 1
+        if self._state is not None:
+            struct.pack_into(_STATE, self._state, 0, self.mv, self._sampled_at)
+        self._update_low()
+        return self.mv
+
+    def percent(self):
+        if self.mv is None:
+            return None
+        return percent_from_mv(self.curve, self.mv)
+
+    def _update_low(self):
+        pct = self.percent()
+        if pct <= self.low_pct:
+            self.low = True
+        elif pct >= self.low_pct + LOW_HYSTERESIS:
+            self.low = False
+
+    def status(self):
+        if self.mv is None:
+            return "BATT:NONE"
+        return f"BATT:{self.mv / 1000:.2f}V,PCT:{self.percent()},LOWPWR:{int(self.low)}"
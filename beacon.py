@@ -0,0 +1,65 @@
+"""
+Duty-cycled BLE beacon for ESP32 MicroPython
+Wake on the RTC timer, advertise for a short window, sleep again unless someone needs us
+"""
+
+from micropython import const
+import machine
+import time
+from adaptive_idle import DEEP_MA, WAKE_MAS
+
+WINDOW_MA = 25.0               # Awake at 80MHz, advertising fast
+BEACON_ADV_US = const(100000)  # Advertising interval inside the window
+LISTEN_POLL_MS = const(20)
+
+
+def predicted_ma(period_ms, window_ms, window_ma=WINDOW_MA, deep_ma=DEEP_MA, wake_mas=WAKE_MAS):
+    """Average current of sleeping period_ms, then waking for window_ms"""
+    if not period_ms or not window_ms:
+        return deep_ma
+    charge = wake_mas + window_ma * window_ms / 1000 + deep_ma * period_ms / 1000
+    return charge / ((period_ms + window_ms) / 1000)
+
+
+class Beacon:
+    """Timer-wake schedule plus the listen window after each timer wake
+
+    period_ms is the deep-sleep timer (0 = keypad wake only), window_ms
+    how long a timer wake stays visible. Either at 0 turns beaconing off.
+    """
+
+    def __init__(self, period_ms, window_ms):
+        self.configure(period_ms, window_ms)
+
+    def configure(self, period_ms, window_ms):
+        self.period_ms = period_ms
+        self.window_ms = window_ms
+
+    def enabled(self):
+        return bool(self.period_ms and self.window_ms)
+
+    def sleep_ms(self):
+        """Timer for deepsleep(), None to sleep until a key press"""
+        return self.period_ms if self.enabled() else None
+
+    def timer_wake(self):
+        return (machine.reset_cause() == machine.DEEPSLEEP_RESET
+                and machine.wake_reason() == machine.TIMER_WAKE)
+
+    def listen(self, stay_awake):
+        """Wait up to window_ms; True as soon as stay_awake() is True"""
+        deadline = time.ticks_add(time.ticks_ms(), self.window_ms)
+        while time.ticks_diff(deadline, time.ticks_ms()) > 0:
+            if stay_awake():
+                return True
+            time.sleep_ms(LISTEN_POLL_MS)
+        return False
+
+    def predicted_ma(self):
+        return predicted_ma(self.period_ms if self.enabled() else 0, self.window_ms)
+
+    def status(self):
+        if not self.enabled():
+            return f"BEACON:OFF,PRED:{self.predicted_ma():.2f}mA"
+        return (f"BEACON:{self.period_ms // 1000}s,WINDOW:{self.window_ms}ms,"
+                f"PRED:{self.predicted_ma():.2f}mA")
@@ -11,9 +11,10 @@ _ADV_TYPE_UUID16_COMPLETE = const(0x3)
 _ADV_TYPE_UUID32_COMPLETE = const(0x5)
 _ADV_TYPE_UUID128_COMPLETE = const(0x7)
 _ADV_TYPE_APPEARANCE = const(0x19)
+_ADV_TYPE_MANUFACTURER = const(0xFF)
 
 
-def advertising_payload(limited_disc=False, br_edr=False, name=None, services=None, appearance=0):
+def advertising_payload(limited_disc=False, br_edr=False, name=None, services=None, appearance=0, manufacturer=None):
     payload = bytearray()
 
     def _append(adv_type, value):
@@ -43,4 +44,8 @@ def advertising_payload(limited_disc=False, br_edr=False, name=None, services=No
     if appearance:
         _append(_ADV_TYPE_APPEARANCE, struct.pack("<h", appearance))
 
+    if manufacturer:
+        # Company ID (little-endian) followed by vendor data
+        _append(_ADV_TYPE_MANUFACTURER, bytes(manufacturer))
+
     return payload
@@ -0,0 +1,115 @@
+"""
+Authenticated BLE sessions for ESP32 MicroPython
+One PIN check (or challenge-response) per connection, then a cheap per-command check
+"""
+
+from micropython import const
+from binascii import hexlify
+import hashlib
+import os
+import time
+
+SESSION_TTL_MS = const(120000)
+NONCE_SIZE = const(8)
+MAX_OWN = const(8)  # Entries kept for links outside the table, the oldest is dropped
+
+
+def response(nonce, pin):
+    """Answer to a CHALLENGE: hex SHA-256 of the nonce bytes then the PIN
+
+    Stops replay only: a short PIN is found from one sniffed nonce and
+    answer by trying every value, so the link itself must be encrypted.
+    """
+    return hexlify(hashlib.sha256(nonce + pin.encode()).digest()).decode()
+
+
+class Session:
+    """Auth state for one connection (ble_simple_peripheral.Connection has the same slots)"""
+
+    __slots__ = ('auth', 'nonce')
+
+    def __init__(self):
+        self.auth = None   # ticks_ms deadline
+        self.nonce = None  # Outstanding challenge
+
+
+class Sessions:
+    """Sessions keyed by BLE connection handle
+
+    start() after a successful PIN check; valid() is then one dict
+    lookup and a ticks compare. A session ends after ttl_ms, on end()
+    or when a new one replaces it, so a reused handle never inherits
+    the previous central's session.
+
+    table: the peripheral's connections dict, so the state lives in each
+    connection's entry and goes with it on disconnect. Links outside the
+    table (the wired console) get entries of their own, which are dropped
+    once their session has expired with no challenge open, and beyond
+    MAX_OWN oldest first.
+    """
+
+    def __init__(self, ttl_ms=SESSION_TTL_MS, table=None):
+        self.ttl_ms = ttl_ms
+        self._table = {} if table is None else table
+        self._own = {}
+
+    def _find(self, conn):
+        entry = self._table.get(conn)
+        return entry if entry is not None else self._own.get(conn)
+
+    def _entry(self, conn):
+        entry = self._find(conn)
+        if entry is None:
+            self._prune()
+            entry = self._own[conn] = Session()
+        return entry
+
+    def _prune(self):
+        now = time.ticks_ms()
+        for conn in [c for c, e in self._own.items()
+                     if e.nonce is None and (e.auth is None or time.ticks_diff(e.auth, now) <= 0)]:
+            del self._own[conn]
+        while len(self._own) >= MAX_OWN:
+            del self._own[next(iter(self._own))]
+
+    def challenge(self, conn):
+        """New single-use nonce for conn, as hex for the client"""
+        nonce = os.urandom(NONCE_SIZE)
+        self._entry(conn).nonce = nonce
+        return hexlify(nonce).decode()
+
+    def expected(self, conn, pin):
+        """The response conn must send for its challenge (None if none); uses it up"""
+        entry = self._find(conn)
+        if entry is None or entry.nonce is None:
+            return None
+        nonce, entry.nonce = entry.nonce, None
+        return response(nonce, pin)
+
+    def start(self, conn):
+        self._entry(conn).auth = time.ticks_add(time.ticks_ms(), self.ttl_ms)
+
+    def valid(self, conn):
+        entry = self._find(conn)
+        if entry is None or entry.auth is None:
+            return False
+        if time.ticks_diff(entry.auth, time.ticks_ms()) > 0:
+            return True
+        entry.auth = None
+        if entry.nonce is None and self._own.get(conn) is entry:
+            del self._own[conn]
+        return False
+
+    def remaining_ms(self, conn):
+        return max(0, time.ticks_diff(self._find(conn).auth, time.ticks_ms())) if self.valid(conn) else 0
+
+    def end(self, conn):
+        entry = self._table.get(conn)
+        if entry is not None:
+            entry.auth = entry.nonce = None
+        self._own.pop(conn, None)
+
+    def status(self, conn):
+        if not self.valid(conn):
+            return "SESSION:NONE"
+        return f"SESSION:{self.remaining_ms(conn) // 1000}s"
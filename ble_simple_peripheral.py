@@ -4,13 +4,29 @@ Simplified BLE UART service implementation
 """
 
 import bluetooth
+import errno
 from ble_advertising import advertising_payload
 from micropython import const
 import struct
+import time
 
 _IRQ_CENTRAL_CONNECT = const(1)
 _IRQ_CENTRAL_DISCONNECT = const(2)
 _IRQ_GATTS_WRITE = const(3)
+_IRQ_MTU_EXCHANGED = const(21)
+_IRQ_ENCRYPTION_UPDATE = const(28)
+_IRQ_GET_SECRET = const(29)
+_IRQ_SET_SECRET = const(30)
+
+_IO_CAPABILITY_NO_INPUT_OUTPUT = const(3)  # Just Works pairing, no passkey
+
+_DEFAULT_MTU = const(23)
+_PREFERRED_MTU = const(247)
+_ATT_HEADER_SIZE = const(3)
+
+# Notify errors that clear up by themselves (e.g. the TX queue is full);
+# anything else means the link is broken
+_SEND_RETRYABLE = (errno.ENOMEM, errno.EAGAIN)
 
 _FLAG_READ = const(0x0002)
 _FLAG_WRITE_NO_RESPONSE = const(0x0004)
@@ -31,18 +47,114 @@ _UART_SERVICE = (
     (_UART_TX, _UART_RX),
 )
 
+# Standard Battery Service with the Battery Level characteristic (uint8 %)
+_BATTERY_UUID = bluetooth.UUID(0x180F)
+_BATTERY_LEVEL = (
+    bluetooth.UUID(0x2A19),
+    _FLAG_READ | _FLAG_NOTIFY,
+)
+_BATTERY_SERVICE = (
+    _BATTERY_UUID,
+    (_BATTERY_LEVEL,),
+)
+
+# Lock status service (same base UUID as the UART service), read or subscribe
+# instead of polling STATUS: lock state (uint8, 1 = open), failed attempts
+# (uint8) and remaining open time (uint16 seconds), little-endian
+_STATUS_UUID = bluetooth.UUID("6E400010-B5A3-F393-E0A9-E50E24DCCA9E")
+_STATUS_LOCK = (
+    bluetooth.UUID("6E400011-B5A3-F393-E0A9-E50E24DCCA9E"),
+    _FLAG_READ | _FLAG_NOTIFY,
+)
+_STATUS_FAILURES = (
+    bluetooth.UUID("6E400012-B5A3-F393-E0A9-E50E24DCCA9E"),
+    _FLAG_READ | _FLAG_NOTIFY,
+)
+_STATUS_OPEN_TIME = (
+    bluetooth.UUID("6E400013-B5A3-F393-E0A9-E50E24DCCA9E"),
+    _FLAG_READ | _FLAG_NOTIFY,
+)
+_STATUS_SERVICE = (
+    _STATUS_UUID,
+    (_STATUS_LOCK, _STATUS_FAILURES, _STATUS_OPEN_TIME),
+)
+
+_ADV_INTERVAL_US = const(500000)
+FAST_ADV_US = const(20000)  # Burst interval so a known phone finds us quickly
+FAST_ADV_MS = const(30000)  # Burst length (Apple's accessory guideline: 20ms for 30s)
+
+MAX_CONNECTIONS = const(1)  # One phone at a time; advertising stops while full
+RX_BUFFER_SIZE = const(256)  # Per-connection command reassembly buffer (longest command)
+_NEWLINE = const(10)
+_CR = const(13)
+
+# Protocol modes
+MODE_LINE = const(0)  # Newline-terminated text commands
+
+
+class Connection:
+    """Per-central state, one entry in BLESimplePeripheral.connections"""
+
+    __slots__ = ('handle', 'mtu', 'bonded', 'auth', 'nonce', 'mode', 'rx', 'rx_len', 'rx_skip',
+                 'framed', 'last_rx')
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.mtu = _DEFAULT_MTU
+        self.bonded = False  # Encrypted with a saved (or new) bond
+        self.auth = None     # Session deadline (ticks_ms), see ble_session
+        self.nonce = None    # Outstanding challenge, see ble_session
+        self.mode = MODE_LINE
+        self.rx = bytearray(RX_BUFFER_SIZE)  # Allocated once per connection
+        self.rx_len = 0
+        self.rx_skip = False  # Dropping the rest of an overlong command
+        self.framed = False   # Has sent a newline: short writes no longer end commands
+        self.last_rx = time.ticks_ms()
+
 
 class BLESimplePeripheral:
-    def __init__(self, name="T8-Lock"):
+    def __init__(self, name="T8-Lock", battery=False, bonds=None, status=False,
+                 max_connections=MAX_CONNECTIONS):
+        """bonds: a bond_store.BondStore to enable pairing with saved keys
+        status: register the lock status service (see set_status)
+        max_connections: centrals served at once; more are disconnected
+        """
         try:
             self._ble = bluetooth.BLE()
             self._ble.active(True)
             self._ble.irq(self._irq)
-            ((self._handle_tx, self._handle_rx),) = self._ble.gatts_register_services((_UART_SERVICE,))
-            self._connections = set()
+            services = [_UART_SERVICE]
+            if battery:
+                services.append(_BATTERY_SERVICE)
+            if status:
+                services.append(_STATUS_SERVICE)
+            handles = self._ble.gatts_register_services(tuple(services))
+            (self._handle_tx, self._handle_rx) = handles[0]
+            self._handle_battery = handles[1][0] if battery else None
+            self._handles_status = handles[-1] if status else None
+            self._values = {}  # Last value written per characteristic handle
+            self.connections = {}  # conn_handle: Connection
+            self.max_connections = max_connections
+            self._replying = None  # Connection whose write is being handled
+            try:
+                self._ble.config(mtu=_PREFERRED_MTU)
+            except Exception:
+                pass
             self._write_callback = None
+            self._disconnect_callback = None
             self.device_name = name
             self.service_uuid = _UART_UUID
+            self._manufacturer = None
+            self._adv_interval_us = _ADV_INTERVAL_US
+            self._fast_until = None
+            self._bonds = bonds
+            if bonds is not None:
+                try:
+                    self._ble.config(bond=True, le_secure=True, mitm=False,
+                                     io=_IO_CAPABILITY_NO_INPUT_OUTPUT)
+                except Exception as e:
+                    print(f"BT: Bonding unavailable: {e}")
+                    self._bonds = None
             self._advertise()
         except Exception as e:
             print(f"BT: Init error: {e}")
@@ -51,55 +163,209 @@ class BLESimplePeripheral:
     def _irq(self, event, data):
         # Track connections with error handling
         try:
-            if event == _IRQ_CENTRAL_CONNECT:
+            if event == _IRQ_GET_SECRET:
+                return self._bonds.get(*data) if self._bonds is not None else None
+            elif event == _IRQ_SET_SECRET:
+                return self._bonds.set(*data) if self._bonds is not None else False
+            elif event == _IRQ_CENTRAL_CONNECT:
                 conn_handle, _, _ = data
+                if len(self.connections) >= self.max_connections:
+                    print("BT: Connection limit reached, disconnecting")
+                    self._ble.gap_disconnect(conn_handle)
+                    return
                 print("BT: Device connected")
-                self._connections.add(conn_handle)
+                self.connections[conn_handle] = Connection(conn_handle)
+                self._fast_until = None
+                if self._bonds is not None:
+                    # A bonded central re-encrypts with its saved keys, a new one pairs
+                    self._ble.gap_pair(conn_handle)
+                if self._advertising():
+                    self._advertise()  # Keep a free slot discoverable
             elif event == _IRQ_CENTRAL_DISCONNECT:
                 conn_handle, _, _ = data
                 print("BT: Device disconnected")
-                self._connections.discard(conn_handle)  # Use discard instead of remove
-                self._advertise()
+                self.connections.pop(conn_handle, None)
+                if self._disconnect_callback:
+                    self._disconnect_callback(conn_handle)
+                if self._advertising():
+                    self._advertise()
             elif event == _IRQ_GATTS_WRITE:
                 conn_handle, value_handle = data
+                conn = self.connections.get(conn_handle)
+                if conn is None:
+                    return
+                conn.last_rx = time.ticks_ms()
                 if value_handle == self._handle_rx and self._write_callback:
-                    try:
-                        value = self._ble.gatts_read(value_handle)
-                        if value:  # Only call callback if we got valid data
-                            self._write_callback(value)
-                    except Exception as e:
-                        print(f"BT: Callback error: {e}")
+                    value = self._ble.gatts_read(value_handle)
+                    if value:  # Only call callback if we got valid data
+                        self._receive(conn, value)
+            elif event == _IRQ_MTU_EXCHANGED:
+                conn_handle, mtu = data
+                if conn_handle in self.connections:
+                    self.connections[conn_handle].mtu = mtu
+            elif event == _IRQ_ENCRYPTION_UPDATE:
+                conn_handle, encrypted, _, bonded, _ = data
+                if encrypted and bonded and conn_handle in self.connections:
+                    self.connections[conn_handle].bonded = True
+                print(f"BT: Encrypted={encrypted} bonded={bonded}")
         except Exception as e:
             print(f"BT: IRQ error (event={event}): {e}")
 
-    def send(self, data):
+    def _receive(self, conn, value):
+        """Reassemble commands from RX writes and run each complete one
+
+        Commands end with a newline; one write may carry several, run in
+        order, and a long one may span writes. Until a connection sends
+        its first newline, a write shorter than a full ATT payload also
+        ends a command, so clients that send one unterminated command per
+        write keep working; after that only the newline does, so a client
+        may chunk below the negotiated MTU. An overlong command is
+        answered with ERROR:TOO_LONG once and dropped up to its end.
+        """
+        rx = conn.rx
+        short = not conn.framed and len(value) < conn.mtu - _ATT_HEADER_SIZE
+        for b in value:
+            if b == _NEWLINE:
+                conn.framed = True
+                if conn.rx_skip:
+                    conn.rx_skip = False
+                else:
+                    self._dispatch(conn, conn.rx_len)
+                conn.rx_len = 0
+            elif conn.rx_skip:
+                continue
+            elif conn.rx_len == len(rx):
+                conn.rx_len = 0
+                conn.rx_skip = True
+                self.send("ERROR:TOO_LONG\n", conn.handle)
+            else:
+                rx[conn.rx_len] = b
+                conn.rx_len += 1
+        if short:
+            conn.rx_skip = False
+            if conn.rx_len:
+                self._dispatch(conn, conn.rx_len)
+                conn.rx_len = 0
+
+    def _dispatch(self, conn, end):
+        """Hand rx[:end] to the write callback, replies routed to conn"""
+        while end and conn.rx[end - 1] == _CR:
+            end -= 1
+        if not end:
+            return  # Blank line
+        try:
+            self._replying = conn
+            self._write_callback(bytes(conn.rx[:end]), conn.handle)
+        except Exception as e:
+            print(f"BT: Callback error: {e}")
+        finally:
+            self._replying = None
+
+    def send(self, data, conn_handle=None):
+        """Notify data on TX
+
+        Goes to conn_handle if given, else to the central whose write is
+        being handled (so a reply reaches only the phone that asked), else
+        to every connected central.
+        """
         # Ensure data is bytes
         if isinstance(data, str):
             data = data.encode('utf-8')
         elif not isinstance(data, (bytes, bytearray)):
             data = str(data).encode('utf-8')
 
-        # Make a copy of connections to avoid modification during iteration
-        connections_copy = list(self._connections)
-        for conn_handle in connections_copy:
+        if conn_handle is not None:
+            targets = (conn_handle,)
+        elif self._replying is not None:
+            targets = (self._replying.handle,)
+        else:
+            targets = list(self.connections)
+        for conn_handle in targets:
             try:
                 self._ble.gatts_notify(conn_handle, self._handle_tx, data)
             except Exception as e:
                 print(f"BT: Send error on handle {conn_handle}: {e}")
-                # Remove invalid connection
-                try:
-                    self._connections.discard(conn_handle)
-                except:
-                    pass
+                # The central is still connected: its entry (session, slot)
+                # goes only with the disconnect IRQ, which a broken link
+                # gets by being closed here
+                if not (isinstance(e, OSError) and e.args and e.args[0] in _SEND_RETRYABLE):
+                    try:
+                        self._ble.gap_disconnect(conn_handle)
+                    except Exception as e:
+                        print(f"BT: Disconnect error on handle {conn_handle}: {e}")
+
+    def is_connected(self, conn_handle=None):
+        if conn_handle is not None:
+            return conn_handle in self.connections
+        return len(self.connections) > 0
+
+    def is_bonded(self, conn_handle):
+        """True once conn_handle is encrypted with a saved (or new) bond"""
+        conn = self.connections.get(conn_handle)
+        return conn is not None and conn.bonded
+
+    def _advertising(self):
+        """The stack stops advertising on connect; restart it while slots are free"""
+        return len(self.connections) < self.max_connections
+
+    def fast_advertise(self, duration_ms=FAST_ADV_MS):
+        """Advertise at FAST_ADV_US for duration_ms (e.g. after a wake), then step() reverts"""
+        if not self._advertising():
+            return
+        self._fast_until = time.ticks_add(time.ticks_ms(), duration_ms)
+        self._advertise()
+
+    def step(self):
+        """Call from the main loop: ends a fast_advertise() burst"""
+        if self._fast_until is None or time.ticks_diff(self._fast_until, time.ticks_ms()) > 0:
+            return
+        self._fast_until = None
+        if self._advertising():
+            self._advertise()
+
+    def connection_idle_ms(self, conn_handle):
+        """Time since conn_handle connected or last wrote"""
+        return time.ticks_diff(time.ticks_ms(), self.connections[conn_handle].last_rx)
+
+    def disconnect(self, reason=None, conn_handle=None):
+        """Close conn_handle (default: every connection), telling the central why first
+
+        gap_disconnect() always uses the standard 'remote user terminated'
+        code, so the reason is sent as a DISCONNECT:<reason> notification.
+        Advertising restarts from the disconnect IRQ.
+        """
+        targets = list(self.connections) if conn_handle is None else (conn_handle,)
+        for conn_handle in targets:
+            if reason:
+                self.send(f"DISCONNECT:{reason}\n", conn_handle)
+            try:
+                self._ble.gap_disconnect(conn_handle)
+            except Exception as e:
+                print(f"BT: Disconnect error on handle {conn_handle}: {e}")
 
-    def is_connected(self):
-        return len(self._connections) > 0
+    def reap_idle(self, limit_s):
+        """Disconnect centrals that have been silent for limit_s seconds"""
+        idle = [c for c in self.connections if self.connection_idle_ms(c) >= limit_s * 1000]
+        for conn_handle in idle:
+            print("BT: Idle connection, disconnecting")
+            self.disconnect("IDLE", conn_handle)
+        return len(idle) > 0
 
-    def _advertise(self, interval_us=500000):
+    def payload_size(self, conn_handle=None):
+        """Largest notification payload for conn_handle (default: fits every central)"""
+        if conn_handle in self.connections:
+            mtu = self.connections[conn_handle].mtu
+        else:
+            mtu = min((c.mtu for c in self.connections.values()), default=_DEFAULT_MTU)
+        return mtu - _ATT_HEADER_SIZE
+
+    def _advertise(self, interval_us=None):
+        if interval_us is None:
+            interval_us = FAST_ADV_US if self._fast_until is not None else self._adv_interval_us
         try:
             print("BT: Advertising with two payloads......")
             adv_data = advertising_payload(name=self.device_name)
-            resp_data = advertising_payload(services=[self.service_uuid])
+            resp_data = advertising_payload(services=[self.service_uuid], manufacturer=self._manufacturer)
             if len(adv_data) <= 31 and len(resp_data) <= 31:
                 print(f"BT: Advertising (Adv Len: {len(adv_data)}, Resp Len: {len(resp_data)})")
                 # Pass BOTH payloads to the gap_advertise function
@@ -111,5 +377,67 @@ class BLESimplePeripheral:
         except Exception as e:
             print(f"BT: Advertise error: {e}")
 
+    def set_name(self, name):
+        """Change the advertised name without re-initialising BLE"""
+        self.device_name = name
+        self._advertise()
+
+    def set_manufacturer_data(self, data):
+        """Publish status bytes in the scan response (company ID first)"""
+        if data == self._manufacturer:
+            return
+        self._manufacturer = data
+        # Advertising is off while full; the disconnect handler restarts it
+        if self._advertising():
+            self._advertise()
+
+    def set_adv_interval(self, interval_us):
+        """Slower advertising saves power at the cost of discovery time"""
+        if interval_us == self._adv_interval_us:
+            return
+        self._adv_interval_us = interval_us
+        if self._advertising():
+            self._advertise()
+
+    def _publish(self, handle, value):
+        """Write a characteristic if it changed
+
+        send_update notifies only centrals that enabled the CCCD, so an
+        unchanged value or nobody listening costs no radio traffic.
+        """
+        if self._values.get(handle) == value:
+            return
+        self._values[handle] = value
+        try:
+            self._ble.gatts_write(handle, value, True)
+        except Exception as e:
+            print(f"BT: Characteristic write error: {e}")
+
+    def set_max_connections(self, limit):
+        """Change the connection limit; extra centrals stay until they leave"""
+        self.max_connections = limit
+        if self._advertising():
+            self._advertise()
+
+    def set_battery_level(self, percent):
+        """Update Battery Level (0x2A19); subscribed centrals are notified"""
+        if self._handle_battery is None:
+            return
+        self._publish(self._handle_battery, bytes((percent,)))
+
+    def set_status(self, lock_open, failures, open_ms):
+        """Update the lock status characteristics; call as often as convenient"""
+        if self._handles_status is None:
+            return
+        lock, fails, open_time = self._handles_status
+        self._publish(lock, b"\x01" if lock_open else b"\x00")
+        self._publish(fails, bytes((min(failures, 255),)))
+        self._publish(open_time, struct.pack("<H", min((open_ms + 999) // 1000, 0xFFFF)))
+
     def on_write(self, callback):
+        """callback(data, conn_handle) for each write to the RX characteristic"""
         self._write_callback = callback
+
+    def on_disconnect(self, callback):
+        """callback(conn_handle) after a central disconnects"""
+        self._disconnect_callback = callback
@@ -0,0 +1,158 @@
+"""
+BLE bonding key store for ESP32 MicroPython
+Backs _IRQ_GET_SECRET / _IRQ_SET_SECRET with a small binary file
+"""
+
+from micropython import const
+import struct
+from flash_store import atomic_write
+
+BOND_FILE = "bonds.bin"
+MAX_SECRETS = const(16)
+
+# Secret types used by the NimBLE store
+SEC_OUR = const(1)    # Our keys for a peer
+SEC_PEER = const(2)   # A peer's keys, one per bonded central
+SEC_CCCD = const(3)   # Saved subscriptions
+SEC_OUR_IRK = const(10)  # Our local IRK (MicroPython's own entry, not per peer)
+
+# Every per-peer key starts with the peer's ble_addr_t (type + 6 bytes);
+# CCCD keys carry a characteristic handle after it
+_ADDR_SIZE = const(7)
+
+_MAGIC = b"BK"
+_RECORD = "<BBH"  # sec_type, key length, value length, then key and value
+_RECORD_SIZE = const(4)
+
+
+class BondStore:
+    """Secrets the BLE stack hands us when a central bonds
+
+    set() and get() run inside the BLE IRQ, so they only touch RAM;
+    flush() writes the file at an idle point (or before deep sleep).
+    Entries are kept in least recently used order. Past max_secrets the
+    least recently used central is forgotten as a whole (our keys for it,
+    its keys and its subscriptions, matched by peer address), so the file
+    stays a few hundred bytes. The local IRK is never evicted: losing our
+    identity would break every bond. Nor is the central being stored, so
+    a phone that just paired keeps its bond; when no other central is left
+    a new secret is refused.
+    """
+
+    def __init__(self, path=BOND_FILE, max_secrets=MAX_SECRETS):
+        self._path = path
+        self.max_secrets = max_secrets
+        self._entries = []  # [sec_type, key, value]
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        self._entries = []
+        try:
+            with open(self._path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return
+        if data[:2] != _MAGIC:
+            return
+        pos = 2
+        while pos + _RECORD_SIZE <= len(data):
+            sec_type, klen, vlen = struct.unpack_from(_RECORD, data, pos)
+            pos += _RECORD_SIZE
+            if pos + klen + vlen > len(data):
+                break  # Truncated tail, keep what came before
+            key = bytes(data[pos:pos + klen])
+            pos += klen
+            self._entries.append([sec_type, key, bytes(data[pos:pos + vlen])])
+            pos += vlen
+
+    def _find(self, sec_type, key):
+        for i, entry in enumerate(self._entries):
+            if entry[0] == sec_type and entry[1] == key:
+                return i
+        return -1
+
+    def set(self, sec_type, key, value):
+        """_IRQ_SET_SECRET: store value (None deletes); True on success"""
+        key = bytes(key)
+        i = self._find(sec_type, key)
+        if value is None:
+            if i < 0:
+                return False
+            del self._entries[i]
+        else:
+            if i >= 0:
+                del self._entries[i]
+            self._touch(key)
+            self._entries.append([sec_type, key, bytes(value)])
+            while len(self._entries) > self.max_secrets:
+                if not self._evict(key[:_ADDR_SIZE]):
+                    self._entries.pop()
+                    return False
+        self._dirty = True
+        return True
+
+    def _touch(self, key):
+        """Move the central's entries to the end (most recently used)"""
+        peer = key[:_ADDR_SIZE]
+        entries = self._entries
+        self._entries = ([e for e in entries if e[1][:_ADDR_SIZE] != peer]
+                         + [e for e in entries if e[1][:_ADDR_SIZE] == peer])
+
+    def _evict(self, keep):
+        """Forget the least recently used central other than keep; False if none is left"""
+        for entry in self._entries:
+            peer = entry[1][:_ADDR_SIZE]
+            if entry[0] != SEC_OUR_IRK and peer != keep:
+                self._entries = [e for e in self._entries
+                                 if e[0] == SEC_OUR_IRK or e[1][:_ADDR_SIZE] != peer]
+                return True
+        return False
+
+    def get(self, sec_type, index, key):
+        """_IRQ_GET_SECRET: value for key, or the index-th of sec_type when key is None"""
+        if key is None:
+            for entry in self._entries:
+                if entry[0] == sec_type:
+                    if index == 0:
+                        return entry[2]
+                    index -= 1
+            return None
+        key = bytes(key)
+        i = self._find(sec_type, key)
+        if i < 0:
+            return None
+        # Saved with the next change, no flash write for a reconnect
+        value = self._entries[i][2]
+        self._touch(key)
+        return value
+
+    def count(self, sec_type=SEC_PEER):
+        return sum(1 for entry in self._entries if entry[0] == sec_type)
+
+    def pending(self):
+        return self._dirty
+
+    def flush(self):
+        if not self._dirty:
+            return True
+        parts = [_MAGIC]
+        for sec_type, key, value in self._entries:
+            parts.append(struct.pack(_RECORD, sec_type, len(key), len(value)))
+            parts.append(key)
+            parts.append(value)
+        try:
+            atomic_write(self._path, b"".join(parts))
+        except OSError as e:
+            print(f"Bonds: Flush error: {e}")
+            return False
+        self._dirty = False
+        return True
+
+    def clear(self):
+        """Forget every bonded central (our IRK stays)"""
+        self._entries = [e for e in self._entries if e[0] == SEC_OUR_IRK]
+        self._dirty = True
+
+    def status(self):
+        return f"BONDS:{self.count()},SECRETS:{len(self._entries)}"
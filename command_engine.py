@@ -0,0 +1,167 @@
+"""
+Transport-agnostic command engine for ESP32 MicroPython
+The same text protocol over BLE, a wired UART/USB console and host tests
+"""
+
+from micropython import const
+
+CONSOLE = const(-1)  # conn for the wired console (BLE handles are >= 0)
+LINE_SIZE = const(256)  # Longest command, like the BLE RX buffer
+CONSOLE_BAUD = const(115200)
+
+_NEWLINE = const(10)
+_CR = const(13)
+
+
+class CommandEngine:
+    """Runs one text command at a time, whatever link it came in on
+
+    handler(command, reply, conn) gets the stripped command, a reply(text)
+    writer for the link it came from, and conn to key sessions and
+    attempt limits (a BLE connection handle or CONSOLE).
+    """
+
+    def __init__(self, handler):
+        self._handler = handler
+        self.count = 0
+
+    def handle(self, data, reply, conn=CONSOLE):
+        try:
+            if not isinstance(data, str):
+                data = bytes(data).decode()
+            command = data.strip()
+            if not command:
+                return
+            self.count += 1
+            self._handler(command, reply, conn)
+        except Exception as e:
+            print(f"CMD: Error: {e}")
+            try:
+                reply(f"ERROR:EXCEPTION:{e}\n")
+            except Exception:
+                pass
+
+    def attach(self, ble):
+        """Serve commands written to a BLESimplePeripheral, replies to the writer"""
+        ble.on_write(lambda data, conn: self.handle(data, lambda text: ble.send(text, conn), conn))
+
+
+class UartTransport:
+    """Newline-framed commands over a byte stream at wire speed
+
+    stream needs any(), readinto(buf, n) and write(b): a machine.UART,
+    or UsbStream for the USB-CDC port. Call poll() from the main loop;
+    it never blocks. Input is read into a preallocated line buffer.
+    """
+
+    def __init__(self, engine, stream, conn=CONSOLE, size=LINE_SIZE):
+        self._engine = engine
+        self._stream = stream
+        self._conn = conn
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._len = 0
+        self._skip = False  # Dropping the rest of an overlong line
+
+    def write(self, text):
+        if isinstance(text, str):
+            text = text.encode()
+        self._stream.write(text)
+
+    def poll(self):
+        """Run every complete command received so far; True if any ran"""
+        ran = False
+        while self._stream.any():
+            start = self._len
+            n = self._stream.readinto(self._view[start:], len(self._buf) - start)
+            if not n:
+                break
+            end = start + n
+            line = 0
+            for i in range(start, end):
+                if self._buf[i] == _NEWLINE:
+                    if not self._skip:
+                        self._run(line, i)
+                        ran = True
+                    self._skip = False
+                    line = i + 1
+            self._len = end - line
+            if line and self._len:
+                self._buf[0:self._len] = self._buf[line:end]
+            if self._len == len(self._buf):
+                self._len = 0
+                if not self._skip:
+                    self._skip = True
+                    self.write("ERROR:TOO_LONG\n")
+        return ran
+
+    def _run(self, start, end):
+        if end > start and self._buf[end - 1] == _CR:
+            end -= 1
+        self._engine.handle(self._buf[start:end], self.write, self._conn)
+
+
+class UsbStream:
+    """The USB-CDC (REPL) port as a stream for UartTransport
+
+    Ctrl-C still reaches the REPL; other input goes to the command engine.
+    """
+
+    def __init__(self):
+        import sys
+        import select
+        self._in = sys.stdin.buffer
+        self._out = sys.stdout.buffer
+        self._poll = select.poll()
+        self._poll.register(sys.stdin, select.POLLIN)
+
+    def any(self):
+        return 1 if self._poll.poll(0) else 0
+
+    def readinto(self, buf, n):
+        # One byte at a time: read(n) on stdin blocks until n bytes arrive
+        data = self._in.read(1)
+        if not data:
+            return 0
+        buf[0] = data[0]
+        return 1
+
+    def write(self, data):
+        self._out.write(data)
+
+
+def open_console(engine, port, pins=None, busy=()):
+    """Wired console on port: None (off), "usb" or a UART id with (tx, rx) pins
+
+    busy lists GPIOs the firmware already drives (keypad, relay...); a UART
+    on one of them would take it over, so that raises ValueError.
+    """
+    if port is None:
+        return None
+    if port == "usb":
+        return UartTransport(engine, UsbStream())
+    for pin in pins or ():
+        if pin in busy:
+            raise ValueError(f"console pin {pin} is already in use")
+    from machine import UART
+    if pins is None:
+        return UartTransport(engine, UART(port, baudrate=CONSOLE_BAUD))
+    return UartTransport(engine, UART(port, baudrate=CONSOLE_BAUD, tx=pins[0], rx=pins[1]))
+
+
+class LoopbackTransport:
+    """In-memory link for host tests and scripts: request() returns the replies"""
+
+    def __init__(self, engine, conn=CONSOLE):
+        self._engine = engine
+        self._conn = conn
+        self._out = []
+
+    def write(self, text):
+        self._out.append(text if isinstance(text, str) else bytes(text).decode())
+
+    def request(self, command):
+        """Run command; its reply lines without newlines"""
+        self._out = []
+        self._engine.handle(command, self.write, self._conn)
+        return "".join(self._out).splitlines()
@@ -0,0 +1,71 @@
+"""
+CPU frequency governor for ESP32 MicroPython
+Runs at the lowest BLE-safe clock and boosts briefly for real work
+"""
+
+from micropython import const
+import machine
+import time
+
+# 80MHz is the lowest clock the ESP32 BLE controller supports
+FREQ_LOW = const(80000000)
+FREQ_HIGH = const(240000000)
+FREQ_STEPS = (80000000, 160000000, 240000000)
+
+BOOST_HOLD_MS = const(500)
+
+
+class CpuGovernor:
+    """Two-level clock: boost() for BLE commands and flash writes, relax() from the loop
+
+    A boost holds the high clock for hold_ms after the last request so a
+    burst of commands does not bounce the PLL for every one of them.
+    Transitions are printed and counted (see status()).
+    """
+
+    def __init__(self, low_hz=FREQ_LOW, high_hz=FREQ_HIGH, hold_ms=BOOST_HOLD_MS):
+        self.low_hz = low_hz
+        self.high_hz = high_hz
+        self.hold_ms = hold_ms
+        self._until = time.ticks_ms()
+        self._high_since = None
+        self.freq = machine.freq()
+        self.transitions = 0
+        self.boosts = 0
+        self.high_ms = 0
+        self._set(low_hz)
+
+    def set_range(self, low_hz, high_hz):
+        """Change both levels (equal values pin the clock)"""
+        if low_hz not in FREQ_STEPS or high_hz not in FREQ_STEPS or low_hz > high_hz:
+            raise ValueError("cpu freq")
+        self.low_hz = low_hz
+        self.high_hz = high_hz
+        self._set(high_hz if self._high_since is not None else low_hz)
+
+    def boost(self):
+        self._until = time.ticks_add(time.ticks_ms(), self.hold_ms)
+        if self._high_since is None:
+            self.boosts += 1
+            self._high_since = time.ticks_ms()
+            self._set(self.high_hz)
+
+    def relax(self):
+        """Drop back to the low clock once the boost hold has expired"""
+        if self._high_since is None or time.ticks_diff(self._until, time.ticks_ms()) > 0:
+            return
+        self.high_ms += time.ticks_diff(time.ticks_ms(), self._high_since)
+        self._high_since = None
+        self._set(self.low_hz)
+
+    def _set(self, hz):
+        if hz == self.freq:
+            return
+        machine.freq(hz)
+        self.freq = hz
+        self.transitions += 1
+        print(f"CPU: {hz // 1000000}MHz")
+
+    def status(self):
+        return (f"CPU:{self.freq // 1000000}MHz,BOOSTS:{self.boosts},"
+                f"HIGH:{self.high_ms // 1000}s,TRANSITIONS:{self.transitions}")
@@ -13,15 +13,32 @@ from machine import Pin
 import time
 import bluetooth
 from ble_simple_peripheral import BLESimplePeripheral
+from relay_driver import RelayDriver
+from relock_timer import RelockTimer
+from keypad_fsm import KeypadFsm, BASIC, O_UNLOCK, O_EMERGENCY, O_WRONG, O_LOCKOUT
+from throttle import Throttle, BLE
+import throttle
+from rtc_state import RtcState
+from ble_session import Sessions
+from command_engine import CommandEngine, open_console
+from gc_scheduler import GcScheduler
+from led_patterns import PatternPlayer, START, LOCKOUT
 
 # ===== CONFIGURATION =====
 CORRECT_PASSWORD = "1234"  # Change this to your desired password
 LOCK_OPEN_TIME = 5  # Seconds to keep lock open
-MAX_ATTEMPTS = 3  # Maximum wrong password attempts
+MAX_ATTEMPTS = 3  # Wrong passwords before a lockout (per keypad / BLE connection)
+MAX_CONNECTIONS = 1  # Phones connected at once (up to 4)
+CONSOLE_PORT = None  # Wired command console: None, "usb" (USB-CDC) or a UART id
+CONSOLE_PINS = (25, 26)  # TX, RX for a UART console (GPIO16/17 belong to PSRAM, 21/22 to the keypad)
+LOCKOUT_TIME = 30  # First lockout in seconds, doubling on each further failure
+LOCKOUT_MAX = 3600  # Longest lockout in seconds
+CONNECTED_IDLE_TIMEOUT = 300  # Drop a BLE connection silent for this long (seconds)
 
 # ===== LILYGO T8 V1.7 PIN DEFINITIONS =====
 # Relay control pin
 RELAY_PIN = 32
+RELAY_PROFILE = "full"  # See relay_driver.PROFILES ("relay_module" to save power)
 
 # 4x3 Keypad pins (3 rows, 4 columns)
 # Using safe GPIO pins that don't conflict with SD card or PSRAM
@@ -60,7 +77,7 @@ KEYS = [
 # ===== HARDWARE SETUP =====
 # Initialize relay (active HIGH)
 relay = Pin(RELAY_PIN, Pin.OUT)
-relay.value(0)  # Start with lock closed
+relay_driver = RelayDriver(relay, RELAY_PROFILE)  # Starts with lock closed
 
 # Initialize keypad rows as outputs (HIGH by default)
 rows = [Pin(pin, Pin.OUT) for pin in ROW_PINS]
@@ -72,26 +89,35 @@ cols = [Pin(pin, Pin.IN, Pin.PULL_UP) for pin in COL_PINS]
 
 # Onboard LED (optional - for status indication)
 led = Pin(2, Pin.OUT)
+leds = PatternPlayer(led)  # Non-blocking blink patterns
+
+gcs = GcScheduler()
+
+# Failed attempts and lockout deadlines, kept in RTC memory across resets
+rtc_mem = RtcState((('throttle', throttle.STATE_SIZE),))
+guard = Throttle(rtc_mem.region('throttle'), MAX_ATTEMPTS, LOCKOUT_TIME, LOCKOUT_MAX,
+                 save=rtc_mem.save)
 
 # ===== GLOBAL VARIABLES =====
-entered_password = ""
-failed_attempts = 0
 lock_state = False  # False = locked, True = unlocked
 
 # ===== DOOR LOCK FUNCTIONS =====
 def open_lock():
-    """Open the door lock"""
+    """Open the door lock (relocks after LOCK_OPEN_TIME)"""
     global lock_state
     print("🔓 Lock OPENED")
-    relay.value(1)  # Activate relay
+    relay_driver.on()  # Activate relay
+    leds.stop()
     led.value(1)    # Turn on LED
     lock_state = True
+    relock.arm(LOCK_OPEN_TIME)
 
 def close_lock():
     """Close the door lock"""
     global lock_state
     print("🔒 Lock CLOSED")
-    relay.value(0)  # Deactivate relay
+    relock.cancel()
+    relay_driver.off()  # Deactivate relay
     led.value(0)    # Turn off LED
     lock_state = False
 
@@ -102,6 +128,9 @@ def toggle_lock():
     else:
         open_lock()
 
+# Relock at the deadline from a hardware timer, even if the loop is busy
+relock = RelockTimer(close_lock)
+
 # ===== KEYPAD FUNCTIONS =====
 def read_keypad():
     """
@@ -132,97 +161,101 @@ def read_keypad():
     
     return None
 
+def on_keypad(outcome, arg):
+    """Side effects of keypad outcomes (the state machine prints the messages)"""
+    if outcome in (O_UNLOCK, O_EMERGENCY):  # B = quick unlock (testing/emergency)
+        open_lock()
+    elif outcome == O_LOCKOUT:
+        leds.play(LOCKOUT)  # Blink LED during lockout, the loop keeps running
+
+# PIN entry; BLE PASS is checked here too, throttled on its own channel
+keypad = KeypadFsm(BASIC, on_keypad, lambda: CORRECT_PASSWORD, guard)
+
 def process_keypad_input(key):
     """Process keypad button press"""
-    global entered_password, failed_attempts
-    
     print(f"Key pressed: {key}")
-    
-    if key == '#' or key == 'C':  # Enter/Submit
-        if entered_password == CORRECT_PASSWORD:
-            print("✅ Correct password!")
-            open_lock()
-            time.sleep(LOCK_OPEN_TIME)
-            close_lock()
-            failed_attempts = 0
-        else:
-            failed_attempts += 1
-            print(f"❌ Wrong password! Attempt {failed_attempts}/{MAX_ATTEMPTS}")
-            
-            if failed_attempts >= MAX_ATTEMPTS:
-                print("🚨 TOO MANY FAILED ATTEMPTS! Locking for 30 seconds...")
-                # Blink LED during lockout
-                for _ in range(30):
-                    led.value(1)
-                    time.sleep(0.5)
-                    led.value(0)
-                    time.sleep(0.5)
-                failed_attempts = 0
-        
-        entered_password = ""  # Clear entered password
-        
-    elif key == '*' or key == 'A':  # Clear
-        entered_password = ""
-        print("🔄 Password cleared")
-        
-    elif key == 'B':  # Quick unlock (for testing/emergency)
-        print("⚡ Emergency unlock!")
-        open_lock()
-        time.sleep(LOCK_OPEN_TIME)
-        close_lock()
-        
-    else:  # Number key
-        if len(entered_password) < 8:  # Limit password length
-            entered_password += key
-            print(f"Password: {'*' * len(entered_password)}")
+    keypad.key(key)
 
 # ===== BLUETOOTH FUNCTIONS =====
-def on_rx(data):
-    """Handle received Bluetooth data"""
-    global failed_attempts
-    
-    command = data.decode().strip().upper()
-    print(f"BT Command received: {command}")
+
+def pin_ok(candidate, reply, conn, expected=None):
+    """Check a remote PIN (or challenge answer); sends the error reply if wrong"""
+    outcome = keypad.verify(candidate, BLE, conn, expected)
+    if outcome == O_UNLOCK:
+        sessions.start(conn)
+        return True
+    if outcome == O_WRONG:
+        failures = guard.failures(BLE, conn)
+        print(f"❌ Wrong BT password! Attempt {failures}/{MAX_ATTEMPTS}")
+        reply(f"ERROR:WRONG_PASSWORD:{failures}/{MAX_ATTEMPTS}\n")
+    else:
+        if outcome == O_LOCKOUT:
+            leds.play(LOCKOUT)
+        reply(f"ERROR:LOCKED_OUT:{guard.retry_after(BLE, conn)}\n")
+    return False
+
+def on_command(command, reply, conn):
+    """Handle a command from BLE or the wired console"""
+    text = command  # As sent: passwords are case-sensitive
+    command = command.upper()
+    print(f"Command received: {command}")
     
     if command.startswith("PASS:"):
         # Password received from app
-        password = command[5:]
-        if password == CORRECT_PASSWORD:
+        if pin_ok(text[5:], reply, conn):
             print("✅ Correct BT password!")
             open_lock()
-            time.sleep(LOCK_OPEN_TIME)
-            close_lock()
-            ble.send("OK:UNLOCKED\n")
-            failed_attempts = 0
-        else:
-            failed_attempts += 1
-            print(f"❌ Wrong BT password! Attempt {failed_attempts}/{MAX_ATTEMPTS}")
-            ble.send(f"ERROR:WRONG_PASSWORD:{failed_attempts}/{MAX_ATTEMPTS}\n")
+            reply("OK:UNLOCKED\n")
+    
+    elif command == "CHALLENGE":
+        reply(f"CHALLENGE:{sessions.challenge(conn)}\n")
+    
+    elif command.startswith("AUTH:"):
+        # AUTH:<password> or AUTH:<sha256(nonce + password) hex> after CHALLENGE
+        expected = sessions.expected(conn, CORRECT_PASSWORD)
+        answer = text[5:] if expected is None else text[5:].lower()  # Hex in either case
+        if pin_ok(answer, reply, conn, expected):
+            reply(f"OK:SESSION:{sessions.ttl_ms // 1000}\n")
+    
+    elif command == "LOGOUT":
+        sessions.end(conn)
+        reply("OK:LOGGED_OUT\n")
+    
+    elif command in ("OPEN", "TOGGLE") and not sessions.valid(conn):
+        reply("ERROR:AUTH_REQUIRED\n")
     
     elif command == "OPEN":
         open_lock()
-        ble.send("OK:OPENED\n")
+        reply("OK:OPENED\n")
     
     elif command == "CLOSE":
         close_lock()
-        ble.send("OK:CLOSED\n")
+        reply("OK:CLOSED\n")
     
     elif command == "TOGGLE":
         toggle_lock()
         state = "OPENED" if lock_state else "CLOSED"
-        ble.send(f"OK:{state}\n")
+        reply(f"OK:{state}\n")
     
     elif command == "STATUS":
         state = "OPENED" if lock_state else "CLOSED"
-        ble.send(f"STATUS:{state}\n")
+        reply(f"STATUS:{state},OPEN_MS:{relock.remaining_ms()}\n")
+    
+    elif command == "RELAY":
+        # Relay profile and energy per unlock
+        reply(relay_driver.status() + "\n")
     
     elif command == "INFO":
         # Send board information
         info = "BOARD:LILYGO_T8_V1.7_ESP32-WROVER_8MB_PSRAM\n"
-        ble.send(info)
+        reply(info)
     
     else:
-        ble.send("ERROR:UNKNOWN_COMMAND\n")
+        reply("ERROR:UNKNOWN_COMMAND\n")
+
+def on_disconnect(conn):
+    """Forget per-connection attempts (the session goes with the connection entry)"""
+    guard.drop(conn)
 
 # ===== BLUETOOTH SETUP =====
 print("\n" + "="*50)
@@ -231,10 +264,20 @@ print("="*50)
 print("Board: ESP32-WROVER with 8MB PSRAM")
 print("Initializing Bluetooth...")
 
-ble = BLESimplePeripheral("T8-SafeLock")
-ble.on_write(on_rx)
+ble = BLESimplePeripheral("T8-SafeLock", status=True, max_connections=MAX_CONNECTIONS)
+# Per-connection sessions: one PIN check, then OPEN/TOGGLE need no PIN
+sessions = Sessions(table=ble.connections)
+engine = CommandEngine(on_command)
+engine.attach(ble)
+console = open_console(engine, CONSOLE_PORT, CONSOLE_PINS, ROW_PINS + COL_PINS + [RELAY_PIN, 2])
+ble.on_disconnect(on_disconnect)
 print("✅ Bluetooth ready! Device name: T8-SafeLock")
 
+def publish_status():
+    """Keep the status characteristics current (subscribers notified on change)"""
+    ble.set_status(lock_state, guard.failures(throttle.KEYPAD) + guard.failures(BLE),
+                   relock.remaining_ms())
+
 # ===== MAIN LOOP =====
 def main():
     """Main program loop"""
@@ -245,22 +288,30 @@ def main():
     print("Keypad: Enter password, press # or C to submit")
     print("Keypad: Press * or A to clear")
     print("Keypad: Press B for emergency unlock")
-    print("Bluetooth: Send 'PASS:xxxx' or 'OPEN'/'CLOSE'")
+    print("Bluetooth: Send 'PASS:xxxx', or 'AUTH:xxxx' then 'OPEN'/'CLOSE'")
     print("="*50 + "\n")
     
     # Startup LED flash
-    for _ in range(3):
-        led.value(1)
-        time.sleep(0.1)
-        led.value(0)
-        time.sleep(0.1)
+    leds.play(START)
     
     while True:
         # Check for keypad input
         key = read_keypad()
         if key:
             process_keypad_input(key)
-        
+
+        # Commands from the wired console
+        if console is not None:
+            console.poll()
+
+        # Free the radio from a forgotten phone connection
+        ble.reap_idle(CONNECTED_IDLE_TIMEOUT)
+        publish_status()
+
+        # Collect garbage at a quiet point rather than mid-unlock
+        if not lock_state:
+            gcs.idle()
+
         # Small delay to prevent excessive CPU usage
         time.sleep_ms(50)
 
@@ -3,30 +3,94 @@ Digital Safe Locker - LILYGO T8 V1.7 - BATTERY OPTIMIZED
 ESP32-WROVER with deep sleep for extended battery life
 
 Features:
-- Deep sleep after inactivity
-- Wake on keypad press
+- Light-sleep naps when idle, deep sleep after inactivity
+- Idle timeout adapted to usage (gap history kept in RTC memory)
+- Battery monitor; low-power profile when the battery runs low
+- Energy accounting with a days-remaining estimate (ENERGY command)
+- Wake on keypad press, optional timer-wake BLE beacon
+- BLE bonding: known phones reconnect through a fast advertising burst
 - BLE only (no WiFi) for power saving
+- CPU clock at 80MHz when idle, boosted for BLE commands
 - Optimized for 2-3 months on 4x AA batteries
+- Optional door contact: relock as soon as the door shuts
 """
 
-from machine import Pin, deepsleep, reset
+from machine import Pin, ADC, deepsleep, reset
 import machine
 import time
 import bluetooth
+import struct
 from ble_simple_peripheral import BLESimplePeripheral
+from relay_driver import RelayDriver
+from relock_timer import RelockTimer
+from keypad_fsm import KeypadFsm, BASIC, O_UNLOCK, O_EMERGENCY, O_WRONG
+from throttle import Throttle, BLE
+import throttle
+from ble_session import Sessions
+from command_engine import CommandEngine, open_console
+from bond_store import BondStore
+from gc_scheduler import GcScheduler
+from led_patterns import PatternPlayer, START, WAKE
+from door_sensor import DoorSensor
+from power_manager import PowerManager, ACTIVE, DEEP
+from cpu_governor import CpuGovernor
+from rtc_state import RtcState
+from adaptive_idle import AdaptiveIdle
+import adaptive_idle
+from battery_monitor import BatteryMonitor
+import battery_monitor
+from energy_meter import EnergyMeter
+import energy_meter
+from beacon import Beacon, BEACON_ADV_US
 import esp32
 
 # ===== CONFIGURATION =====
 CORRECT_PASSWORD = "1234"
 LOCK_OPEN_TIME = 5
-MAX_ATTEMPTS = 3
+MAX_OPEN_TIME = 60  # Longest open window with EXTEND, from the unlock (seconds)
+MAX_ATTEMPTS = 3  # Wrong passwords before a lockout (per keypad / BLE connection)
+MAX_CONNECTIONS = 1  # Phones connected at once (up to 4)
+CONSOLE_PORT = None  # Wired command console: None, "usb" (USB-CDC) or a UART id
+CONSOLE_PINS = (25, 26)  # TX, RX for a UART console (GPIO16/17 belong to PSRAM, 21/22 to the keypad)
+LOCKOUT_TIME = 30  # First lockout in seconds, doubling on each further failure
+LOCKOUT_MAX = 3600  # Longest lockout in seconds
 
 # Power saving settings
-IDLE_TIMEOUT = 30  # Seconds before deep sleep
-DEEP_SLEEP_DURATION = 1000 * 60 * 5  # 5 minutes in milliseconds
+LIGHT_SLEEP_AFTER = 5  # Seconds before light-sleep naps between key polls
+IDLE_TIMEOUT = 30  # Seconds before deep sleep until usage history builds up
+IDLE_MIN = 5       # Bounds for the adaptive idle timeout
+IDLE_MAX = 120
+CONNECTED_IDLE_TIMEOUT = 300  # Seconds a silent BLE connection may keep us awake
+DEEP_SLEEP_DURATION = 1000 * 60 * 5  # Beacon wake period: 5 minutes in milliseconds
+BEACON_WINDOW_MS = 0  # Advertise this long after each timer wake, 0 = keypad wake only
 
 # ===== LILYGO T8 V1.7 PIN DEFINITIONS =====
 RELAY_PIN = 32
+RELAY_PROFILE = "full"  # See relay_driver.PROFILES ("relay_module" to save power)
+DOOR_PIN = None  # Reed switch to GND (e.g. 4), None = no door sensor
+
+# Battery ADC: the T8 measures its LiPo connector on GPIO35 through a 1:2
+# divider. For a 4x AA pack use "aa4" and your own divider to an ADC1 pin.
+BATTERY_PIN = 35  # None = no battery monitor
+BATTERY_DIVIDER = 2.0
+BATTERY_TYPE = "lipo"  # See battery_monitor.CURVES
+BATTERY_LOW = 20  # Percent: slower advertising, short idle timeout, no LED
+BATTERY_MAH = 2500  # Capacity for the days-remaining estimate
+
+# Current per state (mA): active, light sleep, deep sleep, BLE connected,
+# relay on, LED on. Measure your board and adjust, see energy_meter.MODEL_MA
+ENERGY_MODEL_MA = (40.0, 3.0, 0.15, 10.0, 40.0, 5.0)
+
+ADV_INTERVAL_US = 500000
+LOW_BATTERY_ADV_US = 2000000
+LOW_BATTERY_IDLE_MAX = 10
+
+# Scan response status: company ID + flags byte + battery percent
+ADV_COMPANY_ID = 0xFFFF  # Reserved test ID
+ADV_LOCK_OPEN = 0x01
+ADV_DOOR_OPEN = 0x02
+ADV_DOOR_SENSOR = 0x04
+ADV_LOW_BATTERY = 0x08
 
 # Keypad pins (3 rows, 4 columns)
 ROW_PINS = [22, 21, 15]
@@ -40,7 +104,7 @@ KEYS = [
 
 # ===== HARDWARE SETUP =====
 relay = Pin(RELAY_PIN, Pin.OUT)
-relay.value(0)
+relay_driver = RelayDriver(relay, RELAY_PROFILE)
 
 rows = [Pin(pin, Pin.OUT) for pin in ROW_PINS]
 for row in rows:
@@ -48,64 +112,170 @@ for row in rows:
 
 cols = [Pin(pin, Pin.IN, Pin.PULL_UP) for pin in COL_PINS]
 
+# Usage history in RTC memory (survives deep sleep)
+rtc_mem = RtcState((
+    ('idle', adaptive_idle.STATE_SIZE),
+    ('battery', battery_monitor.STATE_SIZE),
+    ('energy', energy_meter.STATE_SIZE),
+    ('throttle', throttle.STATE_SIZE),
+))
+adaptive = AdaptiveIdle(rtc_mem.region('idle'), IDLE_MIN, IDLE_MAX, IDLE_TIMEOUT)
+
+battery = None
+if BATTERY_PIN is not None:
+    battery_adc = ADC(Pin(BATTERY_PIN))
+    battery_adc.atten(ADC.ATTN_11DB)
+    battery = BatteryMonitor(battery_adc, BATTERY_DIVIDER, BATTERY_TYPE, BATTERY_LOW,
+                             state=rtc_mem.region('battery'))
+
+energy = EnergyMeter(rtc_mem.region('energy'), ENERGY_MODEL_MA, BATTERY_MAH)
+# Lockout deadlines are RTC clock seconds, so they keep running in deep sleep
+guard = Throttle(rtc_mem.region('throttle'), MAX_ATTEMPTS, LOCKOUT_TIME, LOCKOUT_MAX,
+                 save=rtc_mem.save)
+
+power = PowerManager(LIGHT_SLEEP_AFTER, adaptive.timeout)
+power.set_keypad(rows, cols)
+cpu = CpuGovernor()
+gcs = GcScheduler()
+beacon = Beacon(DEEP_SLEEP_DURATION, BEACON_WINDOW_MS)
+
 led = Pin(2, Pin.OUT)
+leds = PatternPlayer(led)
 
 # ===== GLOBAL VARIABLES =====
-entered_password = ""
-failed_attempts = 0
 lock_state = False
 last_activity = time.time()
 
 # ===== POWER MANAGEMENT =====
 def check_idle_timeout():
     """Check if system should enter deep sleep"""
-    global last_activity
-    if time.time() - last_activity > IDLE_TIMEOUT:
+    if ble.is_connected():
+        # Never sleep under a connected phone; drop it once it goes quiet
+        if ble.reap_idle(CONNECTED_IDLE_TIMEOUT):
+            power.activity()  # Advertise a full idle period before sleeping
+        return
+    if power.tier() == DEEP:
         print("💤 Entering deep sleep to save battery...")
         close_lock()
-        led.value(0)
         time.sleep(1)
-
-        # Configure wake on ANY keypad button press
-        # Columns are PULL_UP (HIGH when idle, LOW when pressed)
-        # Wake when ANY column pin goes LOW
-        esp32.wake_on_ext1(
-            pins=(Pin(13), Pin(12), Pin(14), Pin(27)),
-            level=esp32.WAKEUP_ALL_LOW
-        )
-
-        # Sleep indefinitely until keypad press (no auto-wake timer)
-        deepsleep()
-
-def reset_activity_timer():
-    """Reset the inactivity timer"""
+        enter_deep_sleep()
+
+def enter_deep_sleep():
+    """Save RTC state, then sleep until a key press or the beacon timer"""
+    leds.stop()  # LED forced off
+    energy.update(ACTIVE, ble.is_connected())
+    energy.sleeping()
+    bonds.flush()
+    rtc_mem.save()
+
+    # Configure wake on ANY keypad button press
+    # Columns are PULL_UP (HIGH when idle, LOW when pressed)
+    # Wake when ANY column pin goes LOW
+    esp32.wake_on_ext1(
+        pins=(Pin(13), Pin(12), Pin(14), Pin(27)),
+        level=esp32.WAKEUP_ALL_LOW
+    )
+
+    # Beacon timer wake, keypad only in the low-battery profile
+    period = None if low_power() else beacon.sleep_ms()
+    if period:
+        deepsleep(period)
+    deepsleep()
+
+def beacon_window():
+    """After a timer wake: advertise briefly, then sleep again unless needed"""
+    if not beacon.timer_wake():
+        return
+    ble.set_adv_interval(BEACON_ADV_US)
+    if not beacon.listen(beacon_keep_awake):
+        enter_deep_sleep()
+    print("📡 Beacon: staying awake")
+    apply_power_profile()
+
+def beacon_keep_awake():
+    if ble.is_connected():
+        return True
+    key = read_keypad()
+    if key:
+        process_keypad_input(key)
+        return True
+    return False
+
+def reset_activity_timer(unlock=False):
+    """Reset the inactivity timer and re-pick the adaptive idle timeout"""
     global last_activity
     last_activity = time.time()
+    power.activity()
+    power.set_thresholds(LIGHT_SLEEP_AFTER, adaptive.activity(unlock))
 
 def check_wakeup_reason():
     """Check why ESP32 woke up"""
     if machine.reset_cause() == machine.DEEPSLEEP_RESET:
         print("🔄 Woke from deep sleep")
-        # Quick LED flash to indicate wake
-        led.value(1)
-        time.sleep(0.2)
-        led.value(0)
+        # Quick LED flash to indicate a keypad wake
+        if not beacon.timer_wake():
+            led_flash(WAKE)
+            # A key press usually means a phone is about to connect too
+            if bonds.count():
+                ble.fast_advertise()
+
+def low_power():
+    return battery is not None and battery.low
+
+def led_flash(pattern):
+    """LED effects (non-blocking), skipped while open and in the low-battery profile"""
+    if low_power() or lock_state:
+        return
+    leds.play(pattern)
+
+def poll_battery():
+    """Sample rarely, and never under relay load"""
+    was_low = low_power()
+    if battery is not None and battery.poll(busy=relay_driver.is_on()):
+        print(f"🔋 {battery.status()}")
+        if low_power() and not was_low:
+            print("🪫 Low battery: power saving profile")
+        on_battery()
+
+def on_battery():
+    if battery is not None and battery.percent() is not None:
+        ble.set_battery_level(battery.percent())
+    apply_power_profile()
+    update_advertising()
+
+def apply_power_profile():
+    """Slower advertising and a short idle timeout while the battery is low"""
+    low = low_power()
+    idle_max = LOW_BATTERY_IDLE_MAX if low else IDLE_MAX
+    adaptive.set_bounds(IDLE_MIN, idle_max, min(IDLE_TIMEOUT, idle_max))
+    power.set_thresholds(LIGHT_SLEEP_AFTER, adaptive.timeout)
+    ble.set_adv_interval(LOW_BATTERY_ADV_US if low else ADV_INTERVAL_US)
 
 # ===== DOOR LOCK FUNCTIONS =====
 def open_lock():
     global lock_state
     print("🔓 Lock OPENED")
-    relay.value(1)
-    led.value(1)
+    relay_driver.on()
+    leds.stop()
+    if not low_power():
+        led.value(1)
     lock_state = True
-    reset_activity_timer()
+    relock.arm(LOCK_OPEN_TIME)
+    if door is not None:
+        door.unlocked()
+    update_advertising()
+    reset_activity_timer(unlock=True)
 
 def close_lock():
     global lock_state
     print("🔒 Lock CLOSED")
-    relay.value(0)
+    relock.cancel()
+    relay_driver.off()
     led.value(0)
     lock_state = False
+    if door is not None:
+        door.locked()
+    update_advertising()
 
 def toggle_lock():
     if lock_state:
@@ -113,6 +283,38 @@ def toggle_lock():
     else:
         open_lock()
 
+# Relock at the deadline from a hardware timer, even if the loop is busy
+relock = RelockTimer(close_lock)
+
+# ===== DOOR SENSOR =====
+def early_relock():
+    """Door shut after being opened: cut the relay now"""
+    print("🚪 Door shut, relocking early")
+    close_lock()
+
+def on_door(is_open):
+    reset_activity_timer()
+    if is_open:
+        print("🚪 Door opened")
+    else:
+        print(f"🚪 Door closed after {door.last_open_ms}ms")
+    update_advertising()
+
+def update_advertising():
+    """Publish lock/door/battery state so phones can read it without connecting"""
+    flags = ADV_LOCK_OPEN if lock_state else 0
+    if door is not None:
+        flags |= ADV_DOOR_SENSOR | (ADV_DOOR_OPEN if door.is_open else 0)
+    if low_power():
+        flags |= ADV_LOW_BATTERY
+    percent = battery.percent() if battery is not None else None
+    level = 0xFF if percent is None else percent
+    ble.set_manufacturer_data(struct.pack("<HBB", ADV_COMPANY_ID, flags, level))
+
+door = None
+if DOOR_PIN is not None:
+    door = DoorSensor(Pin(DOOR_PIN, Pin.IN, Pin.PULL_UP), early_relock, on_door)
+
 # ===== KEYPAD FUNCTIONS =====
 def read_keypad():
     for row_num, row_pin in enumerate(rows):
@@ -129,102 +331,133 @@ def read_keypad():
         row_pin.value(1)
     return None
 
+def on_keypad(outcome, arg):
+    """Side effects of keypad outcomes (the state machine prints the messages)"""
+    if outcome in (O_UNLOCK, O_EMERGENCY):
+        open_lock()
+
+# PIN entry; BLE PASS is checked here too, throttled on its own channel
+keypad = KeypadFsm(BASIC, on_keypad, lambda: CORRECT_PASSWORD, guard)
+
 def process_keypad_input(key):
-    global entered_password, failed_attempts
-    
     print(f"Key pressed: {key}")
-    
-    if key == '#' or key == 'C':
-        if entered_password == CORRECT_PASSWORD:
-            print("✅ Correct password!")
-            open_lock()
-            time.sleep(LOCK_OPEN_TIME)
-            close_lock()
-            failed_attempts = 0
-        else:
-            failed_attempts += 1
-            print(f"❌ Wrong password! Attempt {failed_attempts}/{MAX_ATTEMPTS}")
-            if failed_attempts >= MAX_ATTEMPTS:
-                print("🚨 TOO MANY FAILED ATTEMPTS! Locking for 30 seconds...")
-                time.sleep(30)
-                failed_attempts = 0
-        entered_password = ""
-        
-    elif key == '*' or key == 'A':
-        entered_password = ""
-        print("🔄 Password cleared")
-        
-    elif key == 'B':
-        print("⚡ Emergency unlock!")
-        open_lock()
-        time.sleep(LOCK_OPEN_TIME)
-        close_lock()
-        
-    else:
-        if len(entered_password) < 8:
-            entered_password += key
-            print(f"Password: {'*' * len(entered_password)}")
+    keypad.key(key)
 
 # ===== BLUETOOTH FUNCTIONS =====
-def on_rx(data):
-    global failed_attempts
-    reset_activity_timer()
 
-    try:
-        if not data:
-            return
-        command = data.decode().strip().upper()
-        print(f"BT Command: {command}")
-    except Exception as e:
-        print(f"BT: Decode error: {e}")
-        return
-    
-    try:
-        if command.startswith("PASS:"):
-            password = command[5:]
-            if password == CORRECT_PASSWORD:
-                print("✅ Correct BT password!")
-                # Send response BEFORE delay to avoid connection timeout crash
-                ble.send("OK:OPENING\n")
-                open_lock()
-                time.sleep(LOCK_OPEN_TIME)
-                close_lock()
-                failed_attempts = 0
-            else:
-                failed_attempts += 1
-                ble.send(f"ERROR:WRONG_PASSWORD:{failed_attempts}/{MAX_ATTEMPTS}\n")
-
-        elif command == "OPEN":
+def pin_ok(candidate, reply, conn, expected=None):
+    """Check a remote PIN (or challenge answer); sends the error reply if wrong"""
+    outcome = keypad.verify(candidate, BLE, conn, expected)
+    if outcome == O_UNLOCK:
+        sessions.start(conn)
+        return True
+    if outcome == O_WRONG:
+        reply(f"ERROR:WRONG_PASSWORD:{guard.failures(BLE, conn)}/{MAX_ATTEMPTS}\n")
+    else:
+        reply(f"ERROR:LOCKED_OUT:{guard.retry_after(BLE, conn)}\n")
+    return False
+
+def on_command(command, reply, conn):
+    """Handle a command from BLE or the wired console"""
+    cpu.boost()
+    reset_activity_timer()
+    text = command  # As sent: passwords are case-sensitive
+    command = command.upper()
+    print(f"Command: {command}")
+
+    if command.startswith("PASS:"):
+        if pin_ok(text[5:], reply, conn):
+            print("✅ Correct BT password!")
+            # Send response BEFORE delay to avoid connection timeout crash
+            reply("OK:OPENING\n")
             open_lock()
-            ble.send("OK:OPENED\n")
 
-        elif command == "CLOSE":
-            close_lock()
-            ble.send("OK:CLOSED\n")
+    elif command == "CHALLENGE":
+        reply(f"CHALLENGE:{sessions.challenge(conn)}\n")
 
-        elif command == "TOGGLE":
-            toggle_lock()
-            state = "OPENED" if lock_state else "CLOSED"
-            ble.send(f"OK:{state}\n")
+    elif command.startswith("AUTH:"):
+        # AUTH:<password> or AUTH:<sha256(nonce + password) hex> after CHALLENGE
+        expected = sessions.expected(conn, CORRECT_PASSWORD)
+        answer = text[5:] if expected is None else text[5:].lower()  # Hex in either case
+        if pin_ok(answer, reply, conn, expected):
+            reply(f"OK:SESSION:{sessions.ttl_ms // 1000}\n")
 
-        elif command == "STATUS":
-            state = "OPENED" if lock_state else "CLOSED"
-            uptime = time.time()
-            ble.send(f"STATUS:{state},UPTIME:{uptime}s\n")
+    elif command == "LOGOUT":
+        sessions.end(conn)
+        reply("OK:LOGGED_OUT\n")
 
-        elif command == "SLEEP":
-            ble.send("OK:ENTERING_SLEEP\n")
-            time.sleep(1)
-            check_idle_timeout()
+    elif (command in ("OPEN", "TOGGLE") or command.startswith("EXTEND:")) and not sessions.valid(conn):
+        reply("ERROR:AUTH_REQUIRED\n")
 
-        else:
-            ble.send("ERROR:UNKNOWN_COMMAND\n")
-    except Exception as e:
-        print(f"BT: Command error: {e}")
+    elif command == "OPEN":
+        open_lock()
+        reply("OK:OPENED\n")
+
+    elif command == "CLOSE":
+        close_lock()
+        reply("OK:CLOSED\n")
+
+    elif command == "TOGGLE":
+        toggle_lock()
+        state = "OPENED" if lock_state else "CLOSED"
+        reply(f"OK:{state}\n")
+
+    elif command == "STATUS":
+        state = "OPENED" if lock_state else "CLOSED"
+        uptime = time.time()
+        door_state = door.status() if door is not None else "NONE"
+        batt = battery.status() if battery is not None else "BATT:NONE"
+        reply(f"STATUS:{state},UPTIME:{uptime}s,OPEN_MS:{relock.remaining_ms()},DOOR:{door_state},"
+                 f"{adaptive.status()},{batt}\n")
+
+    elif command.startswith("EXTEND:"):
         try:
-            ble.send(f"ERROR:EXCEPTION:{e}\n")
-        except:
-            pass
+            seconds = int(command[7:])
+        except ValueError:
+            seconds = None
+        if seconds is None:
+            reply("ERROR:INVALID_FORMAT\n")
+        elif seconds <= 0:
+            reply("ERROR:OUT_OF_RANGE\n")
+        elif lock_state:
+            remaining = relock.extend(seconds, MAX_OPEN_TIME)
+            reply(f"OK:EXTENDED:{remaining}\n")
+        else:
+            reply("ERROR:LOCK_CLOSED\n")
+
+    elif command == "MEM":
+        reply(gcs.status() + "\n")
+
+    elif command == "RELAY":
+        reply(relay_driver.status() + "\n")
+
+    elif command == "POWER":
+        reply(power.status() + "\n")
+
+    elif command == "CPU":
+        reply(cpu.status() + "\n")
+
+    elif command == "BONDS":
+        reply(bonds.status() + "\n")
+
+    elif command == "BEACON":
+        reply(beacon.status() + "\n")
+
+    elif command == "ENERGY":
+        percent = battery.percent() if battery is not None else None
+        reply(energy.status(percent) + "\n")
+
+    elif command == "SLEEP":
+        reply("OK:ENTERING_SLEEP\n")
+        time.sleep(1)
+        check_idle_timeout()
+
+    else:
+        reply("ERROR:UNKNOWN_COMMAND\n")
+
+def on_disconnect(conn):
+    """Forget per-connection attempts (the session goes with the connection entry)"""
+    guard.drop(conn)
 
 # ===== BLUETOOTH SETUP =====
 print("\n" + "="*50)
@@ -232,42 +465,72 @@ print("  LILYGO T8 V1.7 - BATTERY OPTIMIZED")
 print("="*50)
 print("Initializing Bluetooth (BLE only)...")
 
-ble = BLESimplePeripheral("T8-SafeLock")
-ble.on_write(on_rx)
+bonds = BondStore()
+ble = BLESimplePeripheral("T8-SafeLock", battery=True, bonds=bonds, status=True,
+                          max_connections=MAX_CONNECTIONS)
+# Per-connection sessions: one PIN check, then OPEN/TOGGLE need no PIN
+sessions = Sessions(table=ble.connections)
+engine = CommandEngine(on_command)
+engine.attach(ble)
+console = open_console(engine, CONSOLE_PORT, CONSOLE_PINS,
+                       ROW_PINS + COL_PINS + [RELAY_PIN, 2, DOOR_PIN, BATTERY_PIN])
+ble.on_disconnect(on_disconnect)
+on_battery()
 print("✅ Bluetooth ready!")
 
-# Check wakeup reason
+# Timer wakes only advertise for a moment, then check wakeup reason
+beacon_window()
 check_wakeup_reason()
 
+def publish_status():
+    """Keep the status characteristics current (subscribers notified on change)"""
+    ble.set_status(lock_state, guard.failures(throttle.KEYPAD) + guard.failures(BLE),
+                   relock.remaining_ms())
+
 # ===== MAIN LOOP =====
 def main():
     print("\n" + "="*50)
     print("  BATTERY OPTIMIZED SAFE LOCKER")
     print("="*50)
     print("🔋 Power saving mode enabled")
-    print(f"💤 Sleep after {IDLE_TIMEOUT}s idle")
+    print(f"💤 Sleep after {adaptive.timeout}s idle (adaptive {IDLE_MIN}-{IDLE_MAX}s)")
     print("="*50 + "\n")
     
     reset_activity_timer()
     
     # Startup LED pattern
-    for _ in range(3):
-        led.value(1)
-        time.sleep(0.1)
-        led.value(0)
-        time.sleep(0.1)
+    led_flash(START)
     
     while True:
         # Check for keypad input
         key = read_keypad()
         if key:
             process_keypad_input(key)
+
+        # Commands from the wired console
+        if console is not None:
+            console.poll()
+
+        if door is not None:
+            door.poll()
+
+        poll_battery()
         
         # Check for idle timeout
         check_idle_timeout()
-        
-        # Small delay
-        time.sleep_ms(50)
+        ble.step()
+        publish_status()
+
+        cpu.relax()
+
+        # Collect garbage and save new bonds at a quiet point rather than mid-unlock
+        if not lock_state:
+            gcs.idle()
+            bonds.flush()
+
+        # Poll while the lock is open, light-sleep naps once idle
+        tier = power.step(busy=lock_state or leds.playing())
+        energy.update(tier, ble.is_connected(), relay_driver.is_on(), led.value())
 
 # ===== START PROGRAM =====
 if __name__ == "__main__":
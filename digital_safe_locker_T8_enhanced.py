@@ -14,18 +14,38 @@ import time
 import bluetooth
 import json
 from ble_simple_peripheral import BLESimplePeripheral
+from relay_driver import RelayDriver
+from relock_timer import RelockTimer
+from keypad_fsm import (KeypadFsm, MANAGED, O_UNLOCK, O_WRONG, O_LOCKOUT, O_CHANGE,
+                        O_OLD_OK, O_OLD_WRONG, O_NEW_OK, O_TOO_SHORT, O_CHANGED,
+                        O_MISMATCH, O_CANCELLED, O_ADMIN_RESET)
+from throttle import Throttle, BLE
+import throttle
+from rtc_state import RtcState
+from ble_session import Sessions
+from command_engine import CommandEngine, open_console
+from gc_scheduler import GcScheduler
+from led_patterns import (PatternPlayer, blink, KEY, START, OK, MODE, CANCEL, CHANGED,
+                          ERROR, RESET, LOCKOUT)
 
 # ===== CONFIGURATION =====
 DEFAULT_PASSWORD = "1234"  # Factory default
 ADMIN_PASSWORD = "9999"    # Admin password (change this!)
 LOCK_OPEN_TIME = 5
-MAX_ATTEMPTS = 3
+MAX_ATTEMPTS = 3  # Wrong passwords before a lockout (per keypad / BLE connection)
+MAX_CONNECTIONS = 1  # Phones connected at once (up to 4)
+CONSOLE_PORT = None  # Wired command console: None, "usb" (USB-CDC) or a UART id
+CONSOLE_PINS = (25, 26)  # TX, RX for a UART console (GPIO16/17 belong to PSRAM, 21/22 to the keypad)
+LOCKOUT_TIME = 30  # First lockout in seconds, doubling on each further failure
+LOCKOUT_MAX = 3600  # Longest lockout in seconds
+CONNECTED_IDLE_TIMEOUT = 300  # Drop a BLE connection silent for this long (seconds)
 
 # Password storage file
 PASSWORD_FILE = "password.json"
 
 # ===== LILYGO T8 PIN DEFINITIONS =====
 RELAY_PIN = 32
+RELAY_PROFILE = "full"  # See relay_driver.PROFILES ("relay_module" to save power)
 
 # 4x3 Keypad pins (3 rows, 4 columns)
 ROW_PINS = [22, 21, 15]
@@ -39,7 +59,7 @@ KEYS = [
 
 # ===== HARDWARE SETUP =====
 relay = Pin(RELAY_PIN, Pin.OUT)
-relay.value(0)
+relay_driver = RelayDriver(relay, RELAY_PROFILE)
 
 rows = [Pin(pin, Pin.OUT) for pin in ROW_PINS]
 for row in rows:
@@ -48,19 +68,19 @@ for row in rows:
 cols = [Pin(pin, Pin.IN, Pin.PULL_UP) for pin in COL_PINS]
 
 led = Pin(2, Pin.OUT)
+leds = PatternPlayer(led)  # Non-blocking feedback patterns
+
+gcs = GcScheduler()
+
+# Failed attempts and lockout deadlines, kept in RTC memory across resets
+rtc_mem = RtcState((('throttle', throttle.STATE_SIZE),))
+guard = Throttle(rtc_mem.region('throttle'), MAX_ATTEMPTS, LOCKOUT_TIME, LOCKOUT_MAX,
+                 save=rtc_mem.save)
 
 # ===== GLOBAL VARIABLES =====
-entered_password = ""
-failed_attempts = 0
 lock_state = False
 current_password = DEFAULT_PASSWORD
 
-# Password change mode
-change_password_mode = False
-new_password_entry = ""
-confirm_password_entry = ""
-password_change_step = 0  # 0=old, 1=new, 2=confirm
-
 # ===== PASSWORD MANAGEMENT =====
 def load_password():
     """Load password from file"""
@@ -101,14 +121,17 @@ def reset_password():
 def open_lock():
     global lock_state
     print("🔓 Lock OPENED")
-    relay.value(1)
+    relay_driver.on()
+    leds.stop()
     led.value(1)
     lock_state = True
+    relock.arm(LOCK_OPEN_TIME)
 
 def close_lock():
     global lock_state
     print("🔒 Lock CLOSED")
-    relay.value(0)
+    relock.cancel()
+    relay_driver.off()
     led.value(0)
     lock_state = False
 
@@ -118,14 +141,14 @@ def toggle_lock():
     else:
         open_lock()
 
+# Relock at the deadline from a hardware timer, even if the loop is busy
+relock = RelockTimer(close_lock)
+
 # ===== LED FEEDBACK =====
-def led_blink(times, delay_ms=200):
-    """Blink LED for feedback"""
-    for _ in range(times):
-        led.value(1)
-        time.sleep_ms(delay_ms)
-        led.value(0)
-        time.sleep_ms(delay_ms)
+def led_blink(pattern):
+    """Play a feedback pattern without blocking (the open lock keeps its LED on)"""
+    if not lock_state:
+        leds.play(pattern)
 
 # ===== KEYPAD FUNCTIONS =====
 def read_keypad():
@@ -139,153 +162,103 @@ def read_keypad():
                         time.sleep_ms(10)
                     row_pin.value(1)
                     # Brief LED flash on key press
-                    led.value(1)
-                    time.sleep_ms(50)
-                    led.value(0)
+                    led_blink(KEY)
                     return KEYS[row_num][col_num]
         row_pin.value(1)
     return None
 
+# LED pattern for each keypad outcome that only needs feedback
+FEEDBACK = {
+    O_CHANGE: MODE, O_OLD_OK: OK, O_NEW_OK: OK, O_CHANGED: CHANGED,
+    O_OLD_WRONG: ERROR, O_TOO_SHORT: ERROR, O_MISMATCH: ERROR,
+    O_CANCELLED: CANCEL, O_ADMIN_RESET: RESET,
+}
+
+def on_keypad(outcome, arg):
+    """Side effects of keypad outcomes (the state machine prints the messages)"""
+    global current_password
+    if outcome == O_UNLOCK:
+        open_lock()
+    elif outcome == O_WRONG:
+        led_blink(blink(arg, 150))
+    elif outcome == O_LOCKOUT:
+        led_blink(LOCKOUT)  # The loop keeps running during the lockout
+    elif outcome == O_CHANGED:
+        current_password = arg
+        save_password(current_password)
+    elif outcome == O_ADMIN_RESET:
+        reset_password()
+    pattern = FEEDBACK.get(outcome)
+    if pattern is not None:
+        led_blink(pattern)
+
+# Unlock, password change (A) and admin reset (B); BLE PASS is checked here too
+keypad = KeypadFsm(MANAGED, on_keypad, lambda: current_password, guard, admin=ADMIN_PASSWORD)
+
 def process_keypad_input(key):
     """Process keypad button press"""
-    global entered_password, failed_attempts
-    global change_password_mode, new_password_entry, confirm_password_entry, password_change_step
-    
     print(f"Key pressed: {key}")
-    
-    # ===== PASSWORD CHANGE MODE =====
-    if change_password_mode:
-        if key == '#' or key == 'C':  # Submit
-            if password_change_step == 0:  # Old password entered
-                if entered_password == current_password:
-                    print("✅ Old password correct. Enter NEW password:")
-                    led_blink(2)  # Success indication
-                    password_change_step = 1
-                    entered_password = ""
-                else:
-                    print("❌ Wrong old password!")
-                    led_blink(5, 100)  # Error indication
-                    change_password_mode = False
-                    password_change_step = 0
-                    entered_password = ""
-            
-            elif password_change_step == 1:  # New password entered
-                if len(entered_password) >= 4:
-                    new_password_entry = entered_password
-                    print("✅ New password set. CONFIRM new password:")
-                    led_blink(2)
-                    password_change_step = 2
-                    entered_password = ""
-                else:
-                    print("❌ Password too short (min 4 digits)")
-                    led_blink(5, 100)
-                    entered_password = ""
-            
-            elif password_change_step == 2:  # Confirm password
-                if entered_password == new_password_entry:
-                    current_password = new_password_entry
-                    save_password(current_password)
-                    print("🎉 Password changed successfully!")
-                    led_blink(3, 300)  # Success pattern
-                    change_password_mode = False
-                    password_change_step = 0
-                    entered_password = ""
-                    new_password_entry = ""
-                    confirm_password_entry = ""
-                else:
-                    print("❌ Passwords don't match! Try again.")
-                    led_blink(5, 100)
-                    password_change_step = 1
-                    entered_password = ""
-                    new_password_entry = ""
-        
-        elif key == '*' or key == 'A':  # Cancel
-            print("🔄 Password change cancelled")
-            led_blink(1, 500)
-            change_password_mode = False
-            password_change_step = 0
-            entered_password = ""
-            new_password_entry = ""
-        
-        else:  # Number key
-            if len(entered_password) < 8:
-                entered_password += key
-                print(f"Password: {'*' * len(entered_password)}")
-    
-    # ===== NORMAL UNLOCK MODE =====
-    else:
-        if key == '#' or key == 'C':  # Submit/Unlock
-            if entered_password == current_password:
-                print("✅ Correct password!")
-                open_lock()
-                time.sleep(LOCK_OPEN_TIME)
-                close_lock()
-                failed_attempts = 0
-            else:
-                failed_attempts += 1
-                print(f"❌ Wrong password! Attempt {failed_attempts}/{MAX_ATTEMPTS}")
-                led_blink(failed_attempts, 150)
-                
-                if failed_attempts >= MAX_ATTEMPTS:
-                    print("🚨 TOO MANY FAILED ATTEMPTS! Locking for 30 seconds...")
-                    for _ in range(30):
-                        led.value(1)
-                        time.sleep(0.5)
-                        led.value(0)
-                        time.sleep(0.5)
-                    failed_attempts = 0
-            
-            entered_password = ""
-        
-        elif key == '*':  # Clear
-            entered_password = ""
-            print("🔄 Password cleared")
-        
-        elif key == 'A':  # Enter password change mode
-            print("🔑 Password change mode activated")
-            print("Enter OLD password:")
-            led_blink(2, 500)
-            change_password_mode = True
-            password_change_step = 0
-            entered_password = ""
-        
-        elif key == 'B':  # Admin reset (requires admin password)
-            if entered_password == ADMIN_PASSWORD:
-                print("⚡ Admin reset activated!")
-                reset_password()
-                entered_password = ""
-                led_blink(5, 100)
-            else:
-                print("❌ Admin password required for reset")
-                entered_password = ""
-        
-        else:  # Number key
-            if len(entered_password) < 8:
-                entered_password += key
-                print(f"Password: {'*' * len(entered_password)}")
+    keypad.key(key)
 
 # ===== BLUETOOTH FUNCTIONS =====
-def on_rx(data):
-    """Handle received Bluetooth data"""
-    global failed_attempts, current_password
+
+def pin_ok(candidate, reply, conn, expected=None):
+    """Check a remote PIN (or challenge answer); sends the error reply if wrong"""
+    outcome = keypad.verify(candidate, BLE, conn, expected)
+    if outcome == O_UNLOCK:
+        sessions.start(conn)
+        return True
+    if outcome == O_WRONG:
+        reply(f"ERROR:WRONG_PASSWORD:{guard.failures(BLE, conn)}/{MAX_ATTEMPTS}\n")
+    else:
+        if outcome == O_LOCKOUT:
+            led_blink(LOCKOUT)
+        reply(f"ERROR:LOCKED_OUT:{guard.retry_after(BLE, conn)}\n")
+    return False
+
+def secret_ok(candidate, secret, reply, conn, wrong):
+    """Check the old or admin password under the same attempt limit as PASS"""
+    outcome = keypad.check(candidate, secret, BLE, conn)
+    if outcome == O_UNLOCK:
+        return True
+    if outcome == O_WRONG:
+        reply(wrong)
+    else:
+        if outcome == O_LOCKOUT:
+            led_blink(LOCKOUT)
+        reply(f"ERROR:LOCKED_OUT:{guard.retry_after(BLE, conn)}\n")
+    return False
+
+def on_command(command, reply, conn):
+    """Handle a command from BLE or the wired console"""
+    global current_password
     
-    command = data.decode().strip()
-    print(f"BT Command: {command}")
+    print(f"Command: {command}")
     
     # Parse command
     if command.startswith("PASS:"):
         # Unlock with password
-        password = command[5:]
-        if password == current_password:
+        if pin_ok(command[5:], reply, conn):
             print("✅ Correct BT password!")
             open_lock()
-            time.sleep(LOCK_OPEN_TIME)
-            close_lock()
-            ble.send("OK:UNLOCKED\n")
-            failed_attempts = 0
-        else:
-            failed_attempts += 1
-            ble.send(f"ERROR:WRONG_PASSWORD:{failed_attempts}/{MAX_ATTEMPTS}\n")
+            reply("OK:UNLOCKED\n")
+    
+    elif command == "CHALLENGE":
+        reply(f"CHALLENGE:{sessions.challenge(conn)}\n")
+    
+    elif command.startswith("AUTH:"):
+        # AUTH:<password> or AUTH:<sha256(nonce + password) hex> after CHALLENGE
+        expected = sessions.expected(conn, current_password)
+        answer = command[5:] if expected is None else command[5:].lower()  # Hex in either case
+        if pin_ok(answer, reply, conn, expected):
+            reply(f"OK:SESSION:{sessions.ttl_ms // 1000}\n")
+    
+    elif command == "LOGOUT":
+        sessions.end(conn)
+        reply("OK:LOGGED_OUT\n")
+    
+    elif command in ("OPEN", "TOGGLE") and not sessions.valid(conn):
+        reply("ERROR:AUTH_REQUIRED\n")
     
     elif command.startswith("CHANGE:"):
         # Change password: CHANGE:oldpass:newpass
@@ -294,66 +267,82 @@ def on_rx(data):
             old_pass = parts[1]
             new_pass = parts[2]
             
-            if old_pass == current_password:
+            if secret_ok(old_pass, current_password, reply, conn, "ERROR:WRONG_OLD_PASSWORD\n"):
                 if len(new_pass) >= 4:
                     current_password = new_pass
                     save_password(current_password)
                     print("🎉 Password changed via BLE!")
-                    led_blink(3, 300)
-                    ble.send("OK:PASSWORD_CHANGED\n")
+                    led_blink(CHANGED)
+                    reply("OK:PASSWORD_CHANGED\n")
                 else:
-                    ble.send("ERROR:PASSWORD_TOO_SHORT\n")
-            else:
-                ble.send("ERROR:WRONG_OLD_PASSWORD\n")
+                    reply("ERROR:PASSWORD_TOO_SHORT\n")
         else:
-            ble.send("ERROR:INVALID_FORMAT\n")
+            reply("ERROR:INVALID_FORMAT\n")
     
     elif command.startswith("RESET:"):
         # Reset password: RESET:adminpass
         admin_pass = command[6:]
-        if admin_pass == ADMIN_PASSWORD:
+        if secret_ok(admin_pass, ADMIN_PASSWORD, reply, conn, "ERROR:WRONG_ADMIN_PASSWORD\n"):
             reset_password()
-            led_blink(5, 100)
-            ble.send("OK:PASSWORD_RESET\n")
-        else:
-            ble.send("ERROR:WRONG_ADMIN_PASSWORD\n")
+            led_blink(RESET)
+            reply("OK:PASSWORD_RESET\n")
     
     elif command == "OPEN":
         open_lock()
-        ble.send("OK:OPENED\n")
+        reply("OK:OPENED\n")
     
     elif command == "CLOSE":
         close_lock()
-        ble.send("OK:CLOSED\n")
+        reply("OK:CLOSED\n")
     
     elif command == "TOGGLE":
         toggle_lock()
         state = "OPENED" if lock_state else "CLOSED"
-        ble.send(f"OK:{state}\n")
+        reply(f"OK:{state}\n")
     
     elif command == "STATUS":
         state = "OPENED" if lock_state else "CLOSED"
-        ble.send(f"STATUS:{state}\n")
+        reply(f"STATUS:{state},OPEN_MS:{relock.remaining_ms()}\n")
+    
+    elif command == "RELAY":
+        reply(relay_driver.status() + "\n")
+    
+    elif command == "MEM":
+        reply(gcs.status() + "\n")
     
     elif command == "INFO":
         info = f"BOARD:LILYGO_T8_V1.7,PASS_LEN:{len(current_password)}\n"
-        ble.send(info)
+        reply(info)
     
     else:
-        ble.send("ERROR:UNKNOWN_COMMAND\n")
+        reply("ERROR:UNKNOWN_COMMAND\n")
+
+def on_disconnect(conn):
+    """Forget per-connection attempts (the session goes with the connection entry)"""
+    guard.drop(conn)
 
 # ===== BLUETOOTH SETUP =====
 print("\n" + "="*50)
 print("  LILYGO T8 V1.7 - ENHANCED SAFE LOCKER")
 print("="*50)
 print("Initializing Bluetooth...")
-ble = BLESimplePeripheral("T8-SafeLock")
-ble.on_write(on_rx)
+ble = BLESimplePeripheral("T8-SafeLock", status=True, max_connections=MAX_CONNECTIONS)
+# Per-connection sessions: one PIN check, then OPEN/TOGGLE need no PIN
+sessions = Sessions(table=ble.connections)
+engine = CommandEngine(on_command)
+engine.attach(ble)
+console = open_console(engine, CONSOLE_PORT, CONSOLE_PINS, ROW_PINS + COL_PINS + [RELAY_PIN, 2])
+ble.on_disconnect(on_disconnect)
 print("✅ Bluetooth ready!")
 
 # Load saved password
 load_password()
 
+def publish_status():
+    """Keep the status characteristics current (subscribers notified on change)"""
+    ble.set_status(lock_state, guard.failures(throttle.KEYPAD) + guard.failures(BLE),
+                   relock.remaining_ms())
+
 # ===== MAIN LOOP =====
 def main():
     print("\n" + "="*50)
@@ -369,20 +358,34 @@ def main():
     print("  [B]+# - Admin reset (enter admin pass first)")
     print("\nBLE Commands:")
     print("  PASS:xxxx      - Unlock")
+    print("  AUTH:xxxx      - Start a session for OPEN/TOGGLE")
     print("  CHANGE:old:new - Change password")
     print("  RESET:admin    - Reset to default")
     print("  STATUS         - Get lock status")
     print("  INFO           - Board information")
+    print("  MEM            - Heap and GC stats")
     print("="*50 + "\n")
     
     # Startup LED pattern
-    led_blink(3, 100)
+    led_blink(START)
     
     while True:
         key = read_keypad()
         if key:
             process_keypad_input(key)
-        
+
+        # Commands from the wired console
+        if console is not None:
+            console.poll()
+
+        # Free the radio from a forgotten phone connection
+        ble.reap_idle(CONNECTED_IDLE_TIMEOUT)
+        publish_status()
+
+        # Collect garbage at a quiet point rather than mid-unlock
+        if not lock_state:
+            gcs.idle()
+
         time.sleep_ms(50)
 
 # ===== START PROGRAM =====
@@ -7,35 +7,147 @@ Features:
 - Deep sleep for battery optimization
 - Wake on keypad press
 - 2-3 month battery life on 4x AA
+- Weekly access schedules with BLE time sync
+- Audit log of unlocks, failures, resets and wake events
+- Streaming, resumable audit log download over BLE
+- Write-behind flash store, committed at idle points and before sleep
+- Runtime-tunable configuration over BLE (no reflash needed)
+- Optional relay economizer (opt-in profile): pull-in pulse then PWM hold, energy per unlock
+- Timer relock at the deadline, without waiting for the main loop to poll
+- Optional door contact: relock as soon as the door shuts
+- Light-sleep naps between events before deep sleep
+- CPU clock at 80MHz when idle, boosted for BLE commands and flash writes
+- Stays awake while a phone is connected, drops forgotten connections
+- Idle timeout adapted to usage (gap history kept in RTC memory)
+- Battery monitor with Battery Service and automatic low-power profile
+- BLE bonding: known phones reconnect through a fast advertising burst
 """
 
-from machine import Pin, deepsleep, reset
+from machine import Pin, ADC, deepsleep, reset
 import time
 import bluetooth
 import json
+import struct
+from binascii import hexlify, unhexlify
 from ble_simple_peripheral import BLESimplePeripheral
+from flash_store import WriteBehindStore
+from lock_config import Config, INT, STR, PIN, PINS, CHOICE, INTS
+from relay_driver import RelayDriver, PROFILES
+from relock_timer import RelockTimer
+from keypad_fsm import (KeypadFsm, MANAGED, O_UNLOCK, O_DENIED, O_WRONG, O_LOCKOUT,
+                        O_OLD_WRONG, O_CHANGED, O_ADMIN_RESET, O_ADMIN_REQUIRED)
+from throttle import Throttle, BLE
+import throttle
+from ble_session import Sessions
+from command_engine import CommandEngine, CONSOLE, open_console
+from bond_store import BondStore
+from gc_scheduler import GcScheduler
+from led_patterns import PatternPlayer, WAKE, CHANGED, RESET
+from door_sensor import DoorSensor
+from power_manager import PowerManager, ACTIVE, DEEP
+from cpu_governor import CpuGovernor
+from rtc_state import RtcState
+from adaptive_idle import AdaptiveIdle
+import adaptive_idle
+from battery_monitor import BatteryMonitor, CURVES
+import battery_monitor
+from energy_meter import EnergyMeter, MODEL_MA
+import energy_meter
+from beacon import Beacon, BEACON_ADV_US
+from access_schedule import AccessSchedule, set_rtc_time, rtc_local_time, clock_synced
+import audit_log
+from audit_log import AuditLog, log_frames, CH_SYSTEM, CH_KEYPAD, CH_BLE, CH_CONSOLE, USER_ADMIN, USER_NONE
 import esp32
 
 # ===== CONFIGURATION =====
 DEFAULT_PASSWORD = "1234"
 ADMIN_PASSWORD = "9999"
-LOCK_OPEN_TIME = 5
-MAX_ATTEMPTS = 3
-
-# Battery optimization
-IDLE_TIMEOUT = 30  # Seconds before deep sleep
-DEEP_SLEEP_DURATION = 1000 * 60 * 5  # 5 minutes
-
-# Password storage
+CONSOLE_PORT = None  # Wired command console: None, "usb" (USB-CDC) or a UART id
+CONSOLE_PINS = (21, 22)  # TX, RX for a UART console (GPIO16/17 belong to PSRAM)
+
+# GPIOs each role may use on the T8 (ESP32-WROVER): 6-11 are the flash,
+# 16/17 the PSRAM and 1/3 the USB serial; 34-39 are input only, with no
+# pull-ups; keypad columns wake the chip through ext1, so they must be RTC
+# GPIOs with pull-ups; the battery needs ADC1 (ADC2 is busy while BLE runs)
+OUTPUT_GPIOS = (0, 2, 4, 5, 12, 13, 14, 15, 18, 19, 21, 22, 23, 25, 26, 27, 32, 33)
+WAKE_GPIOS = (0, 2, 4, 12, 13, 14, 15, 25, 26, 27, 32, 33)
+ADC_GPIOS = (32, 33, 34, 35, 36, 39)
+
+# Runtime-tunable settings: (key, kind, default, min, max)
+# Change with CONFIG:SET:admin:key:value, applied without a reboot
+CONFIG_SCHEMA = (
+    ('lock_open_time', INT, 5, 1, 60),                         # Seconds
+    ('max_attempts', INT, 3, 1, 20),
+    ('idle_timeout', INT, 30, 5, 3600),                        # Seconds before deep sleep (no history)
+    ('idle_min', INT, 5, 5, 3600),                             # Adaptive idle timeout bounds (s)
+    ('idle_max', INT, 120, 5, 3600),
+    ('connected_idle_timeout', INT, 300, 10, 86400),           # Silent connection limit (s)
+    ('max_connections', INT, 1, 1, throttle.MAX_CONNS),        # Phones connected at once
+    ('light_sleep_after', INT, 5, 1, 3600),                    # Seconds before light-sleep naps
+    ('light_sleep_ms', INT, 100, 10, 1000),                    # Length of one nap
+    ('deep_sleep_duration', INT, 1000 * 60 * 5, 0, 86400000),  # Beacon wake period (ms)
+    ('beacon_window', INT, 0, 0, 60000),                       # Advertise after a timer wake (ms), 0 = off
+    ('relay_pin', PIN, 32, OUTPUT_GPIOS, None),
+    ('relay_profile', CHOICE, 'full', tuple(PROFILES), None),  # 'relay_module' etc. to save power
+    ('relay_hold_duty', INT, 0, 0, 100),                       # Percent, 0 = profile default
+    ('row_pins', PINS, (13, 12, 14), OUTPUT_GPIOS, None),      # 3 keypad rows
+    ('col_pins', PINS, (27, 26, 25, 33), WAKE_GPIOS, None),    # 4 keypad columns
+    ('ble_name', STR, "T8-SafeLock", 1, 16),
+    ('door_pin', PIN, -1, (-1,) + OUTPUT_GPIOS, None),         # Reed switch to GND, -1 = none
+    ('battery_pin', PIN, 35, (-1,) + ADC_GPIOS, None),         # T8 battery ADC, -1 = none
+    ('battery_divider', INT, 200, 100, 1000),                  # Divider ratio x100
+    ('battery_type', CHOICE, 'lipo', tuple(CURVES), None),
+    ('battery_low', INT, 20, 0, 100),                          # Percent for low-power profile
+    ('battery_mah', INT, 2500, 100, 100000),                   # Capacity for the DAYS estimate
+    # uA per state: active, light sleep, deep sleep, BLE connected, relay on, LED on
+    ('energy_ua', INTS, tuple(int(ma * 1000) for ma in MODEL_MA), 0, 1000000),
+)
+
+
+def check_config(values):
+    """Settings that must agree with each other (see Config)"""
+    if not values['idle_min'] <= values['idle_timeout'] <= values['idle_max']:
+        raise ValueError("idle bounds")
+
+
+# Password storage (PASSWORD_FILE is the pre-store format, migrated on boot)
 PASSWORD_FILE = "password.json"
+COMMIT_IDLE = 2  # Seconds idle before dirty state is written to flash
+
+MAX_OPEN_TIME = 60  # Longest open window with EXTEND, from the unlock (seconds)
+
+# Audit log download: notifications sent per main loop pass
+LOG_FRAMES_PER_LOOP = 4
+
+# Access schedules (user 0 is the keypad/BLE password holder)
+PASSWORD_USER_ID = 0
+LOCKOUT_TIME = 30  # First lockout in seconds, doubling on each further failure
+LOCKOUT_MAX = 3600  # Longest lockout in seconds
+
+# RTC slow memory, kept across deep sleep
+RTC_LAYOUT = (
+    ('idle', adaptive_idle.STATE_SIZE),
+    ('battery', battery_monitor.STATE_SIZE),
+    ('energy', energy_meter.STATE_SIZE),
+    ('throttle', throttle.STATE_SIZE),
+)
+
+# Low-battery power profile (applied automatically, see BatteryMonitor)
+ADV_INTERVAL_US = 500000
+LOW_BATTERY_ADV_US = 2000000  # Slower advertising
+LOW_BATTERY_IDLE_MAX = 10     # Seconds, caps the adaptive idle timeout
+
+# Status in the advertising scan response: company ID + flags byte
+ADV_COMPANY_ID = 0xFFFF  # Reserved test ID, no Bluetooth SIG assignment
+ADV_LOCK_OPEN = 0x01
+ADV_DOOR_OPEN = 0x02
+ADV_DOOR_SENSOR = 0x04
+ADV_LOW_BATTERY = 0x08
 
 # ===== PIN DEFINITIONS =====
-RELAY_PIN = 32
+# Relay and keypad pins come from CONFIG_SCHEMA (relay_pin, row_pins, col_pins)
 
 # 4x3 Keypad
-ROW_PINS = [13, 12, 14]
-COL_PINS = [27, 26, 25, 33]
-
 KEYS = [
     ['1', '2', '3', 'A'],
     ['4', '5', '6', 'B'],
@@ -43,53 +155,150 @@ KEYS = [
 ]
 
 # ===== HARDWARE SETUP =====
-relay = Pin(RELAY_PIN, Pin.OUT)
-relay.value(0)
+# Persistent state (written behind, one batch per idle point)
+store = WriteBehindStore()
+cfg = Config(CONFIG_SCHEMA, store, CONSOLE_PINS if isinstance(CONSOLE_PORT, int) else (),
+             check_config)
+rtc_mem = RtcState(RTC_LAYOUT)
+adaptive = AdaptiveIdle(rtc_mem.region('idle'), cfg.idle_min, cfg.idle_max, cfg.idle_timeout,
+                        clock=rtc_local_time)
+power = PowerManager(cfg.light_sleep_after, adaptive.timeout, cfg.light_sleep_ms)
+battery = None
+energy = EnergyMeter(rtc_mem.region('energy'), [ua / 1000 for ua in cfg.energy_ua],
+                     cfg.battery_mah, clock=rtc_local_time)
+cpu = CpuGovernor()
+gcs = GcScheduler()
+beacon = Beacon(cfg.deep_sleep_duration, cfg.beacon_window)
+
+relay = None
+relay_driver = None
+chirps = None
+door = None
+rows = []
+cols = []
+keypad_gpios = ()
+
+def setup_hardware():
+    """(Re)create relay and keypad pins from the current config"""
+    global relay, relay_driver, chirps, rows, cols, keypad_gpios
+    if relay_driver is not None:
+        relay_driver.off()
+    # Let go of keypad GPIOs that moved: old rows would stay driven high
+    for pin in keypad_gpios:
+        if pin not in cfg.row_pins + cfg.col_pins:
+            Pin(pin, Pin.IN)
+    keypad_gpios = cfg.row_pins + cfg.col_pins
+    relay = Pin(cfg.relay_pin, Pin.OUT)
+    relay_driver = RelayDriver(relay, cfg.relay_profile, cfg.relay_hold_duty)
+    if chirps is None:
+        chirps = PatternPlayer(relay)
+    else:
+        chirps.set_pin(relay)
 
-rows = [Pin(pin, Pin.OUT) for pin in ROW_PINS]
-for row in rows:
-    row.value(1)
+    rows = [Pin(pin, Pin.OUT) for pin in cfg.row_pins]
+    for row in rows:
+        row.value(1)
 
-cols = [Pin(pin, Pin.IN, Pin.PULL_UP) for pin in COL_PINS]
+    cols = [Pin(pin, Pin.IN, Pin.PULL_UP) for pin in cfg.col_pins]
+    power.set_keypad(rows, cols)
+
+setup_hardware()
 
 # ===== GLOBAL VARIABLES =====
-entered_password = ""
-failed_attempts = 0
 lock_state = False
 current_password = DEFAULT_PASSWORD
 
-# Password change mode
-change_password_mode = False
-new_password_entry = ""
-password_change_step = 0
-
 # Power management
 last_activity = time.time()
 
+# Access schedules (loaded from flash, the RTC keeps time in deep sleep)
+schedule = AccessSchedule()
+store.add_flusher(schedule.flush)
+
+# Audit trail (buffered in RAM, flushed before deep sleep)
+audit = AuditLog(clock=rtc_local_time)
+store.add_flusher(audit.flush)
+
+# Bonded phones' keys (set from the BLE IRQ, written with the other flash state)
+bonds = BondStore()
+store.add_flusher(bonds.flush)
+log_stream = None  # Active LOG download generator
+log_stream_next = 0
+log_stream_conn = None  # Connection that asked for it
+
 # ===== POWER MANAGEMENT =====
 def check_idle_timeout():
     """Check if system should enter deep sleep"""
-    global last_activity
-    if time.time() - last_activity > IDLE_TIMEOUT:
+    if ble.is_connected():
+        # Never sleep under a connected phone; drop it once it goes quiet
+        if ble.reap_idle(cfg.connected_idle_timeout):
+            audit.log(audit_log.EV_IDLE_DISCONNECT, USER_NONE, CH_BLE)
+            power.activity()  # Advertise a full idle period before sleeping
+        return
+    if power.tier() == DEEP:
         print("💤 Entering deep sleep to save battery...")
         close_lock()
+        audit.log(audit_log.EV_SLEEP)
+        cpu.boost()
+        store.commit()
         time.sleep(1)
+        enter_deep_sleep()
+
+def enter_deep_sleep():
+    """Save RTC state, then sleep until a key press or the beacon timer"""
+    chirps.stop()
+    energy.update(ACTIVE, ble.is_connected())
+    energy.sleeping()
+    rtc_mem.save()
+
+    # Configure wake on ANY keypad button press
+    # Columns are PULL_UP (HIGH when idle, LOW when pressed)
+    # Wake when ANY column pin goes LOW
+    esp32.wake_on_ext1(
+        pins=tuple(Pin(pin) for pin in cfg.col_pins),
+        level=esp32.WAKEUP_ALL_LOW
+    )
+
+    # Beacon timer wake, keypad only in the low-battery profile
+    period = None if low_power() else beacon.sleep_ms()
+    if period:
+        deepsleep(period)
+    deepsleep()
+
+def beacon_window():
+    """After a timer wake: advertise briefly, then sleep again unless needed"""
+    if not beacon.timer_wake():
+        return
+    ble.set_adv_interval(BEACON_ADV_US)
+    if not beacon.listen(beacon_keep_awake):
+        enter_deep_sleep()
+    print("📡 Beacon: staying awake")
+    apply_power_profile()
+
+def beacon_keep_awake():
+    if ble.is_connected():
+        return True
+    key = read_keypad()
+    if key:
+        process_keypad_input(key)
+        return True
+    return False
 
-        # Configure wake on ANY keypad button press
-        # Columns are PULL_UP (HIGH when idle, LOW when pressed)
-        # Wake when ANY column pin goes LOW
-        esp32.wake_on_ext1(
-            pins=(Pin(27), Pin(26), Pin(25), Pin(33)),
-            level=esp32.WAKEUP_ALL_LOW
-        )
+def commit_if_idle():
+    """Write dirty state once the user has paused for COMMIT_IDLE seconds"""
+    if time.time() - last_activity >= COMMIT_IDLE and flash_pending():
+        cpu.boost()
+        store.commit()
 
-        # Sleep indefinitely until keypad press (no auto-wake timer)
-        deepsleep()
+def flash_pending():
+    return store.dirty() or schedule.dirty() or audit.pending() > 0 or bonds.pending()
 
-def reset_activity_timer():
-    """Reset the inactivity timer"""
+def reset_activity_timer(unlock=False):
+    """Reset the inactivity timer and re-pick the adaptive idle timeout"""
     global last_activity
     last_activity = time.time()
+    power.activity()
+    power.set_thresholds(cfg.light_sleep_after, adaptive.activity(unlock))
 
 def check_wakeup_reason():
     """Check why ESP32 woke up"""
@@ -97,37 +306,40 @@ def check_wakeup_reason():
         import machine
         if machine.reset_cause() == machine.DEEPSLEEP_RESET:
             print("🔄 Woke from deep sleep")
-            # Brief relay blink to indicate wake
-            relay.value(1)
-            time.sleep(0.2)
-            relay.value(0)
+            audit.log(audit_log.EV_WAKE)
+            # Brief relay click to indicate a keypad wake
+            if not beacon.timer_wake():
+                chirp(WAKE)
+                # A key press usually means a phone is about to connect too
+                if bonds.count():
+                    ble.fast_advertise()
+        else:
+            audit.log(audit_log.EV_BOOT)
     except:
         pass
 
 # ===== PASSWORD MANAGEMENT =====
 def load_password():
-    """Load password from file"""
+    """Load password from the store (migrating password.json once)"""
     global current_password
+    current_password = store.get('password')
+    if current_password:
+        print(f"✅ Password loaded")
+        return
     try:
         with open(PASSWORD_FILE, 'r') as f:
-            data = json.load(f)
-            current_password = data.get('password', DEFAULT_PASSWORD)
-            print(f"✅ Password loaded")
+            current_password = json.load(f).get('password', DEFAULT_PASSWORD)
+            print(f"✅ Password migrated")
     except:
         print("⚠️ No saved password, using default")
         current_password = DEFAULT_PASSWORD
-        save_password(current_password)
+    save_password(current_password)
 
 def save_password(password):
-    """Save password to file"""
-    try:
-        with open(PASSWORD_FILE, 'w') as f:
-            json.dump({'password': password}, f)
-        print("✅ Password saved")
-        return True
-    except Exception as e:
-        print(f"❌ Save failed: {e}")
-        return False
+    """Queue password for the next commit (idle point or before sleep)"""
+    store.put('password', password)
+    print("✅ Password saved")
+    return True
 
 def reset_password():
     """Reset to factory default"""
@@ -140,15 +352,33 @@ def reset_password():
 def open_lock():
     global lock_state
     print("🔓 Lock OPENED")
-    relay.value(1)
+    chirps.stop()
+    relay_driver.on()
     lock_state = True
-    reset_activity_timer()
+    relock.arm(cfg.lock_open_time)
+    if door is not None:
+        door.unlocked()
+    update_advertising()
+    reset_activity_timer(unlock=True)
 
 def close_lock():
     global lock_state
     print("🔒 Lock CLOSED")
-    relay.value(0)
+    relock.cancel()
+    was_on = relay_driver.is_on()
+    relay_driver.off()
+    if was_on:
+        print(f"⚡ Relay: {relay_driver.last_mas:.1f} mAs")
     lock_state = False
+    if door is not None:
+        door.locked()
+    update_advertising()
+
+def chirp(pattern):
+    """Feedback clicks (non-blocking), skipped while open and in the low-battery profile"""
+    if low_power() or lock_state:
+        return
+    chirps.play(pattern)
 
 def toggle_lock():
     if lock_state:
@@ -156,6 +386,85 @@ def toggle_lock():
     else:
         open_lock()
 
+# Relock at the deadline from a hardware timer, even if the loop is busy
+relock = RelockTimer(close_lock)
+
+# ===== DOOR SENSOR =====
+def setup_door():
+    """(Re)create the door contact input, if one is configured"""
+    global door
+    if door is not None:
+        door.deinit()
+        door = None
+    if cfg.door_pin >= 0:
+        door = DoorSensor(Pin(cfg.door_pin, Pin.IN, Pin.PULL_UP), early_relock, on_door)
+
+def early_relock():
+    """Door shut after being opened: no need to keep the relay energised"""
+    print("🚪 Door shut, relocking early")
+    close_lock()
+
+def on_door(is_open):
+    reset_activity_timer()
+    if is_open:
+        print("🚪 Door opened")
+    else:
+        print(f"🚪 Door closed after {door.last_open_ms}ms")
+        audit.log(audit_log.EV_DOOR_CLOSED, USER_NONE, CH_SYSTEM, min(255, door.last_open_ms // 1000))
+    update_advertising()
+
+def update_advertising():
+    """Publish lock/door/battery state in the scan response"""
+    flags = ADV_LOCK_OPEN if lock_state else 0
+    if door is not None:
+        flags |= ADV_DOOR_SENSOR | (ADV_DOOR_OPEN if door.is_open else 0)
+    if low_power():
+        flags |= ADV_LOW_BATTERY
+    percent = battery.percent() if battery is not None else None
+    level = 0xFF if percent is None else percent
+    ble.set_manufacturer_data(struct.pack("<HBB", ADV_COMPANY_ID, flags, level))
+
+setup_door()
+
+# ===== BATTERY =====
+def setup_battery():
+    """(Re)create the battery monitor from the current config"""
+    global battery
+    battery = None
+    if cfg.battery_pin >= 0:
+        adc = ADC(Pin(cfg.battery_pin))
+        adc.atten(ADC.ATTN_11DB)
+        battery = BatteryMonitor(adc, cfg.battery_divider / 100, cfg.battery_type, cfg.battery_low,
+                                 state=rtc_mem.region('battery'), clock=rtc_local_time)
+    on_battery()
+
+def low_power():
+    return battery is not None and battery.low
+
+def poll_battery():
+    """Sample rarely, and never under relay load"""
+    was_low = low_power()
+    if battery is not None and battery.poll(busy=relay_driver.is_on()):
+        print(f"🔋 {battery.status()}")
+        if low_power() and not was_low:
+            print("🪫 Low battery: power saving profile")
+            audit.log(audit_log.EV_LOW_BATTERY, USER_NONE, CH_SYSTEM, battery.percent())
+        on_battery()
+
+def on_battery():
+    if battery is not None and battery.percent() is not None:
+        ble.set_battery_level(battery.percent())
+    apply_power_profile()
+    update_advertising()
+
+def apply_power_profile():
+    """Slower advertising and a short idle timeout while the battery is low"""
+    low = low_power()
+    idle_max = min(cfg.idle_max, LOW_BATTERY_IDLE_MAX) if low else cfg.idle_max
+    adaptive.set_bounds(cfg.idle_min, idle_max, min(cfg.idle_timeout, idle_max))
+    power.set_thresholds(cfg.light_sleep_after, adaptive.timeout, cfg.light_sleep_ms)
+    ble.set_adv_interval(LOW_BATTERY_ADV_US if low else ADV_INTERVAL_US)
+
 # ===== KEYPAD FUNCTIONS =====
 def read_keypad():
     for row_num, row_pin in enumerate(rows):
@@ -172,204 +481,335 @@ def read_keypad():
         row_pin.value(1)
     return None
 
+def on_keypad(outcome, arg):
+    """Audit records and feedback for keypad outcomes (the state machine prints)"""
+    global current_password
+    if outcome == O_UNLOCK:
+        audit.log(audit_log.EV_UNLOCK, PASSWORD_USER_ID, CH_KEYPAD)
+        open_lock()
+    elif outcome == O_DENIED:
+        audit.log(audit_log.EV_SCHEDULE_DENIED, PASSWORD_USER_ID, CH_KEYPAD)
+    elif outcome == O_WRONG:
+        audit.log(audit_log.EV_FAILED_ATTEMPT, USER_NONE, CH_KEYPAD, arg)
+    elif outcome == O_LOCKOUT:
+        audit.log(audit_log.EV_LOCKOUT, USER_NONE, CH_KEYPAD)
+        store.commit()
+    elif outcome == O_OLD_WRONG:
+        audit.log(audit_log.EV_FAILED_ATTEMPT, USER_NONE, CH_KEYPAD, arg)
+    elif outcome == O_ADMIN_REQUIRED:
+        audit.log(audit_log.EV_FAILED_ATTEMPT, USER_ADMIN, CH_KEYPAD, arg)
+    elif outcome == O_CHANGED:
+        current_password = arg
+        save_password(current_password)
+        audit.log(audit_log.EV_PASSWORD_CHANGE, PASSWORD_USER_ID, CH_KEYPAD)
+        chirp(CHANGED)  # Brief relay clicks
+    elif outcome == O_ADMIN_RESET:
+        reset_password()
+        audit.log(audit_log.EV_ADMIN_RESET, USER_ADMIN, CH_KEYPAD)
+        chirp(RESET)
+
+# Failed attempts per keypad / BLE connection; deadlines in RTC memory run on through deep sleep
+guard = Throttle(rtc_mem.region('throttle'), cfg.max_attempts, LOCKOUT_TIME, LOCKOUT_MAX,
+                 clock=rtc_local_time, save=rtc_mem.save)
+
+# Unlock, password change (A) and admin reset (B); BLE PASS is checked here too
+keypad = KeypadFsm(MANAGED, on_keypad, lambda: current_password, guard, admin=ADMIN_PASSWORD,
+                   allow=lambda: schedule.allows(PASSWORD_USER_ID))
+
 def process_keypad_input(key):
     """Process keypad input with password management"""
-    global entered_password, failed_attempts
-    global change_password_mode, new_password_entry, password_change_step
-    
     print(f"Key: {key}")
     reset_activity_timer()
-    
-    # ===== PASSWORD CHANGE MODE =====
-    if change_password_mode:
-        if key == '#' or key == 'C':
-            if password_change_step == 0:  # Old password
-                if entered_password == current_password:
-                    print("✅ Old password correct. Enter NEW:")
-                    password_change_step = 1
-                    entered_password = ""
-                else:
-                    print("❌ Wrong old password")
-                    change_password_mode = False
-                    password_change_step = 0
-                    entered_password = ""
-            
-            elif password_change_step == 1:  # New password
-                if len(entered_password) >= 4:
-                    new_password_entry = entered_password
-                    print("✅ New password set. CONFIRM:")
-                    password_change_step = 2
-                    entered_password = ""
-                else:
-                    print("❌ Too short (min 4 digits)")
-                    entered_password = ""
-            
-            elif password_change_step == 2:  # Confirm
-                if entered_password == new_password_entry:
-                    current_password = new_password_entry
-                    save_password(current_password)
-                    print("🎉 Password changed!")
-                    change_password_mode = False
-                    password_change_step = 0
-                    entered_password = ""
-                    new_password_entry = ""
-                    # Brief relay blink
-                    for _ in range(3):
-                        relay.value(1)
-                        time.sleep(0.2)
-                        relay.value(0)
-                        time.sleep(0.2)
-                else:
-                    print("❌ Passwords don't match")
-                    password_change_step = 1
-                    entered_password = ""
-        
-        elif key == '*' or key == 'A':
-            print("🔄 Change cancelled")
-            change_password_mode = False
-            password_change_step = 0
-            entered_password = ""
-        
-        else:
-            if len(entered_password) < 8:
-                entered_password += key
-                print(f"Password: {'*' * len(entered_password)}")
-    
-    # ===== NORMAL MODE =====
-    else:
-        if key == '#' or key == 'C':  # Unlock
-            if entered_password == current_password:
-                print("✅ Correct!")
-                open_lock()
-                time.sleep(LOCK_OPEN_TIME)
-                close_lock()
-                failed_attempts = 0
-            else:
-                failed_attempts += 1
-                print(f"❌ Wrong! {failed_attempts}/{MAX_ATTEMPTS}")
-                if failed_attempts >= MAX_ATTEMPTS:
-                    print("🚨 Too many attempts! 30s lockout")
-                    time.sleep(30)
-                    failed_attempts = 0
-            entered_password = ""
-        
-        elif key == '*':
-            entered_password = ""
-            print("🔄 Cleared")
-        
-        elif key == 'A':
-            print("🔑 Password change mode")
-            print("Enter OLD password:")
-            change_password_mode = True
-            password_change_step = 0
-            entered_password = ""
-        
-        elif key == 'B':  # Admin reset
-            if entered_password == ADMIN_PASSWORD:
-                print("⚡ Admin reset!")
-                reset_password()
-                entered_password = ""
-                for _ in range(5):
-                    relay.value(1)
-                    time.sleep(0.1)
-                    relay.value(0)
-                    time.sleep(0.1)
-            else:
-                print("❌ Admin password required")
-                entered_password = ""
-        
-        else:
-            if len(entered_password) < 8:
-                entered_password += key
-                print(f"Password: {'*' * len(entered_password)}")
+    keypad.key(key)
 
 # ===== BLUETOOTH FUNCTIONS =====
-def on_rx(data):
-    """Handle BLE commands"""
-    global failed_attempts, current_password
-    reset_activity_timer()
-
-    try:
-        if not data:
+def start_log_stream(offset, count, conn):
+    """Begin streaming audit records to conn; frames go out from the main loop"""
+    global log_stream, log_stream_next, log_stream_conn
+    start = max(offset, audit.first_seq())
+    n = max(0, min(offset + count, audit.total + audit.pending()) - start)
+    log_stream = log_frames(audit, start, n, ble.payload_size(conn))
+    log_stream_next = start
+    log_stream_conn = conn
+    ble.send(f"OK:LOG:{start}:{n}\n", conn)
+
+def pump_log_stream():
+    """Send a few log frames per loop pass so BLE buffers never overflow"""
+    global log_stream, log_stream_next, last_activity
+    if log_stream is None:
+        return
+    if not ble.is_connected(log_stream_conn):
+        # Client resumes with LOG:<next unreceived seq>:count
+        log_stream = None
+        return
+    # Hold off commits and sleep, but this is not user activity: leave
+    # the adaptive idle history alone
+    last_activity = time.time()
+    power.activity()
+    cpu.boost()
+    for _ in range(LOG_FRAMES_PER_LOOP):
+        try:
+            frame, log_stream_next = next(log_stream)
+        except StopIteration:
+            log_stream = None
+            ble.send(f"LOG:END:{log_stream_next}\n", log_stream_conn)
             return
-        command = data.decode().strip()
-        print(f"BT: {command}")
-    except Exception as e:
-        print(f"BT: Decode error: {e}")
+        ble.send(frame, log_stream_conn)
+
+
+def channel(conn):
+    """Audit channel for a command link"""
+    return CH_CONSOLE if conn == CONSOLE else CH_BLE
+
+def refused(outcome, reply, conn, wrong, user=USER_NONE):
+    """Audit a failed remote check and reply; wrong is the reply for a bad PIN"""
+    ch = channel(conn)
+    if outcome in (O_WRONG, O_LOCKOUT):
+        audit.log(audit_log.EV_FAILED_ATTEMPT, user, ch, guard.failures(BLE, conn))
+    if outcome == O_WRONG:
+        reply(wrong)
         return
-    
-    try:
-        if command.startswith("PASS:"):
-            password = command[5:]
-            if password == current_password:
-                print("✅ Correct BT password!")
-                # Send response BEFORE delay to avoid connection timeout crash
-                ble.send("OK:OPENING\n")
-                open_lock()
-                time.sleep(LOCK_OPEN_TIME)
-                close_lock()
-                failed_attempts = 0
+    if outcome == O_LOCKOUT:
+        audit.log(audit_log.EV_LOCKOUT, USER_NONE, ch)
+        store.commit()
+    reply(f"ERROR:LOCKED_OUT:{guard.retry_after(BLE, conn)}\n")
+
+def pin_ok(candidate, reply, conn, expected=None):
+    """Check a remote PIN (or challenge answer); audits and replies if refused"""
+    outcome = keypad.verify(candidate, BLE, conn, expected)
+    if outcome == O_UNLOCK:
+        sessions.start(conn)
+        return True
+    if outcome == O_DENIED:
+        audit.log(audit_log.EV_SCHEDULE_DENIED, PASSWORD_USER_ID, channel(conn))
+        reply("ERROR:OUTSIDE_SCHEDULE\n")
+    else:
+        wrong = f"ERROR:WRONG_PASSWORD:{guard.failures(BLE, conn)}/{cfg.max_attempts}\n"
+        refused(outcome, reply, conn, wrong)
+    return False
+
+def admin_ok(candidate, reply, conn):
+    """Check the admin PIN; wrong guesses count towards the same lockout as PINs"""
+    outcome = keypad.check(candidate, ADMIN_PASSWORD, BLE, conn)
+    if outcome == O_UNLOCK:
+        return True
+    refused(outcome, reply, conn, "ERROR:WRONG_ADMIN_PASSWORD\n", USER_ADMIN)
+    return False
+
+def on_command(command, reply, conn):
+    """Handle a command from BLE or the wired console"""
+    global current_password
+    cpu.boost()
+    reset_activity_timer()
+    print(f"CMD: {command}")
+    ch = channel(conn)
+
+    if command.startswith("PASS:"):
+        if pin_ok(command[5:], reply, conn):
+            print("✅ Correct BT password!")
+            audit.log(audit_log.EV_UNLOCK, PASSWORD_USER_ID, ch)
+            # Send response BEFORE delay to avoid connection timeout crash
+            reply("OK:OPENING\n")
+            open_lock()
+
+    elif command == "CHALLENGE":
+        reply(f"CHALLENGE:{sessions.challenge(conn)}\n")
+
+    elif command.startswith("AUTH:"):
+        # AUTH:<password> or AUTH:<sha256(nonce + password) hex> after CHALLENGE
+        expected = sessions.expected(conn, current_password)
+        answer = command[5:] if expected is None else command[5:].lower()  # Hex in either case
+        if pin_ok(answer, reply, conn, expected):
+            reply(f"OK:SESSION:{sessions.ttl_ms // 1000}\n")
+
+    elif command == "LOGOUT":
+        sessions.end(conn)
+        reply("OK:LOGGED_OUT\n")
+
+    elif (command in ("OPEN", "TOGGLE") or command.startswith("EXTEND:")) and not sessions.valid(conn):
+        reply("ERROR:AUTH_REQUIRED\n")
+
+    elif command.startswith("CHANGE:"):
+        parts = command.split(":")
+        if len(parts) == 3:
+            old_pass = parts[1]
+            new_pass = parts[2]
+            outcome = keypad.check(old_pass, current_password, BLE, conn)
+            if outcome != O_UNLOCK:
+                refused(outcome, reply, conn, "ERROR:WRONG_OLD_PASSWORD\n")
+            elif len(new_pass) >= 4:
+                current_password = new_pass
+                save_password(current_password)
+                print("🎉 Password changed via BLE!")
+                audit.log(audit_log.EV_PASSWORD_CHANGE, PASSWORD_USER_ID, ch)
+                reply("OK:PASSWORD_CHANGED\n")
             else:
-                failed_attempts += 1
-                ble.send(f"ERROR:WRONG_PASSWORD:{failed_attempts}/{MAX_ATTEMPTS}\n")
+                reply("ERROR:PASSWORD_TOO_SHORT\n")
+        else:
+            reply("ERROR:INVALID_FORMAT\n")
+
+    elif command.startswith("RESET:"):
+        if admin_ok(command[6:], reply, conn):
+            reset_password()
+            audit.log(audit_log.EV_ADMIN_RESET, USER_ADMIN, ch)
+            reply("OK:PASSWORD_RESET\n")
 
-        elif command.startswith("CHANGE:"):
-            parts = command.split(":")
+    elif command == "OPEN":
+        audit.log(audit_log.EV_UNLOCK, PASSWORD_USER_ID, ch)
+        open_lock()
+        reply("OK:OPENED\n")
+
+    elif command == "CLOSE":
+        audit.log(audit_log.EV_LOCK, USER_NONE, ch)
+        close_lock()
+        reply("OK:CLOSED\n")
+
+    elif command == "TOGGLE":
+        toggle_lock()
+        audit.log(audit_log.EV_UNLOCK if lock_state else audit_log.EV_LOCK, PASSWORD_USER_ID, ch)
+        state = "OPENED" if lock_state else "CLOSED"
+        reply(f"OK:{state}\n")
+
+    elif command == "STATUS":
+        state = "OPENED" if lock_state else "CLOSED"
+        uptime = int(time.time() - last_activity)
+        door_state = door.status() if door is not None else "NONE"
+        batt = battery.status() if battery is not None else "BATT:NONE"
+        reply(f"STATUS:{state},IDLE:{uptime}s,OPEN_MS:{relock.remaining_ms()},DOOR:{door_state},"
+                 f"{adaptive.status()},{batt}\n")
+
+    elif command.startswith("EXTEND:"):
+        # EXTEND:seconds - keep an open lock open longer
+        try:
+            seconds = int(command[7:])
+        except ValueError:
+            seconds = None
+        if seconds is None:
+            reply("ERROR:INVALID_FORMAT\n")
+        elif seconds <= 0:
+            reply("ERROR:OUT_OF_RANGE\n")
+        elif lock_state:
+            remaining = relock.extend(seconds, MAX_OPEN_TIME)
+            reply(f"OK:EXTENDED:{remaining}\n")
+        else:
+            reply("ERROR:LOCK_CLOSED\n")
+
+    elif command == "TIME":
+        synced = "SYNCED" if clock_synced() else "UNSYNCED"
+        reply(f"TIME:{rtc_local_time()},{synced}\n")
+
+    elif command.startswith("TIME:"):
+        # TIME:admin:unix_time[:utc_offset_minutes]
+        parts = command.split(":")
+        if len(parts) not in (3, 4):
+            reply("ERROR:INVALID_FORMAT\n")
+        elif admin_ok(parts[1], reply, conn):
+            offset = int(parts[3]) if len(parts) == 4 else 0
+            set_rtc_time(int(parts[2]), offset)
+            print("🕒 Clock synced")
+            audit.log(audit_log.EV_TIME_SET, USER_ADMIN, ch)
+            reply("OK:TIME_SET\n")
+
+    elif command.startswith("SCHEDULE:"):
+        # SCHEDULE:admin:user            - read bitmap
+        # SCHEDULE:admin:user:<42 hex>   - upload 168-bit hour-of-week bitmap
+        # SCHEDULE:admin:user:CLEAR      - remove restriction
+        parts = command.split(":")
+        if len(parts) not in (3, 4):
+            reply("ERROR:INVALID_FORMAT\n")
+        elif admin_ok(parts[1], reply, conn):
+            user_id = int(parts[2])
             if len(parts) == 3:
-                old_pass = parts[1]
-                new_pass = parts[2]
-                if old_pass == current_password:
-                    if len(new_pass) >= 4:
-                        current_password = new_pass
-                        save_password(current_password)
-                        print("🎉 Password changed via BLE!")
-                        ble.send("OK:PASSWORD_CHANGED\n")
-                    else:
-                        ble.send("ERROR:PASSWORD_TOO_SHORT\n")
-                else:
-                    ble.send("ERROR:WRONG_OLD_PASSWORD\n")
+                bits = schedule.get(user_id)
+                blob = hexlify(bits).decode() if bits else "NONE"
+                reply(f"SCHEDULE:{user_id}:{blob}\n")
+            elif parts[3] == "CLEAR":
+                schedule.clear(user_id)
+                audit.log(audit_log.EV_SCHEDULE_SET, USER_ADMIN, ch, user_id)
+                reply("OK:SCHEDULE_CLEARED\n")
             else:
-                ble.send("ERROR:INVALID_FORMAT\n")
+                schedule.set(user_id, unhexlify(parts[3]))
+                audit.log(audit_log.EV_SCHEDULE_SET, USER_ADMIN, ch, user_id)
+                reply("OK:SCHEDULE_SET\n")
+
+    elif command == "LOG":
+        reply(f"LOG:{audit.first_seq()}:{audit.total + audit.pending()}\n")
+
+    elif command.startswith("LOG:"):
+        # LOG:offset:count - stream records [offset, offset+count)
+        parts = command.split(":")
+        if conn == CONSOLE:
+            reply("ERROR:BLE_ONLY\n")  # Frames are binary notifications
+        elif len(parts) == 3:
+            start_log_stream(int(parts[1]), int(parts[2]), conn)
+        else:
+            reply("ERROR:INVALID_FORMAT\n")
 
-        elif command.startswith("RESET:"):
-            admin_pass = command[6:]
-            if admin_pass == ADMIN_PASSWORD:
-                reset_password()
-                ble.send("OK:PASSWORD_RESET\n")
-            else:
-                ble.send("ERROR:WRONG_ADMIN_PASSWORD\n")
+    elif command == "MEM":
+        reply(gcs.status() + "\n")
 
-        elif command == "OPEN":
-            open_lock()
-            ble.send("OK:OPENED\n")
+    elif command == "RELAY":
+        reply(relay_driver.status() + "\n")
 
-        elif command == "CLOSE":
-            close_lock()
-            ble.send("OK:CLOSED\n")
+    elif command == "POWER":
+        reply(power.status() + "\n")
 
-        elif command == "TOGGLE":
-            toggle_lock()
-            state = "OPENED" if lock_state else "CLOSED"
-            ble.send(f"OK:{state}\n")
+    elif command == "CPU":
+        reply(cpu.status() + "\n")
 
-        elif command == "STATUS":
-            state = "OPENED" if lock_state else "CLOSED"
-            uptime = int(time.time() - last_activity)
-            ble.send(f"STATUS:{state},IDLE:{uptime}s\n")
+    elif command == "BEACON":
+        reply(beacon.status() + "\n")
 
-        elif command == "SLEEP":
-            ble.send("OK:ENTERING_SLEEP\n")
-            time.sleep(1)
-            check_idle_timeout()
+    elif command == "BONDS":
+        reply(bonds.status() + "\n")
 
-        else:
-            ble.send("ERROR:UNKNOWN_COMMAND\n")
-    except Exception as e:
-        print(f"BT: Command error: {e}")
+    elif command.startswith("BONDS:CLEAR:"):
+        if admin_ok(command[12:], reply, conn):
+            bonds.clear()
+            audit.log(audit_log.EV_BONDS_CLEARED, USER_ADMIN, ch)
+            reply("OK:BONDS_CLEARED\n")
+
+    elif command == "ENERGY":
+        percent = battery.percent() if battery is not None else None
+        reply(energy.status(percent) + "\n")
+
+    elif command == "CONFIG:GET":
+        for key in cfg.keys():
+            reply(f"CONFIG:{key}={cfg.get_text(key)}\n")
+
+    elif command.startswith("CONFIG:GET:"):
+        key = command[11:]
         try:
-            ble.send(f"ERROR:EXCEPTION:{e}\n")
-        except:
-            pass
+            reply(f"CONFIG:{key}={cfg.get_text(key)}\n")
+        except KeyError:
+            reply("ERROR:UNKNOWN_KEY\n")
+
+    elif command.startswith("CONFIG:SET:"):
+        # CONFIG:SET:admin:key:value
+        parts = command.split(":", 4)
+        if len(parts) != 5:
+            reply("ERROR:INVALID_FORMAT\n")
+        elif admin_ok(parts[2], reply, conn):
+            try:
+                cfg.set_text(parts[3], parts[4])
+                audit.log(audit_log.EV_CONFIG_SET, USER_ADMIN, ch)
+                reply(f"OK:CONFIG_SET:{parts[3]}={cfg.get_text(parts[3])}\n")
+            except KeyError:
+                reply("ERROR:UNKNOWN_KEY\n")
+            except (ValueError, TypeError):
+                reply(f"ERROR:OUT_OF_RANGE:{parts[3]}\n")
+
+    elif command == "SLEEP":
+        reply("OK:ENTERING_SLEEP\n")
+        time.sleep(1)
+        check_idle_timeout()
+
+    else:
+        reply("ERROR:UNKNOWN_COMMAND\n")
+
+def on_disconnect(conn):
+    """Forget per-connection attempts (the session goes with the connection entry)"""
+    guard.drop(conn)
 
 # ===== SETUP =====
 print("\n" + "="*50)
@@ -377,13 +817,57 @@ print("  ULTIMATE VERSION - Password + Battery")
 print("="*50)
 
 print("Initializing BLE...")
-ble = BLESimplePeripheral("T8-SafeLock")
-ble.on_write(on_rx)
+ble = BLESimplePeripheral(cfg.ble_name, battery=True, bonds=bonds, status=True,
+                          max_connections=cfg.max_connections)
+# Per-connection sessions: one PIN check, then OPEN/TOGGLE need no PIN
+sessions = Sessions(table=ble.connections)
+engine = CommandEngine(on_command)
+engine.attach(ble)
+console = open_console(engine, CONSOLE_PORT, CONSOLE_PINS,
+                       cfg.row_pins + cfg.col_pins + (cfg.relay_pin, cfg.door_pin, cfg.battery_pin))
+ble.on_disconnect(on_disconnect)
+setup_battery()
 print("✅ BLE ready")
 
+def apply_config(key, value):
+    """Apply a changed setting immediately (timeouts are read on use)"""
+    if key in ('relay_pin', 'row_pins', 'col_pins'):
+        setup_hardware()
+    elif key in ('relay_profile', 'relay_hold_duty'):
+        relay_driver.set_profile(cfg.relay_profile, cfg.relay_hold_duty)
+    elif key == 'ble_name':
+        ble.set_name(value)
+    elif key == 'max_connections':
+        ble.set_max_connections(value)
+    elif key in ('light_sleep_after', 'light_sleep_ms', 'idle_timeout', 'idle_min', 'idle_max'):
+        apply_power_profile()
+    elif key in ('deep_sleep_duration', 'beacon_window'):
+        beacon.configure(cfg.deep_sleep_duration, cfg.beacon_window)
+        print(f"📡 {beacon.status()}")
+    elif key == 'energy_ua':
+        energy.model = tuple(ua / 1000 for ua in value)
+    elif key == 'max_attempts':
+        guard.free = value
+    elif key == 'battery_mah':
+        energy.capacity_mah = value
+    elif key.startswith('battery_'):
+        setup_battery()
+    elif key == 'door_pin':
+        setup_door()
+        update_advertising()
+    print(f"⚙️ {key} = {cfg.get_text(key)}")
+
+cfg.on_change(apply_config)
+
 load_password()
+beacon_window()
 check_wakeup_reason()
 
+def publish_status():
+    """Keep the status characteristics current (subscribers notified on change)"""
+    ble.set_status(lock_state, guard.failures(throttle.KEYPAD) + guard.failures(BLE),
+                   relock.remaining_ms())
+
 # ===== MAIN LOOP =====
 def main():
     print("\n" + "="*50)
@@ -391,7 +875,7 @@ def main():
     print("="*50)
     print(f"Password: {'*' * len(current_password)}")
     print(f"Battery: Optimized (2-3 months)")
-    print(f"Sleep after: {IDLE_TIMEOUT}s idle")
+    print(f"Sleep after: {adaptive.timeout}s idle (adaptive {cfg.idle_min}-{cfg.idle_max}s)")
     print("\nKeypad:")
     print("  [0-9]  - Enter password")
     print("  [#/C]  - Submit/Unlock")
@@ -400,8 +884,14 @@ def main():
     print("  [B]+#  - Admin reset")
     print("\nBLE:")
     print("  PASS:xxxx      - Unlock")
+    print("  AUTH:xxxx      - Start a session for OPEN/TOGGLE")
     print("  CHANGE:old:new - Change password")
     print("  RESET:admin    - Factory reset")
+    print("  TIME:admin:unix - Sync clock")
+    print("  SCHEDULE:admin:user:hex - Access hours")
+    print("  LOG:offset:count - Download audit log")
+    print("  CONFIG:SET:admin:key:value - Tune settings")
+    print("  BONDS:CLEAR:admin - Forget paired phones")
     print("  SLEEP          - Force sleep")
     print("="*50 + "\n")
     
@@ -411,11 +901,33 @@ def main():
         key = read_keypad()
         if key:
             process_keypad_input(key)
+
+        # Commands from the wired console
+        if console is not None:
+            console.poll()
+
+        if door is not None:
+            door.poll()
+
+        poll_battery()
+        pump_log_stream()
+        commit_if_idle()
         
         # Check for idle timeout
         check_idle_timeout()
-        
-        time.sleep_ms(50)
+        ble.step()
+        publish_status()
+
+        # Back to the low clock once the boost hold expires
+        cpu.relax()
+
+        # Collect garbage at a quiet point rather than mid-unlock
+        if not lock_state and log_stream is None:
+            gcs.idle()
+
+        # Poll while busy, light-sleep naps once idle
+        tier = power.step(busy=lock_state or log_stream is not None or chirps.playing())
+        energy.update(tier, ble.is_connected(), relay_driver.is_on())
 
 # ===== START =====
 if __name__ == "__main__":
@@ -424,6 +936,8 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("\n👋 Stopped")
         close_lock()
+        store.commit()
     except Exception as e:
         print(f"❌ Error: {e}")
         close_lock()
+        store.commit()
@@ -0,0 +1,88 @@
+"""
+Door contact (reed switch) input for ESP32 MicroPython
+Debounced edge IRQ feeding a small door state machine with early relock
+"""
+
+from machine import Pin
+from micropython import const
+import time
+
+DEBOUNCE_MS = const(50)
+
+# Unlock cycle states
+IDLE = const(0)       # Lock closed, door changes are only reported
+UNLOCKED = const(1)   # Lock open, waiting for the door to open
+OPENED = const(2)     # Door opened during this unlock, relock when it shuts
+
+
+class DoorSensor:
+    """Reed switch wired to GND: contact closed (door shut) reads low
+
+    The IRQ only timestamps the edge; poll() from the main loop applies the
+    debounce and runs the state machine. When the door shuts after being
+    opened during an unlock, relock() is called straight away instead of
+    waiting for the relock timer.
+    """
+
+    def __init__(self, pin, relock, on_change=None, debounce_ms=DEBOUNCE_MS, open_level=1):
+        self._pin = pin
+        self._relock = relock
+        self._on_change = on_change
+        self._debounce_ms = debounce_ms
+        self._open_level = open_level
+        self._edge_at = None
+        self.state = IDLE
+        self.is_open = pin.value() == open_level
+        self._opened_at = time.ticks_ms() if self.is_open else None
+        self.last_open_ms = 0  # How long the door was open last time
+        self.opens = 0
+        pin.irq(trigger=Pin.IRQ_RISING | Pin.IRQ_FALLING, handler=self._irq)
+
+    def _irq(self, _pin):
+        self._edge_at = time.ticks_ms()
+
+    def deinit(self):
+        self._pin.irq(handler=None)
+
+    def unlocked(self):
+        """Start an unlock cycle (a door already ajar counts as opened)"""
+        self.state = OPENED if self.is_open else UNLOCKED
+
+    def locked(self):
+        self.state = IDLE
+
+    def poll(self):
+        """Apply a settled edge; returns True if the door state changed"""
+        edge = self._edge_at
+        if edge is None or time.ticks_diff(time.ticks_ms(), edge) < self._debounce_ms:
+            return False
+        self._edge_at = None
+        is_open = self._pin.value() == self._open_level
+        if is_open == self.is_open:
+            return False  # Bounce that settled back
+        self.is_open = is_open
+        now = time.ticks_ms()
+        if is_open:
+            self._opened_at = now
+            self.opens += 1
+            if self.state == UNLOCKED:
+                self.state = OPENED
+        else:
+            if self._opened_at is not None:
+                self.last_open_ms = time.ticks_diff(now, self._opened_at)
+            self._opened_at = None
+        if self._on_change:
+            self._on_change(is_open)
+        if not is_open and self.state == OPENED:
+            self.state = IDLE
+            self._relock()
+        return True
+
+    def open_ms(self):
+        """Time the door has been open so far (0 when shut)"""
+        if self._opened_at is None:
+            return 0
+        return time.ticks_diff(time.ticks_ms(), self._opened_at)
+
+    def status(self):
+        return "OPEN" if self.is_open else "CLOSED"
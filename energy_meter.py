@@ -0,0 +1,120 @@
+"""
+Energy accounting for ESP32 MicroPython
+Time in each power state times a per-state current model, kept across deep sleep
+"""
+
+from micropython import const
+import struct
+import time
+
+# Base states (one at a time, numbered like power_manager tiers)
+ACTIVE = const(0)     # Scan loop polling the keypad
+LIGHT = const(1)      # Light-sleep naps
+DEEP = const(2)       # Deep sleep, measured with the RTC clock on wake
+# Extra loads (on top of the base state)
+CONNECTED = const(3)  # BLE connection held
+RELAY = const(4)      # Relay coil powered
+LED = const(5)        # Status LED lit
+STATES = const(6)
+
+STATE_NAMES = ("ACTIVE", "LIGHT", "DEEP", "BLE", "RELAY", "LED")
+
+# Current model (mA per state), measure on your board and adjust
+MODEL_MA = (40.0, 3.0, 0.15, 10.0, 40.0, 5.0)
+WAKE_MAS = 90.0  # One deep-sleep wake: ~1.5s boot at ~60mA
+
+BATTERY_MAH = const(2500)  # 4x AA alkaline
+MIN_ELAPSED_S = const(60)  # Below this the average current means little
+
+# RTC region: ms per state (uint64), deep sleep start (uint32 s), wakes (uint32)
+_STATE = "<6QII"
+STATE_SIZE = const(56)
+
+
+class EnergyMeter:
+    """Per-state time and charge since the batteries went in
+
+    Call update() once per main loop pass with the state the pass was
+    spent in, and sleeping() just before deep sleep (then save the
+    rtc_state). The next boot adds the sleep span, so totals survive deep
+    sleep and reset on power loss, i.e. on a battery change.
+    """
+
+    def __init__(self, state, model=MODEL_MA, capacity_mah=BATTERY_MAH, clock=time.time):
+        if len(model) != STATES:
+            raise ValueError("energy model")
+        self._state = state
+        self.model = tuple(model)
+        self.capacity_mah = capacity_mah
+        self._clock = clock
+        values = struct.unpack_from(_STATE, state, 0)
+        self.ms = list(values[:STATES])
+        slept_at, self.wakes = values[STATES:]
+        if slept_at:
+            span = clock() - slept_at
+            if span >= 0:  # A clock set during sleep can run backwards
+                self.ms[DEEP] += span * 1000
+                self.wakes += 1
+        self._stamp = time.ticks_ms()
+
+    def update(self, tier, connected=False, relay=False, led=False):
+        """Charge the time since the last update to tier and the extra loads
+
+        tier is a power_manager tier; DEEP there means napping while the
+        caller stays up, so it counts as LIGHT.
+        """
+        now = time.ticks_ms()
+        elapsed = time.ticks_diff(now, self._stamp)
+        self._stamp = now
+        self.ms[LIGHT if tier == DEEP else tier] += elapsed
+        if connected:
+            self.ms[CONNECTED] += elapsed
+        if relay:
+            self.ms[RELAY] += elapsed
+        if led:
+            self.ms[LED] += elapsed
+
+    def sleeping(self):
+        """Write the totals and the sleep start into the RTC region"""
+        struct.pack_into(_STATE, self._state, 0, *(self.ms + [self._clock(), self.wakes]))
+
+    def elapsed_s(self):
+        return (self.ms[ACTIVE] + self.ms[LIGHT] + self.ms[DEEP]) // 1000
+
+    def mas(self, state=None):
+        """Charge in mAs, of one state or in total"""
+        if state is not None:
+            return self.ms[state] * self.model[state] / 1000
+        return sum(self.mas(s) for s in range(STATES)) + self.wakes * WAKE_MAS
+
+    def average_ma(self):
+        elapsed = self.elapsed_s()
+        if elapsed < MIN_ELAPSED_S:
+            return None
+        return self.mas() / elapsed
+
+    def days_remaining(self, percent=None):
+        """Projected days at the average current so far
+
+        percent (from a battery monitor) sets the remaining capacity;
+        without it the charge used is subtracted from capacity_mah.
+        """
+        avg = self.average_ma()
+        if not avg:
+            return None
+        if percent is not None:
+            left = self.capacity_mah * percent / 100
+        else:
+            left = max(self.capacity_mah - self.mas() / 3600, 0)
+        return left / avg / 24
+
+    def status(self, percent=None):
+        avg = self.average_ma()
+        days = self.days_remaining(percent)
+        parts = [f"ENERGY:{self.mas() / 3600:.1f}mAh",
+                 f"AVG:{avg:.2f}mA" if avg is not None else "AVG:NONE",
+                 f"DAYS:{days:.0f}" if days is not None else "DAYS:NONE"]
+        for s in range(STATES):
+            parts.append(f"{STATE_NAMES[s]}:{self.ms[s] // 1000}s")
+        parts.append(f"WAKES:{self.wakes}")
+        return ",".join(parts)
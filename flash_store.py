@@ -0,0 +1,112 @@
+"""
+Write-behind flash store for ESP32 MicroPython
+Collects dirty keys in RAM and commits them in one batch with a commit marker
+"""
+
+import json
+import os
+
+STORE_FILE = "store.json"
+
+_MARKER = "#COMMIT"
+
+
+def atomic_write(path, data):
+    """Write data to a temp file, then rename it over path
+
+    The rename is atomic on LittleFS, so a power cut leaves either the old
+    or the new file, never a half-written one.
+    """
+    tmp = path + ".tmp"
+    with open(tmp, 'wb' if isinstance(data, (bytes, bytearray)) else 'w') as f:
+        f.write(data)
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        # FAT cannot rename over an existing file
+        os.remove(path)
+        os.rename(tmp, path)
+
+
+class WriteBehindStore:
+    """Key/value state kept in RAM and committed to flash at idle points
+
+    Repeated put() calls to the same key only update RAM. commit() writes
+    every key in a single file ending with a commit marker; a file without
+    a valid marker is ignored on load and the previous copy is used.
+    Other buffered writers (audit log, schedules) register a flusher so a
+    single commit() persists everything before deep sleep.
+    """
+
+    def __init__(self, path=STORE_FILE):
+        self._path = path
+        self._data = {}
+        self._dirty = False
+        self._flushers = []
+        self.commits = 0
+        self.load()
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def put(self, key, value):
+        """Update a key in RAM; unchanged values do not mark the store dirty"""
+        if self._data.get(key) != value or key not in self._data:
+            self._data[key] = value
+            self._dirty = True
+
+    def delete(self, key):
+        if key in self._data:
+            del self._data[key]
+            self._dirty = True
+
+    def dirty(self):
+        return self._dirty
+
+    def add_flusher(self, flush):
+        """Register a callable run on every commit (e.g. audit.flush)"""
+        self._flushers.append(flush)
+
+    def commit(self):
+        """Flush registered writers, then write dirty keys in one batch"""
+        ok = True
+        for flush in self._flushers:
+            try:
+                if flush() is False:
+                    ok = False
+            except Exception as e:
+                print(f"Store: Flusher error: {e}")
+                ok = False
+        if not self._dirty:
+            return ok
+        try:
+            self.commits += 1
+            atomic_write(self._path, f"{json.dumps(self._data)}\n{_MARKER} {self.commits}\n")
+            self._dirty = False
+        except Exception as e:
+            print(f"Store: Commit error: {e}")
+            return False
+        return ok
+
+    def load(self):
+        """Load the newest copy that carries a complete commit marker"""
+        best = None
+        for path in (self._path, self._path + ".tmp"):
+            found = self._read(path)
+            if found and (best is None or found[0] > best[0]):
+                best = found
+        if best is None:
+            return False
+        self.commits, self._data = best
+        return True
+
+    def _read(self, path):
+        try:
+            with open(path, 'r') as f:
+                body = f.readline()
+                marker = f.readline().split()
+            if len(marker) != 2 or marker[0] != _MARKER:
+                return None
+            return int(marker[1]), json.loads(body)
+        except (OSError, ValueError):
+            return None
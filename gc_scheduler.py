@@ -0,0 +1,51 @@
+"""
+Garbage collection scheduling for ESP32 MicroPython
+Collect at known idle points instead of whenever the heap happens to run low
+"""
+
+from micropython import const
+import gc
+import time
+
+IDLE_BUDGET = const(4096)       # Bytes allocated before an idle point collects
+THRESHOLD_FRACTION = const(4)   # Automatic GC after heap/4 bytes, as a backstop
+
+
+class GcScheduler:
+    """Runs gc.collect() from idle() once enough has been allocated
+
+    gc.threshold() is raised so automatic collections (which can land
+    mid-unlock) become a rare backstop. The heap high-water mark is
+    sampled at every idle point, before collecting.
+    """
+
+    def __init__(self, budget=IDLE_BUDGET):
+        self.budget = budget
+        gc.collect()
+        self.total = gc.mem_alloc() + gc.mem_free()
+        gc.threshold(self.total // THRESHOLD_FRACTION)
+        self._after = gc.mem_alloc()
+        self.high_water = self._after
+        self.collections = 0
+        self.last_us = 0
+
+    def idle(self):
+        """Call where a pause is harmless; returns True if it collected"""
+        used = gc.mem_alloc()
+        if used > self.high_water:
+            self.high_water = used
+        if used - self._after < self.budget:
+            return False
+        self.collect()
+        return True
+
+    def collect(self):
+        start = time.ticks_us()
+        gc.collect()
+        self.last_us = time.ticks_diff(time.ticks_us(), start)
+        self._after = gc.mem_alloc()
+        self.collections += 1
+
+    def status(self):
+        return (f"HEAP:{gc.mem_free()}/{self.total},HWM:{self.high_water},"
+                f"GCS:{self.collections},LAST:{self.last_us}us")
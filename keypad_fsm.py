@@ -0,0 +1,276 @@
+"""
+Keypad state machine for ESP32 MicroPython
+Transition tables plus a small interpreter, shared by every firmware variant
+"""
+
+from micropython import const
+from pin_buffer import PinBuffer, equal
+from throttle import KEYPAD
+
+# States
+IDLE = const(0)     # Typing a PIN to unlock
+OLD = const(1)      # Password change: current PIN
+NEW = const(2)      # Password change: new PIN
+CONFIRM = const(3)  # Password change: new PIN again
+STATES = const(4)
+
+# Events (key classes)
+DIGIT = const(0)
+SUBMIT = const(1)
+CLEAR = const(2)
+MODE = const(3)
+ADMIN = const(4)
+EVENTS = const(5)
+
+KEY_EVENTS = {'#': SUBMIT, 'C': SUBMIT, '*': CLEAR, 'A': MODE, 'B': ADMIN}  # Others: DIGIT
+
+# Actions (index into KeypadFsm._actions)
+A_DIGIT = const(0)
+A_CLEAR = const(1)
+A_UNLOCK = const(2)
+A_EMERGENCY = const(3)
+A_BEGIN = const(4)
+A_OLD = const(5)
+A_NEW = const(6)
+A_CONFIRM = const(7)
+A_CANCEL = const(8)
+A_ADMIN = const(9)
+
+# Outcomes passed to notify(outcome, arg)
+O_DIGIT = const(0)
+O_CLEARED = const(1)
+O_UNLOCK = const(2)
+O_DENIED = const(3)        # Right PIN, refused by allow() (e.g. schedule)
+O_WRONG = const(4)         # arg: failed attempts so far
+O_LOCKOUT = const(5)       # arg: lockout seconds
+O_LOCKED_OUT = const(6)    # Input ignored during a lockout, arg: seconds left
+O_EMERGENCY = const(7)
+O_CHANGE = const(8)
+O_OLD_OK = const(9)
+O_OLD_WRONG = const(10)
+O_NEW_OK = const(11)
+O_TOO_SHORT = const(12)
+O_CHANGED = const(13)      # arg: the new PIN
+O_MISMATCH = const(14)
+O_CANCELLED = const(15)
+O_ADMIN_RESET = const(16)
+O_ADMIN_REQUIRED = const(17)
+
+MESSAGES = (
+    "", "Cleared", "Correct", "Outside access hours", "Wrong password, attempt {}",
+    "Too many attempts, locked for {}s", "Locked out, retry in {}s", "Emergency unlock",
+    "Password change, enter OLD password", "Old password correct, enter NEW",
+    "Wrong old password", "Enter NEW again to confirm", "Too short (min 4 digits)",
+    "Password changed", "Passwords don't match, enter NEW", "Change cancelled",
+    "Admin reset", "Admin password required",
+)
+
+# (state, event, action, next state on success, next state on failure)
+# Pairs missing from a table are ignored.
+
+# Unlock only: A also clears, B opens without a PIN (T8, battery optimized)
+BASIC = (
+    (IDLE, DIGIT, A_DIGIT, IDLE, IDLE),
+    (IDLE, SUBMIT, A_UNLOCK, IDLE, IDLE),
+    (IDLE, CLEAR, A_CLEAR, IDLE, IDLE),
+    (IDLE, MODE, A_CLEAR, IDLE, IDLE),
+    (IDLE, ADMIN, A_EMERGENCY, IDLE, IDLE),
+)
+
+# Unlock, A to change the password, admin PIN + B to reset (enhanced, ultimate)
+MANAGED = (
+    (IDLE, DIGIT, A_DIGIT, IDLE, IDLE),
+    (IDLE, SUBMIT, A_UNLOCK, IDLE, IDLE),
+    (IDLE, CLEAR, A_CLEAR, IDLE, IDLE),
+    (IDLE, MODE, A_BEGIN, OLD, OLD),
+    (IDLE, ADMIN, A_ADMIN, IDLE, IDLE),
+    (OLD, DIGIT, A_DIGIT, OLD, OLD),
+    (OLD, SUBMIT, A_OLD, NEW, IDLE),
+    (OLD, CLEAR, A_CANCEL, IDLE, IDLE),
+    (OLD, MODE, A_CANCEL, IDLE, IDLE),
+    (NEW, DIGIT, A_DIGIT, NEW, NEW),
+    (NEW, SUBMIT, A_NEW, CONFIRM, NEW),
+    (NEW, CLEAR, A_CANCEL, IDLE, IDLE),
+    (NEW, MODE, A_CANCEL, IDLE, IDLE),
+    (CONFIRM, DIGIT, A_DIGIT, CONFIRM, CONFIRM),
+    (CONFIRM, SUBMIT, A_CONFIRM, IDLE, NEW),
+    (CONFIRM, CLEAR, A_CANCEL, IDLE, IDLE),
+    (CONFIRM, MODE, A_CANCEL, IDLE, IDLE),
+)
+
+
+class KeypadFsm:
+    """Runs keys through a transition table and reports outcomes
+
+    The firmware supplies secret() (the current PIN), an optional admin
+    PIN and allow() check, and notify(outcome, arg) for side effects such
+    as opening the lock, audit records or LED feedback. Failed attempts
+    at any PIN (unlock, old or admin) go to a throttle.Throttle, on the
+    KEYPAD channel for keys and on whatever channel (and connection) BLE
+    passes to verify() or check().
+    """
+
+    def __init__(self, table, notify, secret, throttle, admin=None, min_len=4, allow=None):
+        self._next = [None] * (STATES * EVENTS)
+        for state, event, action, ok, fail in table:
+            self._next[state * EVENTS + event] = (action, ok, fail)
+        self._actions = (self._digit, self._clear, self._unlock, self._emergency,
+                         self._begin, self._old, self._new, self._confirm,
+                         self._cancel, self._admin)
+        self._notify = notify
+        self._secret = secret
+        self._allow = allow
+        self.throttle = throttle
+        self.admin = admin
+        self.min_len = min_len
+        self.entry = PinBuffer()
+        self.state = IDLE
+        self._new_pin = None
+
+    def key(self, key):
+        """Feed one key; returns the new state"""
+        wait = self.throttle.retry_after(KEYPAD)
+        if wait:
+            self._emit(O_LOCKED_OUT, wait)
+            return self.state
+        row = self._next[self.state * EVENTS + KEY_EVENTS.get(key, DIGIT)]
+        if row is not None:
+            action, ok, fail = row
+            self.state = ok if self._actions[action](key) else fail
+        return self.state
+
+    def verify(self, candidate, channel=KEYPAD, conn=None, expected=None):
+        """Check a PIN (PinBuffer or str), counting failures; returns the outcome
+
+        expected replaces the PIN as the value to match (e.g. the answer
+        to a BLE challenge). During a lockout nothing is compared
+        (O_LOCKED_OUT); throttle.retry_after() says for how long.
+        """
+        secret = self._secret() if expected is None else expected
+        outcome = self._compare(candidate, secret, channel, conn)
+        if outcome != O_UNLOCK:
+            return outcome
+        if self._allow is not None and not self._allow():
+            return O_DENIED
+        self.throttle.succeeded(channel, conn)
+        return O_UNLOCK
+
+    def check(self, candidate, secret, channel=KEYPAD, conn=None):
+        """verify() for any other secret (old PIN, admin PIN), without allow()
+
+        Failures count on the same channel and connection as PINs, so a
+        lockout stops every guess, not just unlock attempts.
+        """
+        outcome = self._compare(candidate, secret, channel, conn)
+        if outcome == O_UNLOCK:
+            self.throttle.succeeded(channel, conn)
+        return outcome
+
+    def _compare(self, candidate, secret, channel, conn):
+        if self.throttle.retry_after(channel, conn):
+            return O_LOCKED_OUT
+        if isinstance(candidate, PinBuffer):
+            ok = candidate.matches(secret)
+        else:
+            ok = equal(candidate, secret)
+        if not ok:
+            return O_LOCKOUT if self.throttle.failed(channel, conn) else O_WRONG
+        return O_UNLOCK
+
+    def reset(self):
+        """Back to IDLE with an empty entry (e.g. after a timeout)"""
+        self.entry.clear()
+        self._new_pin = None
+        self.state = IDLE
+
+    def _emit(self, outcome, arg=None):
+        if outcome == O_DIGIT:
+            print("Password:", self.entry.mask())
+        else:
+            print("Keypad:", MESSAGES[outcome].format(arg))
+        self._notify(outcome, arg)
+
+    # Actions: return True to take the success transition
+
+    def _digit(self, key):
+        if self.entry.append(key):
+            self._emit(O_DIGIT, len(self.entry))
+        return True
+
+    def _clear(self, _key):
+        self.entry.clear()
+        self._emit(O_CLEARED)
+        return True
+
+    def _refused(self, outcome, wrong):
+        """Report a failed keypad check; wrong is the outcome for a wrong entry"""
+        if outcome == O_LOCKED_OUT:
+            self._emit(outcome, self.throttle.retry_after(KEYPAD))
+            return
+        self._emit(wrong, self.throttle.failures(KEYPAD))
+        if outcome == O_LOCKOUT:
+            self._emit(O_LOCKOUT, self.throttle.retry_after(KEYPAD))
+
+    def _unlock(self, _key):
+        outcome = self.verify(self.entry)
+        self.entry.clear()
+        if outcome in (O_WRONG, O_LOCKOUT, O_LOCKED_OUT):
+            self._refused(outcome, O_WRONG)
+        else:
+            self._emit(outcome)
+        return outcome == O_UNLOCK
+
+    def _emergency(self, _key):
+        self.entry.clear()
+        self._emit(O_EMERGENCY)
+        return True
+
+    def _begin(self, _key):
+        self.entry.clear()
+        self._emit(O_CHANGE)
+        return True
+
+    def _old(self, _key):
+        outcome = self.check(self.entry, self._secret())
+        self.entry.clear()
+        if outcome == O_UNLOCK:
+            self._emit(O_OLD_OK)
+            return True
+        self._refused(outcome, O_OLD_WRONG)
+        return False
+
+    def _new(self, _key):
+        ok = len(self.entry) >= self.min_len
+        if ok:
+            self._new_pin = self.entry.text()
+        self.entry.clear()
+        self._emit(O_NEW_OK if ok else O_TOO_SHORT)
+        return ok
+
+    def _confirm(self, _key):
+        ok = self.entry.matches(self._new_pin)
+        self.entry.clear()
+        if ok:
+            pin, self._new_pin = self._new_pin, None
+            self._emit(O_CHANGED, pin)
+        else:
+            self._emit(O_MISMATCH)
+        return ok
+
+    def _cancel(self, _key):
+        self.reset()
+        self._emit(O_CANCELLED)
+        return True
+
+    def _admin(self, _key):
+        if self.admin is None:
+            self.entry.clear()
+            self._emit(O_ADMIN_REQUIRED)
+            return False
+        outcome = self.check(self.entry, self.admin)
+        self.entry.clear()
+        if outcome == O_UNLOCK:
+            self._emit(O_ADMIN_RESET)
+            return True
+        self._refused(outcome, O_ADMIN_REQUIRED)
+        return False
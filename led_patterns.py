@@ -0,0 +1,80 @@
+"""
+Non-blocking LED patterns for ESP32 MicroPython
+Plays on/off step tables from a hardware timer so feedback never blocks input
+"""
+
+from machine import Timer
+from micropython import const
+
+PATTERN_TIMER_ID = const(2)
+
+
+def blink(times, on_ms, off_ms=None):
+    """Pattern of times on/off blinks"""
+    return (on_ms, on_ms if off_ms is None else off_ms) * times
+
+
+# Patterns: durations in ms, alternately on and off, starting with on
+KEY = (50,)
+START = blink(3, 100)
+WAKE = blink(1, 200)
+OK = blink(2, 200)
+MODE = blink(2, 500)
+CANCEL = blink(1, 500)
+CHANGED = blink(3, 300)
+ERROR = blink(5, 100)
+RESET = blink(5, 100)
+LOCKOUT = blink(30, 500)
+
+
+class PatternPlayer:
+    """One pin (LED, or the relay for feedback clicks) driven by a pattern
+
+    Each step re-arms a one-shot Timer, so play() returns at once.
+    A new play() replaces the running pattern; stop() cancels it and
+    forces the pin off (call it before sleep). Hardware timers pause
+    in light sleep, so stay awake while playing().
+    """
+
+    def __init__(self, pin, timer_id=PATTERN_TIMER_ID):
+        self._timer = Timer(timer_id)
+        self.pin = pin
+        self._steps = ()
+        self._index = 0
+        self._on_done = None
+
+    def set_pin(self, pin):
+        self.stop()
+        self.pin = pin
+
+    def play(self, pattern, on_done=None):
+        """Start pattern; on_done() runs from the timer when it ends"""
+        self.stop()
+        self._steps = pattern
+        self._index = 0
+        self._on_done = on_done
+        self._step()
+
+    def stop(self):
+        self._timer.deinit()
+        self._steps = ()
+        self._on_done = None
+        self.pin.value(0)
+
+    def playing(self):
+        return bool(self._steps)
+
+    def _step(self):
+        if self._index >= len(self._steps):
+            on_done = self._on_done
+            self.stop()
+            if on_done is not None:
+                on_done()
+            return
+        self.pin.value(0 if self._index % 2 else 1)
+        ms = self._steps[self._index]
+        self._index += 1
+        self._timer.init(mode=Timer.ONE_SHOT, period=max(1, ms), callback=self._fire)
+
+    def _fire(self, _timer):
+        self._step()
@@ -0,0 +1,179 @@
+"""
+Runtime configuration for ESP32 MicroPython
+Typed schema validated once at boot, changed over BLE without a reboot
+"""
+
+from micropython import const
+
+# Value kinds
+INT = const(0)
+STR = const(1)  # lo/hi bound the length
+PINS = const(2)  # lo is the tuple of allowed GPIOs, the count is fixed by the default
+CHOICE = const(3)  # lo is the tuple of allowed strings
+INTS = const(4)  # lo/hi bound each value, the count is fixed by the default
+PIN = const(5)  # One GPIO from the tuple lo (list -1 there to allow "none")
+
+
+def parse(entry, text):
+    """Convert command text to a typed value (no range check)"""
+    kind = entry[1]
+    if kind in (INT, PIN):
+        return int(text)
+    if kind in (PINS, INTS):
+        return tuple(int(p) for p in text.split(","))
+    return text
+
+
+def format_value(entry, value):
+    if entry[1] in (PINS, INTS):
+        return ",".join(str(p) for p in value)
+    return str(value)
+
+
+def gpios(entry, value):
+    """The GPIOs a PIN or PINS value occupies (none for other kinds or -1)"""
+    if entry[1] == PINS:
+        return value
+    if entry[1] == PIN and value >= 0:
+        return (value,)
+    return ()
+
+
+def validate(entry, value):
+    """Return value if it fits the schema entry, else raise ValueError"""
+    _, kind, default, lo, hi = entry
+    if kind == INT:
+        if not isinstance(value, int) or not lo <= value <= hi:
+            raise ValueError("range")
+    elif kind == STR:
+        if not isinstance(value, str) or not lo <= len(value) <= hi:
+            raise ValueError("length")
+    elif kind == CHOICE:
+        if value not in lo:
+            raise ValueError("choice")
+    elif kind == PIN:
+        if value not in lo:
+            raise ValueError("pin")
+    elif kind == PINS:
+        value = tuple(value)
+        if len(value) != len(default) or len(set(value)) != len(value):
+            raise ValueError("count")
+        for pin in value:
+            if pin not in lo:
+                raise ValueError("pin")
+    elif kind == INTS:
+        value = tuple(value)
+        if len(value) != len(default):
+            raise ValueError("count")
+        for item in value:
+            if not isinstance(item, int) or not lo <= item <= hi:
+                raise ValueError("range")
+    return value
+
+
+class Config:
+    """Validated settings exposed as plain attributes (cfg.lock_open_time)
+
+    schema is a tuple of (key, kind, default, lo, hi). Only values that
+    differ from their default are persisted, under the 'config' store key.
+    Invalid saved values fall back to the default at load time.
+
+    A GPIO serves one PIN/PINS setting at most, and none of reserved
+    (e.g. a UART console); saved pins that clash revert to the defaults.
+
+    check(values) validates settings against each other: values maps every
+    key to its candidate value, and a ValueError rejects them. Saved
+    settings that fail it revert to the defaults (pins aside).
+    """
+
+    def __init__(self, schema, store, reserved=(), check=None):
+        self._schema = schema
+        self._store = store
+        self._reserved = tuple(reserved)
+        self._check = check
+        self._listeners = []
+        saved = store.get('config') or {}
+        for entry in schema:
+            value = entry[2]
+            if entry[0] in saved:
+                try:
+                    value = validate(entry, saved[entry[0]])
+                except (ValueError, TypeError):
+                    print(f"Config: Invalid saved {entry[0]}, using default")
+            setattr(self, entry[0], value)
+        try:
+            self._check_pins(None, None)
+        except ValueError:
+            print("Config: Saved pins overlap, using default pins")
+            for entry in schema:
+                if entry[1] in (PIN, PINS):
+                    setattr(self, entry[0], entry[2])
+        try:
+            self._check_values(None, None)
+        except ValueError:
+            print("Config: Saved settings conflict, using defaults")
+            for entry in schema:
+                if entry[1] not in (PIN, PINS):
+                    setattr(self, entry[0], entry[2])
+
+    def _check_pins(self, key, value):
+        """Raise ValueError if a GPIO would serve two settings (key set to value)"""
+        used = list(self._reserved)
+        for entry in self._schema:
+            pins = gpios(entry, value if entry[0] == key else getattr(self, entry[0]))
+            for pin in pins:
+                if pin in used:
+                    raise ValueError("pin in use")
+                used.append(pin)
+
+    def _check_values(self, key, value):
+        """Raise ValueError if check rejects the settings (key set to value)"""
+        if self._check is None:
+            return
+        values = {}
+        for entry in self._schema:
+            values[entry[0]] = value if entry[0] == key else getattr(self, entry[0])
+        self._check(values)
+
+    def _entry(self, key):
+        for entry in self._schema:
+            if entry[0] == key:
+                return entry
+        raise KeyError(key)
+
+    def keys(self):
+        return [entry[0] for entry in self._schema]
+
+    def get_text(self, key):
+        return format_value(self._entry(key), getattr(self, key))
+
+    def set_text(self, key, text):
+        """Parse, range-check, apply and persist one setting
+
+        Raises KeyError for unknown keys and ValueError for bad values,
+        including ones check rejects together with the other settings.
+        Listeners run after the new value is visible on the object.
+        """
+        entry = self._entry(key)
+        value = validate(entry, parse(entry, text))
+        if value == getattr(self, key):
+            return value
+        self._check_pins(key, value)
+        self._check_values(key, value)
+        setattr(self, key, value)
+        self._persist()
+        for listener in self._listeners:
+            listener(key, value)
+        return value
+
+    def on_change(self, callback):
+        """Register callback(key, value) to apply a setting at runtime"""
+        self._listeners.append(callback)
+
+    def _persist(self):
+        overrides = {}
+        for entry in self._schema:
+            value = getattr(self, entry[0])
+            if value != entry[2]:
+                overrides[entry[0]] = list(value) if entry[1] in (PINS, INTS) else value
+        self._store.put('config', overrides)
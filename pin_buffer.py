@@ -0,0 +1,66 @@
+"""
+Fixed-capacity PIN entry buffer for ESP32 MicroPython
+Keypresses go into a preallocated bytearray, so typing a PIN never touches the heap
+"""
+
+from micropython import const
+
+PIN_CAPACITY = const(8)
+
+# Echo strings built once, indexed by length
+MASKS = tuple('*' * n for n in range(PIN_CAPACITY + 1))
+
+
+def equal(a, b):
+    """Compare two PINs (str or bytes) in time that depends only on len(b)"""
+    if isinstance(a, str):
+        a = a.encode()
+    if isinstance(b, str):
+        b = b.encode()
+    diff = len(a) ^ len(b)
+    for i in range(len(b)):
+        diff |= (a[i] if i < len(a) else 0) ^ b[i]
+    return diff == 0
+
+
+class PinBuffer:
+    """Digits typed so far, appended and cleared in place
+
+    matches() compares in time that depends only on the secret's
+    length, so the position of the first wrong digit does not leak.
+    """
+
+    def __init__(self, capacity=PIN_CAPACITY):
+        self._buf = bytearray(capacity)
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def append(self, key):
+        """Add one key (a 1-char str); False when the buffer is full"""
+        if self._len >= len(self._buf):
+            return False
+        self._buf[self._len] = ord(key)
+        self._len += 1
+        return True
+
+    def clear(self):
+        for i in range(self._len):
+            self._buf[i] = 0
+        self._len = 0
+
+    def matches(self, secret):
+        if isinstance(secret, str):
+            secret = secret.encode()
+        diff = len(secret) ^ self._len
+        for i in range(min(len(secret), len(self._buf))):
+            diff |= secret[i] ^ self._buf[i]
+        return diff == 0
+
+    def text(self):
+        """The entry as a str (allocates; for storing a new PIN)"""
+        return bytes(self._buf[:self._len]).decode()
+
+    def mask(self):
+        return MASKS[self._len] if self._len < len(MASKS) else '*' * self._len
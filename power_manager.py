@@ -0,0 +1,98 @@
+"""
+Tiered power states for ESP32 MicroPython
+Active polling, light-sleep naps between events, then deep sleep
+"""
+
+from machine import Pin
+from micropython import const
+import machine
+import time
+
+# Power tiers
+ACTIVE = const(0)  # Poll the keypad every poll_ms
+LIGHT = const(1)   # lightsleep() naps, woken early by a key press
+DEEP = const(2)    # Caller enters deep sleep (naps meanwhile, e.g. while connected)
+
+TIER_NAMES = ("ACTIVE", "LIGHT", "DEEP")
+
+ACTIVE_POLL_MS = const(50)
+LIGHT_NAP_MS = const(100)
+
+
+class PowerManager:
+    """Choose the power tier from the idle time and run one loop delay
+
+    step() replaces the fixed sleep_ms() at the end of the main loop.
+    Naps are kept short so BLE connection events and the advertising
+    interval are still served between them. While busy (lock open, relay
+    PWM running, a transfer in progress) the manager stays ACTIVE.
+    """
+
+    def __init__(self, light_after, deep_after, nap_ms=LIGHT_NAP_MS, poll_ms=ACTIVE_POLL_MS):
+        self.set_thresholds(light_after, deep_after, nap_ms)
+        self.poll_ms = poll_ms
+        self._rows = ()
+        self._last_activity = time.ticks_ms()
+        self._stamp = self._last_activity
+        self._tier = ACTIVE
+        self.residency = [0, 0]  # ms spent ACTIVE / LIGHT since boot/wake
+        self.naps = 0
+        self.early_wakes = 0  # Naps cut short by a key press or other IRQ
+
+    def set_thresholds(self, light_after, deep_after, nap_ms=None):
+        """Idle seconds before light sleep and before deep sleep"""
+        self.light_after_ms = light_after * 1000
+        self.deep_after_ms = deep_after * 1000
+        if nap_ms is not None:
+            self.nap_ms = nap_ms
+
+    def set_keypad(self, rows, cols):
+        """Rows are driven low during naps so any key pulls a column low"""
+        self._rows = rows
+        for col in cols:
+            col.irq(handler=None, trigger=Pin.WAKE_LOW, wake=machine.SLEEP)
+
+    def activity(self):
+        self._last_activity = time.ticks_ms()
+
+    def idle_ms(self):
+        return time.ticks_diff(time.ticks_ms(), self._last_activity)
+
+    def tier(self, busy=False):
+        idle = self.idle_ms()
+        if idle >= self.deep_after_ms:
+            return DEEP
+        if busy or idle < self.light_after_ms:
+            return ACTIVE
+        return LIGHT
+
+    def step(self, busy=False):
+        """Account residency, then delay in the current tier; returns it"""
+        now = time.ticks_ms()
+        self.residency[self._tier] += time.ticks_diff(now, self._stamp)
+        self._stamp = now
+        tier = self.tier(busy)
+        # DEEP means the caller decided to stay up: keep napping, never spin
+        self._tier = ACTIVE if tier == ACTIVE else LIGHT
+        if self._tier == LIGHT:
+            self._nap()
+        else:
+            time.sleep_ms(self.poll_ms)
+        return tier
+
+    def _nap(self):
+        for row in self._rows:
+            row.value(0)
+        start = time.ticks_ms()
+        machine.lightsleep(self.nap_ms)
+        slept = time.ticks_diff(time.ticks_ms(), start)
+        for row in self._rows:
+            row.value(1)
+        self.naps += 1
+        if slept < self.nap_ms:
+            self.early_wakes += 1
+
+    def status(self):
+        active, light = self.residency
+        return (f"POWER:{TIER_NAMES[self._tier]},ACTIVE:{active // 1000}s,"
+                f"LIGHT:{light // 1000}s,NAPS:{self.naps},WAKES:{self.early_wakes}")
@@ -0,0 +1,83 @@
+"""
+Relay/solenoid driver with economizer for ESP32 MicroPython
+Full-power pull-in, then PWM hold at a reduced duty, with per-unlock energy counting
+"""
+
+from machine import Pin, PWM, Timer
+from micropython import const
+import time
+
+RELAY_TIMER_ID = const(0)
+
+# name: (pull_in_ms, hold_duty_percent, pwm_freq_hz, coil_ma)
+PROFILES = {
+    'full': (0, 100, 0, 80),                      # No economizer (legacy behaviour)
+    'relay_module': (60, 45, 20000, 80),          # 5/6V relay module coil
+    'solenoid_6v': (150, 35, 20000, 400),         # 6V solenoid lock
+    'solenoid_12v': (120, 30, 20000, 300),        # 12V solenoid lock
+}
+
+
+class RelayDriver:
+    """Drive the lock output with a pull-in pulse followed by PWM hold
+
+    on() drives the pin fully high; a one-shot timer switches to PWM at the
+    hold duty after pull_in_ms, so the main loop never waits for it.
+    Energy is estimated from the coil current and the time in each phase.
+    """
+
+    def __init__(self, pin, profile='full', hold_duty=0, timer_id=RELAY_TIMER_ID):
+        self._pin = pin
+        self._pwm = None
+        self._timer = Timer(timer_id)
+        self._on_at = None
+        self.last_mas = 0.0    # mAs spent by the most recent activation
+        self.total_mas = 0.0
+        self.activations = 0
+        self.set_profile(profile, hold_duty)
+        self._pin.value(0)
+
+    def set_profile(self, profile, hold_duty=0):
+        """Select a profile; hold_duty (1-100) overrides its hold duty"""
+        if profile not in PROFILES:
+            raise ValueError("relay profile")
+        self.profile = profile
+        self._pull_in_ms, duty, self._freq, self._coil_ma = PROFILES[profile]
+        self._duty = hold_duty if hold_duty else duty
+
+    def on(self):
+        if self._on_at is not None:
+            return
+        self._pin.value(1)
+        self._on_at = time.ticks_ms()
+        if self._duty < 100:
+            self._timer.init(mode=Timer.ONE_SHOT, period=max(1, self._pull_in_ms),
+                             callback=self._hold)
+
+    def _hold(self, _timer):
+        if self._on_at is not None:
+            self._pwm = PWM(self._pin, freq=self._freq, duty_u16=self._duty * 65535 // 100)
+
+    def off(self):
+        self._timer.deinit()
+        if self._pwm is not None:
+            self._pwm.deinit()
+            self._pwm = None
+            self._pin.init(Pin.OUT)
+        self._pin.value(0)
+        if self._on_at is not None:
+            self._account(time.ticks_diff(time.ticks_ms(), self._on_at))
+            self._on_at = None
+
+    def is_on(self):
+        return self._on_at is not None
+
+    def _account(self, on_ms):
+        pull_ms = on_ms if self._duty >= 100 else min(on_ms, self._pull_in_ms)
+        hold_ms = on_ms - pull_ms
+        self.last_mas = self._coil_ma * (pull_ms + hold_ms * self._duty / 100) / 1000
+        self.total_mas += self.last_mas
+        self.activations += 1
+
+    def status(self):
+        return f"RELAY:{self.profile},DUTY:{self._duty},LAST:{self.last_mas:.1f}mAs,TOTAL:{self.total_mas:.1f}mAs,N:{self.activations}"
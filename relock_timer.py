@@ -0,0 +1,72 @@
+"""
+Hardware-timer relock for ESP32 MicroPython
+Closes the lock at its deadline without waiting for the main loop to poll
+"""
+
+from machine import Timer
+from micropython import const
+import time
+
+RELOCK_TIMER_ID = const(1)
+
+
+class RelockTimer:
+    """One-shot relock deadline that can be extended or cancelled
+
+    The ESP32 Timer callback is soft: it is queued by micropython.schedule
+    and runs between bytecodes. A main loop sleeping or polling slowly
+    still relocks on time, but one stuck inside a blocking native call
+    (flash write, busy C routine) delays the relock until it returns, and
+    a hung VM never runs it. Keep the loop's blocking calls short.
+    """
+
+    def __init__(self, callback, timer_id=RELOCK_TIMER_ID):
+        self._timer = Timer(timer_id)
+        self._callback = callback
+        self._deadline = None
+        self._opened = None
+
+    def arm(self, seconds):
+        """Start (or restart) the open window"""
+        self._opened = time.ticks_ms()
+        self._start(int(seconds * 1000))
+
+    def extend(self, seconds, max_seconds=None):
+        """Push the deadline back; returns the new remaining time in ms
+
+        max_seconds caps the whole window counted from arm(), so repeated
+        extends cannot hold the lock open. seconds must be positive
+        (ValueError), an extend never shortens the window.
+        """
+        if seconds <= 0:
+            raise ValueError("seconds must be positive")
+        if self._deadline is None:
+            return 0
+        current = self.remaining_ms()
+        remaining = current + int(seconds * 1000)
+        if max_seconds is not None:
+            left = max_seconds * 1000 - time.ticks_diff(time.ticks_ms(), self._opened)
+            remaining = max(current, min(remaining, left))
+        self._start(remaining)
+        return remaining
+
+    def cancel(self):
+        self._timer.deinit()
+        self._deadline = None
+
+    def armed(self):
+        return self._deadline is not None
+
+    def remaining_ms(self):
+        if self._deadline is None:
+            return 0
+        return max(0, time.ticks_diff(self._deadline, time.ticks_ms()))
+
+    def _start(self, ms):
+        ms = max(1, ms)
+        self._deadline = time.ticks_add(time.ticks_ms(), ms)
+        self._timer.init(mode=Timer.ONE_SHOT, period=ms, callback=self._fire)
+
+    def _fire(self, _timer):
+        self._deadline = None
+        self._callback()
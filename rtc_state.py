@@ -0,0 +1,49 @@
+"""
+RTC user-memory state for ESP32 MicroPython
+Named fixed-size regions that survive deep sleep (not power loss), no flash wear
+"""
+
+from machine import RTC
+from micropython import const
+import struct
+
+_MAGIC = b"RS"
+_HEADER_SIZE = const(4)  # magic + uint16 layout size
+RTC_MEMORY_MAX = const(2048)
+
+
+class RtcState:
+    """One buffer in RTC slow memory, split into regions by a shared layout
+
+    layout is a tuple of (name, size). Regions are memoryviews into a RAM
+    copy; save() writes the whole buffer back (call it before deep sleep).
+    A missing or different layout (cold boot, new firmware) starts zeroed.
+    """
+
+    def __init__(self, layout, rtc=None):
+        self._rtc = rtc or RTC()
+        self._regions = {}
+        pos = _HEADER_SIZE
+        for name, size in layout:
+            self._regions[name] = (pos, size)
+            pos += size
+        if pos > RTC_MEMORY_MAX:
+            raise ValueError("rtc layout")
+        self._buf = bytearray(pos)
+        header = _MAGIC + struct.pack("<H", pos)
+        try:
+            data = self._rtc.memory()
+        except Exception:
+            data = b""
+        self.restored = len(data) == pos and data[:_HEADER_SIZE] == header
+        if self.restored:
+            self._buf[:] = data
+        else:
+            self._buf[:_HEADER_SIZE] = header
+
+    def region(self, name):
+        pos, size = self._regions[name]
+        return memoryview(self._buf)[pos:pos + size]
+
+    def save(self):
+        self._rtc.memory(self._buf)
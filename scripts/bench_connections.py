@@ -0,0 +1,108 @@
+"""
+Multi-connection benchmark (runs on the host, no ESP32 needed)
+
+    python scripts/bench_connections.py [commands per phone] [max_connections]
+
+Connects several simulated phones at once to the real BLESimplePeripheral
+(scripts/ble_sim.py) with Sessions stored in its connection table. Half
+the phones authenticate with the right PIN, half with a wrong one, then
+all of them interleave commands. Checks every reply reaches only the phone
+that asked and no phone rides on another's session, and reports the
+notifications sent per command and host time per command.
+"""
+
+import contextlib
+import io
+import random
+import sys
+import time
+import tracemalloc
+
+from ble_sim import Clock, Phone, install
+
+clock = Clock()
+install(clock)
+
+from ble_simple_peripheral import BLESimplePeripheral, Connection  # noqa: E402 (needs the fake bluetooth)
+from ble_session import Sessions  # noqa: E402
+
+PIN = "1234"
+PHONES = (1, 2, 4, 8)
+
+
+def lock_with_commands(max_connections):
+    """A peripheral answering a cut-down version of the firmware's command set"""
+    lock = BLESimplePeripheral("T8-SafeLock", max_connections=max_connections)
+    sessions = Sessions(table=lock.connections)
+
+    def on_rx(data, conn):
+        command = data.decode().strip()
+        if command.startswith("AUTH:"):
+            if command[5:] == PIN:
+                sessions.start(conn)
+                lock.send("OK:SESSION\n")
+            else:
+                lock.send("ERROR:WRONG_PASSWORD\n")
+        elif command == "OPEN":
+            lock.send("OK:OPENED\n" if sessions.valid(conn) else "ERROR:AUTH_REQUIRED\n")
+        else:
+            lock.send(f"OK:{command}\n")
+
+    lock.on_write(on_rx)
+    return lock
+
+
+def run(phones, commands, max_connections, rng):
+    lock = lock_with_commands(max_connections)
+    ble = lock._ble
+    crowd = [Phone(bytes((i,)) * 6, 'low_latency', rng) for i in range(phones)]
+    for phone in crowd:
+        phone.connect(lock, ble)
+    served = [p for p in crowd if lock.is_connected(p.conn_handle)]
+    for i, phone in enumerate(served):
+        phone.write(ble, lock._handle_rx, f"AUTH:{PIN if i % 2 == 0 else '0000'}\n".encode())
+
+    ble.notifications.clear()
+    misrouted = wrong = 0
+    start = time.perf_counter()
+    for n in range(commands):
+        for i, phone in enumerate(served):
+            command = "OPEN" if n % 2 else "STATUS"
+            before = len(ble.notifications)
+            phone.write(ble, lock._handle_rx, f"{command}\n".encode())
+            replies = ble.notifications[before:]
+            misrouted += sum(1 for conn, _ in replies if conn != phone.conn_handle)
+            if command == "OPEN":
+                want = b"OK:OPENED\n" if i % 2 == 0 else b"ERROR:AUTH_REQUIRED\n"
+                wrong += sum(1 for _, data in replies if data != want)
+    elapsed = time.perf_counter() - start
+    sent = max(1, commands * len(served))
+    return len(served), len(ble.notifications) / sent, misrouted, wrong, elapsed / sent * 1e6
+
+
+def entry_bytes():
+    """Heap per connection entry (the RX buffer dominates)"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    entries = [Connection(i) for i in range(100)]
+    used = (tracemalloc.get_traced_memory()[0] - before) // len(entries)
+    tracemalloc.stop()
+    return used
+
+
+def main():
+    commands = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    max_connections = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    rng = random.Random(1)
+
+    print(f"\n{commands} commands per phone, max_connections={max_connections}")
+    print("%-8s%8s%14s%11s%11s%12s" % ("phones", "served", "notify/cmd", "misrouted", "wrong", "us/cmd"))
+    for phones in PHONES:
+        with contextlib.redirect_stdout(io.StringIO()):  # Peripheral logging
+            result = run(phones, commands, max_connections, rng)
+        print("%-8d%8d%14.2f%11d%11d%12.1f" % ((phones,) + result))
+    print(f"\nConnection entry: ~{entry_bytes()} bytes (host CPython)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Command latency at each CPU frequency (runs ON the ESP32)
+
+Deploy the ultimate version first (make deploy VERSION=ultimate), then:
+    mpremote connect /dev/ttyUSB0 run scripts/bench_cpu_freq.py
+
+Imports the deployed main.py without starting its loop, pins the clock
+with the governor and times lock.engine.handle() for a few read-only
+commands, as they arrive from any transport.
+Also reports the cost of one 80MHz -> 240MHz boost.
+"""
+
+import time
+import machine
+import main as lock
+
+COMMANDS = (b"STATUS", b"RELAY", b"CONFIG:GET", b"LOG", b"TIME")
+ROUNDS = 20
+
+replies = []
+
+
+def capture(text):
+    # Keep the reply instead of sending it, so only the command is timed
+    replies.append(text)
+
+
+def bench(command):
+    start = time.ticks_us()
+    for _ in range(ROUNDS):
+        lock.engine.handle(command, capture)
+    elapsed = time.ticks_diff(time.ticks_us(), start)
+    replies.clear()
+    return elapsed // ROUNDS
+
+
+print("\nCommand latency (us per command, %d rounds)" % ROUNDS)
+print("%-12s" % "MHz" + "".join("%12s" % c.decode() for c in COMMANDS))
+for hz in (240000000, 160000000, 80000000):
+    lock.cpu.set_range(hz, hz)
+    row = [bench(c) for c in COMMANDS]
+    print("%-12d" % (hz // 1000000) + "".join("%12d" % us for us in row))
+
+lock.cpu.set_range(80000000, 80000000)
+start = time.ticks_us()
+machine.freq(240000000)
+switch_us = time.ticks_diff(time.ticks_us(), start)
+machine.freq(80000000)
+print("\n80 -> 240MHz switch: %dus" % switch_us)
+
+# Restore the default governor levels
+lock.cpu.set_range(80000000, 240000000)
@@ -0,0 +1,90 @@
+"""
+Reconnect latency benchmark (runs on the host, no ESP32 needed)
+
+    python scripts/bench_reconnect.py [trials] [background|balanced|low_latency]
+
+Runs the real BLESimplePeripheral and BondStore in the simulator
+(scripts/ble_sim.py) and times a phone finding, connecting to and
+securing the lock right after it wakes: a phone that has never paired
+against one that bonded earlier (keys reloaded from flash, as after
+deep sleep), with and without the fast advertising burst the battery
+variants start when they hold bonds.
+"""
+
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+
+from ble_sim import Clock, Phone, install
+
+clock = Clock()
+install(clock)
+
+from ble_simple_peripheral import BLESimplePeripheral  # noqa: E402 (needs the fake bluetooth)
+from bond_store import BondStore  # noqa: E402
+
+PHONE_ADDR = b"\x11\x22\x33\x44\x55\x66"
+
+# (label, bonding enabled, phone bonded before the wake, fast burst, advertising interval us)
+SCENARIOS = (
+    ("no bonding", False, False, False, 500000),
+    ("new phone (pairs)", True, False, True, 500000),
+    ("bonded", True, True, False, 500000),
+    ("bonded + fast burst", True, True, True, 500000),
+    ("bonded, low battery", True, True, False, 2000000),
+    ("bonded, low bat + burst", True, True, True, 2000000),
+)
+
+
+def boot(path, bonding, adv_us):
+    """A fresh boot: bonds come back from flash like after deep sleep"""
+    lock = BLESimplePeripheral("T8-SafeLock", bonds=BondStore(path) if bonding else None)
+    lock.set_adv_interval(adv_us)
+    return lock
+
+
+def trial(rng, path, bonding, prebond, fast, adv_us, scanner):
+    if os.path.exists(path):
+        os.remove(path)
+    phone = Phone(PHONE_ADDR, scanner, rng)
+    if prebond:
+        lock = boot(path, bonding, adv_us)
+        phone.discover(lock, lock._ble, clock)
+        phone.connect(lock, lock._ble)
+        phone.disconnect(lock._ble)
+        lock._bonds.flush()
+        clock.now += rng.uniform(60000, 600000)  # Deep sleep
+    lock = boot(path, bonding, adv_us)
+    if fast and lock._bonds is not None and lock._bonds.count():
+        lock.fast_advertise()
+    found_ms = phone.discover(lock, lock._ble, clock)
+    parts = phone.connect(lock, lock._ble)
+    return found_ms + sum(parts.values())
+
+
+def summary(samples):
+    samples = sorted(samples)
+    mean = sum(samples) / len(samples)
+    return mean, samples[len(samples) // 2], samples[int(len(samples) * 0.95)]
+
+
+def main():
+    trials = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    scanner = sys.argv[2] if len(sys.argv) > 2 else 'background'
+    rng = random.Random(1)
+    path = os.path.join(tempfile.mkdtemp(), "bonds.bin")
+
+    print(f"\nReconnect latency after wake, ms ({trials} trials, {scanner} scan)")
+    print("%-26s%10s%10s%10s" % ("scenario", "mean", "median", "p95"))
+    for label, bonding, prebond, fast, adv_us in SCENARIOS:
+        with contextlib.redirect_stdout(io.StringIO()):  # Peripheral logging
+            samples = [trial(rng, path, bonding, prebond, fast, adv_us, scanner)
+                       for _ in range(trials)]
+        print("%-26s%10.0f%10.0f%10.0f" % ((label,) + summary(samples)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+BLE link simulator (runs on the host, not the ESP32)
+
+Installs a fake `bluetooth` module and a virtual ticks clock so the real
+BLESimplePeripheral runs unchanged, then plays a phone that scans,
+connects, pairs or re-encrypts and discovers services by firing the
+same IRQs the ESP32 stack would. Timings are the constants below
+(advDelay from the Core spec, Android scan parameters, event counts for
+each procedure): good for comparing strategies, not a radio model.
+"""
+
+import os
+import random
+import sys
+import time
+import types
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ADV_DELAY_MAX_MS = 10.0   # Random delay the controller adds to every advertising event
+CONN_INTERVAL_MS = 30.0   # Connection interval phones start with
+CONNECT_EVENTS = 2        # CONNECT_IND until the first exchange
+PAIR_EVENTS = 12          # LE Secure Connections Just Works plus key distribution
+ENCRYPT_EVENTS = 2        # Re-encrypting with a saved LTK
+DISCOVERY_EVENTS = 10     # Full GATT discovery (phones cache it for bonded devices)
+GIVE_UP_MS = 3600000.0
+
+# Phone scan (window ms, interval ms)
+SCANNERS = {
+    'background': (30.0, 1280.0),   # Android autoConnect / background connect
+    'balanced': (1024.0, 4096.0),
+    'low_latency': (4096.0, 4096.0),
+}
+
+_IRQ_CENTRAL_CONNECT = 1
+_IRQ_CENTRAL_DISCONNECT = 2
+_IRQ_GATTS_WRITE = 3
+_IRQ_ENCRYPTION_UPDATE = 28
+_IRQ_GET_SECRET = 29
+_IRQ_SET_SECRET = 30
+_SEC_OUR = 1
+_SEC_PEER = 2
+
+
+class Clock:
+    """Virtual time in ms, exposed as MicroPython ticks functions"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def ticks_ms(self):
+        return int(self.now)
+
+    def ticks_us(self):
+        return int(self.now * 1000)
+
+    @staticmethod
+    def ticks_add(a, b):
+        return a + b
+
+    @staticmethod
+    def ticks_diff(a, b):
+        return a - b
+
+
+class UUID:
+    def __init__(self, value):
+        self.value = value
+
+    def __bytes__(self):
+        if isinstance(self.value, int):
+            return self.value.to_bytes(2, 'little')
+        return bytes.fromhex(self.value.replace('-', ''))[::-1]
+
+
+class FakeBLE:
+    """The parts of bluetooth.BLE the lock uses, recording what it asks for
+
+    Each BLESimplePeripheral gets its own, reachable as peripheral._ble.
+    """
+
+    def __init__(self):
+        self.handler = None
+        self.adv_interval_us = None
+        self.settings = {}
+        self.pair_requests = []
+        self.values = {}
+        self.notifications = []  # (conn_handle, data)
+        self._last_handle = 0
+
+    def next_handle(self):
+        """Connection handle for a new link, never reused within a run"""
+        self._last_handle += 1
+        return self._last_handle
+
+    def active(self, state=None):
+        return True
+
+    def irq(self, handler):
+        self.handler = handler
+
+    def config(self, *args, **kwargs):
+        if args:
+            return self.settings.get(args[0])
+        self.settings.update(kwargs)
+
+    def gatts_register_services(self, services):
+        handle = 0
+        handles = []
+        for _, chars in services:
+            ids = []
+            for _ in chars:
+                handle += 1
+                ids.append(handle)
+            handles.append(tuple(ids))
+        return tuple(handles)
+
+    def gatts_read(self, handle):
+        return self.values.get(handle, b"")
+
+    def gatts_write(self, handle, data, send_update=False):
+        self.values[handle] = bytes(data)
+
+    def gatts_notify(self, conn_handle, handle, data=None):
+        self.notifications.append((conn_handle, bytes(data or b"")))
+
+    def gap_advertise(self, interval_us, adv_data=None, resp_data=None, connectable=True):
+        self.adv_interval_us = interval_us or None
+
+    def gap_pair(self, conn_handle):
+        self.pair_requests.append(conn_handle)
+
+    def gap_disconnect(self, conn_handle):
+        self.handler(_IRQ_CENTRAL_DISCONNECT, (conn_handle, 0, b""))
+        return True
+
+
+def install(clock):
+    """Fake bluetooth/micropython modules and ticks driven by clock (call once)"""
+    bluetooth = types.ModuleType('bluetooth')
+    bluetooth.BLE = FakeBLE
+    bluetooth.UUID = UUID
+    micropython = types.ModuleType('micropython')
+    micropython.const = lambda value: value
+    sys.modules['bluetooth'] = bluetooth
+    sys.modules['micropython'] = micropython
+    for name in ('ticks_ms', 'ticks_us', 'ticks_add', 'ticks_diff'):
+        setattr(time, name, getattr(clock, name))
+    if REPO not in sys.path:
+        sys.path.insert(0, REPO)
+
+
+class Phone:
+    """A central that remembers its bond (LTK) between connections"""
+
+    def __init__(self, addr, scanner='background', rng=None):
+        self.addr = addr
+        self.window_ms, self.interval_ms = SCANNERS[scanner]
+        self.rng = rng or random.Random()
+        self.ltk = None
+        self.conn_handle = 0
+
+    def _hears(self, t, phase):
+        return (t - phase) % self.interval_ms < self.window_ms
+
+    def discover(self, lock, ble, clock):
+        """Advance the clock to the first advertising event inside a scan window"""
+        start = clock.now
+        phase = start + self.rng.uniform(0, self.interval_ms)
+        t = start + self.rng.uniform(0, ble.adv_interval_us / 1000)
+        while t - start < GIVE_UP_MS:
+            clock.now = t
+            lock.step()  # The lock's loop may end a fast-advertising burst
+            if self._hears(t, phase):
+                return t - start
+            t += ble.adv_interval_us / 1000 + self.rng.uniform(0, ADV_DELAY_MAX_MS)
+        raise RuntimeError("phone never heard the lock")
+
+    def connect(self, lock, ble):
+        """Connect, secure and discover; returns ms spent in each phase"""
+        clock_ms = {}
+        conn = self.conn_handle = ble.next_handle()
+        clock_ms['connect'] = CONNECT_EVENTS * CONN_INTERVAL_MS
+        ble.pair_requests.clear()
+        ble.handler(_IRQ_CENTRAL_CONNECT, (conn, 0, self.addr))
+        bonded = False
+        clock_ms['security'] = 0.0
+        if conn in ble.pair_requests:
+            known = ble.handler(_IRQ_GET_SECRET, (_SEC_PEER, 0, self.addr))
+            if known is not None and known == self.ltk:
+                clock_ms['security'] = ENCRYPT_EVENTS * CONN_INTERVAL_MS
+            else:
+                self.ltk = bytes(self.rng.getrandbits(8) for _ in range(16))
+                ble.handler(_IRQ_SET_SECRET, (_SEC_PEER, self.addr, self.ltk))
+                ble.handler(_IRQ_SET_SECRET, (_SEC_OUR, self.addr, self.ltk))
+                clock_ms['security'] = PAIR_EVENTS * CONN_INTERVAL_MS
+                known = None
+            ble.handler(_IRQ_ENCRYPTION_UPDATE, (conn, True, False, True, 16))
+            bonded = known is not None
+        clock_ms['gatt'] = 0.0 if bonded else DISCOVERY_EVENTS * CONN_INTERVAL_MS
+        return clock_ms
+
+    def write(self, ble, handle, data):
+        """A GATT write to handle (e.g. the lock's UART RX)"""
+        ble.values[handle] = bytes(data)
+        ble.handler(_IRQ_GATTS_WRITE, (self.conn_handle, handle))
+
+    def disconnect(self, ble):
+        ble.handler(_IRQ_CENTRAL_DISCONNECT, (self.conn_handle, 0, self.addr))
@@ -65,6 +65,24 @@ upload_files() {
     local files=(
         "ble_advertising.py"
         "ble_simple_peripheral.py"
+        "relay_driver.py"
+        "relock_timer.py"
+        "door_sensor.py"
+        "power_manager.py"
+        "cpu_governor.py"
+        "rtc_state.py"
+        "adaptive_idle.py"
+        "battery_monitor.py"
+        "energy_meter.py"
+        "beacon.py"
+        "led_patterns.py"
+        "pin_buffer.py"
+        "gc_scheduler.py"
+        "keypad_fsm.py"
+        "throttle.py"
+        "ble_session.py"
+        "bond_store.py"
+        "command_engine.py"
         "digital_safe_locker_T8_battery_optimized.py"
     )
 
@@ -0,0 +1,90 @@
+"""
+Shared fixtures for the host test suite
+Stands in for the MicroPython-only modules and tick functions
+"""
+
+import sys
+import time
+import types
+import pytest
+
+
+class FakeClock:
+    """time.ticks_* driven by tests: set or advance now (milliseconds)
+
+    Calling it reads the RTC in seconds, like time.time, so it can be passed
+    as a module's clock. epoch is where the RTC was set; move it to jump the
+    wall clock without touching the ticks.
+    """
+
+    def __init__(self, now=0, epoch=1000000):
+        self.now = now
+        self.epoch = epoch
+
+    def ticks_ms(self):
+        return self.now
+
+    def ticks_us(self):
+        return self.now * 1000
+
+    def time(self):
+        return self.epoch + self.now // 1000
+
+    __call__ = time
+
+    def sleep(self, seconds):
+        self.now += int(seconds * 1000)
+
+    def sleep_ms(self, ms):
+        self.now += ms
+
+    @staticmethod
+    def ticks_diff(a, b):
+        return a - b
+
+    @staticmethod
+    def ticks_add(a, b):
+        return a + b
+
+
+class UUID:
+    def __init__(self, value):
+        self.value = value
+
+    def __bytes__(self):
+        return b'\x00' * 16
+
+
+class NoRadio:
+    """bluetooth.BLE until a test patches in a mock"""
+
+    def __init__(self):
+        raise OSError("no BLE radio on the host")
+
+
+# One object per module for the whole session: a firmware module imported
+# by an earlier test keeps its reference, so patching attributes reaches it
+MICROPYTHON = types.ModuleType('micropython')
+MICROPYTHON.const = lambda value: value
+BLUETOOTH = types.ModuleType('bluetooth')
+BLUETOOTH.BLE = NoRadio
+BLUETOOTH.UUID = UUID
+
+TICK_FUNCTIONS = ('ticks_ms', 'ticks_us', 'ticks_diff', 'ticks_add', 'sleep_ms')
+
+
+@pytest.fixture(autouse=True)
+def micropython_host(monkeypatch):
+    """Mock MicroPython-specific modules and tick functions"""
+    fake = FakeClock()
+    monkeypatch.setitem(sys.modules, 'micropython', MICROPYTHON)
+    monkeypatch.setitem(sys.modules, 'bluetooth', BLUETOOTH)
+    for name in TICK_FUNCTIONS:
+        monkeypatch.setattr(time, name, getattr(fake, name), raising=False)
+    return fake
+
+
+@pytest.fixture
+def clock(micropython_host):
+    """The FakeClock behind time.ticks_* for this test"""
+    return micropython_host
@@ -0,0 +1,161 @@
+"""
+Unit tests for access schedule module
+Uses mocks to test without an ESP32 RTC
+"""
+
+import sys
+import time
+import pytest
+from unittest.mock import Mock
+
+
+@pytest.fixture(autouse=True)
+def mock_micropython_modules(monkeypatch):
+    """Mock MicroPython-specific modules"""
+    machine_mock = Mock()
+    monkeypatch.setitem(sys.modules, 'machine', machine_mock)
+    monkeypatch.delitem(sys.modules, 'access_schedule', raising=False)
+    return machine_mock
+
+
+@pytest.fixture
+def schedule_path(tmp_path):
+    return str(tmp_path / "schedules.bin")
+
+
+def test_compile_schedule_sets_expected_bits():
+    """Test that windows compile into hour-of-week bits"""
+    from access_schedule import compile_schedule, SCHEDULE_SIZE
+
+    # Monday 09:00-17:00
+    bits = compile_schedule([(0b0000001, 9, 17)])
+
+    assert len(bits) == SCHEDULE_SIZE
+    set_hours = [i for i in range(168) if bits[i >> 3] & (1 << (i & 7))]
+    assert set_hours == list(range(9, 17))
+
+
+def test_unscheduled_user_always_allowed(schedule_path):
+    """Test that users without a schedule have full access"""
+    from access_schedule import AccessSchedule
+
+    schedule = AccessSchedule(schedule_path)
+
+    assert schedule.get(0) is None
+    for how in (0, 50, 167):
+        assert schedule.allows(0, how) is True
+
+
+def test_allows_is_bit_test(schedule_path):
+    """Test that allows() follows the uploaded bitmap"""
+    from access_schedule import AccessSchedule, compile_schedule
+
+    schedule = AccessSchedule(schedule_path)
+    # Weekdays 08:00-18:00
+    schedule.set(1, compile_schedule([(0b0011111, 8, 18)]))
+
+    assert schedule.allows(1, 8) is True          # Monday 08:00
+    assert schedule.allows(1, 7) is False         # Monday 07:00
+    assert schedule.allows(1, 4 * 24 + 17) is True   # Friday 17:00
+    assert schedule.allows(1, 5 * 24 + 10) is False  # Saturday 10:00
+    # Other users are unaffected
+    assert schedule.allows(0, 5 * 24 + 10) is True
+
+
+def test_schedule_persists(schedule_path):
+    """Test that schedules survive a reload (deep sleep / reboot)"""
+    from access_schedule import AccessSchedule, compile_schedule
+
+    blob = compile_schedule([(0b1111111, 0, 6)])
+    schedule = AccessSchedule(schedule_path)
+    schedule.set(3, blob)
+    schedule.flush()
+
+    reloaded = AccessSchedule(schedule_path)
+    assert reloaded.get(3) == blob
+    assert reloaded.allows(3, 2) is True
+    assert reloaded.allows(3, 12) is False
+
+
+def test_clear_restores_full_access(schedule_path):
+    """Test clearing a user's schedule"""
+    from access_schedule import AccessSchedule, compile_schedule
+
+    schedule = AccessSchedule(schedule_path)
+    schedule.set(2, compile_schedule([(0b1, 9, 10)]))
+    schedule.flush()
+    schedule.clear(2)
+    schedule.flush()
+
+    assert schedule.get(2) is None
+    assert AccessSchedule(schedule_path).allows(2, 100) is True
+
+
+def test_unsynced_clock_denies_scheduled_users(schedule_path, monkeypatch):
+    """Test scheduled users are refused until the RTC is set after power loss"""
+    from access_schedule import AccessSchedule, compile_schedule
+
+    schedule = AccessSchedule(schedule_path)
+    schedule.set(1, compile_schedule([(0b1111111, 0, 24)]))
+
+    # RTC restarted at 2000-01-01 00:00
+    monkeypatch.setattr(time, 'localtime', lambda t=None: (2000, 1, 1, 0, 0, 0, 5, 1))
+    assert schedule.allows(1) is False
+    assert schedule.allows(0) is True             # No schedule, no clock needed
+
+    monkeypatch.setattr(time, 'localtime', lambda t=None: (2026, 10, 19, 9, 0, 0, 0, 292))
+    assert schedule.allows(1) is True
+
+
+def test_changes_are_write_behind(schedule_path):
+    """Test set() stays in RAM until flush()"""
+    from access_schedule import AccessSchedule, compile_schedule
+
+    schedule = AccessSchedule(schedule_path)
+    schedule.set(1, compile_schedule([(0b1, 0, 1)]))
+
+    assert AccessSchedule(schedule_path).get(1) is None
+    assert schedule.dirty() is True
+    assert schedule.flush() is True
+    assert schedule.dirty() is False
+    assert AccessSchedule(schedule_path).get(1) is not None
+
+
+def test_set_rejects_bad_input(schedule_path):
+    """Test validation of user id and blob size"""
+    from access_schedule import AccessSchedule
+
+    schedule = AccessSchedule(schedule_path)
+
+    with pytest.raises(ValueError):
+        schedule.set(0, b'\x00' * 5)
+    with pytest.raises(ValueError):
+        schedule.set(99, b'\x00' * 21)
+
+
+def test_get_rejects_bad_user_id(schedule_path):
+    """Test get range-checks the user id like set and clear"""
+    from access_schedule import AccessSchedule, MAX_USERS
+
+    schedule = AccessSchedule(schedule_path)
+
+    with pytest.raises(ValueError):
+        schedule.get(MAX_USERS)
+    with pytest.raises(ValueError):
+        schedule.get(-1)
+    assert schedule.get(MAX_USERS - 1) is None
+
+
+def test_set_rtc_time(mock_micropython_modules):
+    """Test RTC is set with local time from a Unix timestamp"""
+    from access_schedule import set_rtc_time
+
+    # 2024-01-01 00:00:00 UTC (Monday), +60 minutes offset
+    set_rtc_time(1704067200, 60)
+
+    rtc = mock_micropython_modules.RTC.return_value
+    rtc.datetime.assert_called_once_with((2024, 1, 1, 0, 1, 0, 0, 0))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
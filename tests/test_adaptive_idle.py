@@ -0,0 +1,114 @@
+"""
+Unit tests for usage-adaptive idle timeout
+Uses a plain bytearray in place of RTC memory and a fake clock
+"""
+
+import pytest
+
+
+def make(clock, lo=5, hi=120, default=30, state=None):
+    from adaptive_idle import AdaptiveIdle, STATE_SIZE
+
+    state = state if state is not None else bytearray(STATE_SIZE)
+    return AdaptiveIdle(state, lo, hi, default, clock), state
+
+
+def feed(idle, clock, gaps, unlock=False):
+    for gap in gaps:
+        idle.activity(unlock)
+        clock.sleep(gap)
+    idle.activity(unlock)
+
+
+def test_default_until_history(clock):
+    """Test the default timeout is used with too few samples"""
+    idle, _ = make(clock)
+
+    assert idle.timeout == 30
+    feed(idle, clock, [3, 3])
+    assert idle.timeout == 30
+
+
+def test_quick_returns_stay_awake(clock):
+    """Test users who come back within seconds keep the lock awake"""
+    idle, _ = make(clock)
+
+    feed(idle, clock, [8] * 20, unlock=True)
+
+    # Staying up 10s beats a ~90mAs wake every time
+    assert idle.timeout == 10
+
+
+def test_long_gaps_sleep_early(clock):
+    """Test idle periods that always end in sleep shorten the timeout"""
+    idle, _ = make(clock)
+
+    # Same time every day: the lock always ends up deep sleeping
+    feed(idle, clock, [86400] * 20)
+
+    assert idle.timeout == 5
+
+
+def test_key_burst_keeps_timeout(clock):
+    """Test pauses inside one session are not taken for idle periods"""
+    idle, _ = make(clock)
+
+    # A PIN typed a second or two per key, then a command over BLE
+    feed(idle, clock, [1, 2, 1, 1, 2, 1, 1, 2, 1, 1, 3, 1])
+
+    assert idle.samples == 0
+    assert idle.timeout == 30
+
+    # The pause before the next session is recorded
+    clock.sleep(600)
+    idle.activity()
+    assert idle.samples == 1
+
+
+def test_bounds_are_respected(clock):
+    """Test the chosen timeout stays within the fixed bounds"""
+    idle, _ = make(clock, lo=15, hi=20)
+
+    feed(idle, clock, [86400] * 20)
+    assert idle.timeout == 15
+
+    idle.set_bounds(5, 8, 30)
+    assert idle.timeout == 5
+
+
+def test_history_survives_deep_sleep(clock):
+    """Test a new controller on the same state keeps the history"""
+    from adaptive_idle import AdaptiveIdle
+
+    idle, state = make(clock)
+    feed(idle, clock, [8] * 20, unlock=True)
+    context = idle.context
+
+    # Gap spanning a deep sleep is measured on the next wake
+    clock.sleep(600)
+    resumed = AdaptiveIdle(state, 5, 120, 30, clock)
+    assert resumed.timeout == 10
+    resumed.activity()
+    assert sum(resumed.counts(context)) == 21
+
+
+def test_saturated_counts_are_halved(clock):
+    """Test old history fades instead of overflowing"""
+    idle, _ = make(clock)
+
+    feed(idle, clock, [7] * 300)
+
+    counts = idle.counts()
+    assert max(counts) < 255
+    assert counts[2] >= 128
+
+
+def test_status_text(clock):
+    """Test the decision is exposed for STATUS"""
+    idle, _ = make(clock)
+
+    assert idle.status() == "IDLE_TO:30s,CTX:0,N:0"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
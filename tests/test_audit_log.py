@@ -0,0 +1,204 @@
+"""
+Unit tests for audit log module
+Runs against a temporary file instead of ESP32 flash
+"""
+
+import os
+import struct
+import pytest
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return str(tmp_path / "audit.bin")
+
+
+def read_records(path, capacity):
+    with open(path, 'rb') as f:
+        f.seek(16)
+        data = f.read(capacity * 8)
+    return [struct.unpack_from("<IBBBB", data, i * 8) for i in range(capacity)]
+
+
+def test_region_is_preallocated(log_path):
+    """Test the file is sized for the full capacity on first use"""
+    from audit_log import AuditLog
+
+    AuditLog(log_path, capacity=100)
+
+    assert os.path.getsize(log_path) == 16 + 100 * 8
+
+
+def test_default_capacity_holds_10k_events():
+    """Test default region size"""
+    from audit_log import AUDIT_CAPACITY
+
+    assert AUDIT_CAPACITY >= 10000
+
+
+def test_log_is_buffered_until_flush(log_path):
+    """Test that log() does not touch flash"""
+    from audit_log import AuditLog, EV_UNLOCK, CH_KEYPAD
+
+    log = AuditLog(log_path, capacity=16, clock=lambda: 1000)
+    log.log(EV_UNLOCK, 0, CH_KEYPAD)
+
+    assert log.pending() == 1
+    assert log.total == 0
+    assert read_records(log_path, 16)[0] == (0, 0, 0, 0, 0)
+
+    log.flush()
+
+    assert log.pending() == 0
+    assert log.total == 1
+    assert read_records(log_path, 16)[0] == (1000, EV_UNLOCK, 0, CH_KEYPAD, 0)
+
+
+def test_full_buffer_flushes_automatically(log_path):
+    """Test that the RAM buffer flushes when full"""
+    from audit_log import AuditLog, EV_FAILED_ATTEMPT
+
+    log = AuditLog(log_path, capacity=16, buffer_records=4, clock=lambda: 1)
+    for i in range(5):
+        log.log(EV_FAILED_ATTEMPT, arg=i)
+
+    assert log.total == 4
+    assert log.pending() == 1
+
+
+def test_failed_flush_drops_oldest(log_path):
+    """Test a full buffer that cannot be flushed keeps logging the newest records"""
+    from audit_log import AuditLog, EV_FAILED_ATTEMPT
+
+    log = AuditLog(log_path, capacity=16, buffer_records=4, clock=lambda: 1)
+    os.remove(log_path)
+    os.mkdir(log_path)  # open() now fails like a full or broken filesystem
+    for i in range(6):
+        log.log(EV_FAILED_ATTEMPT, arg=i)
+
+    assert log.pending() == 4
+    assert log.lost == 2
+    assert log.total == 0
+
+    os.rmdir(log_path)
+    log._format()
+    assert log.flush() is True
+    assert [r[4] for r in read_records(log_path, 4)] == [2, 3, 4, 5]
+
+
+def test_log_wraps_around(log_path):
+    """Test circular overwrite of the oldest records"""
+    from audit_log import AuditLog, EV_WAKE
+
+    log = AuditLog(log_path, capacity=4, buffer_records=3, clock=lambda: 7)
+    for i in range(6):
+        log.log(EV_WAKE, arg=i)
+    log.flush()
+
+    assert log.total == 6
+    assert log.first_seq() == 2
+    args = [rec[4] for rec in read_records(log_path, 4)]
+    # Slots 0/1 overwritten by records 4/5
+    assert args == [4, 5, 2, 3]
+
+
+def test_header_survives_reopen(log_path):
+    """Test record count persists across reboot"""
+    from audit_log import AuditLog, EV_BOOT
+
+    log = AuditLog(log_path, capacity=8)
+    log.log(EV_BOOT)
+    log.log(EV_BOOT)
+    log.flush()
+
+    assert AuditLog(log_path, capacity=8).total == 2
+
+
+def test_capacity_change_reformats(log_path):
+    """Test a region with a different size is reformatted"""
+    from audit_log import AuditLog, EV_BOOT
+
+    log = AuditLog(log_path, capacity=8)
+    log.log(EV_BOOT)
+    log.flush()
+
+    reopened = AuditLog(log_path, capacity=32)
+    assert reopened.total == 0
+    assert os.path.getsize(log_path) == 16 + 32 * 8
+
+
+def test_read_streams_in_chunks(log_path):
+    """Test read() yields bounded chunks with sequence numbers"""
+    from audit_log import AuditLog, EV_UNLOCK
+
+    log = AuditLog(log_path, capacity=64, clock=lambda: 5)
+    for i in range(10):
+        log.log(EV_UNLOCK, arg=i)
+
+    chunks = list(log.read(2, 6, chunk_records=4))
+
+    assert [seq for seq, _ in chunks] == [2, 6]
+    assert [len(data) for _, data in chunks] == [32, 16]
+    args = [data[i * 8 + 7] for _, data in chunks for i in range(len(data) // 8)]
+    assert args == [2, 3, 4, 5, 6, 7]
+
+
+def test_read_skips_overwritten_records(log_path):
+    """Test read() starts at the oldest retained record after wrap"""
+    from audit_log import AuditLog, EV_WAKE
+
+    log = AuditLog(log_path, capacity=4, clock=lambda: 1)
+    for i in range(7):
+        log.log(EV_WAKE, arg=i)
+
+    chunks = list(log.read(0, 100))
+    seqs = [seq for seq, _ in chunks]
+    args = [data[i * 8 + 7] for _, data in chunks for i in range(len(data) // 8)]
+
+    assert seqs[0] == 3
+    assert args == [3, 4, 5, 6]
+
+
+def test_log_frames_fit_payload(log_path):
+    """Test frames respect the notification payload size"""
+    import struct as st
+    from audit_log import AuditLog, log_frames, LOG_FRAME, EV_BOOT
+
+    log = AuditLog(log_path, capacity=64, clock=lambda: 9)
+    for _ in range(10):
+        log.log(EV_BOOT)
+
+    # Default MTU 23 -> 20 byte payload -> 1 record per frame
+    frames = list(log_frames(log, 0, 10, 20))
+    assert len(frames) == 10
+    assert all(len(frame) <= 20 for frame, _ in frames)
+
+    # MTU 247 -> 244 byte payload -> all 10 records in one frame
+    frames = list(log_frames(log, 0, 10, 244))
+    assert len(frames) == 1
+    frame, next_seq = frames[0]
+    assert frame[0] == LOG_FRAME
+    assert st.unpack_from("<I", frame, 1)[0] == 0
+    assert next_seq == 10
+
+
+def test_log_frames_resume_from_offset(log_path):
+    """Test resuming a download from the last received sequence"""
+    from audit_log import AuditLog, log_frames, EV_BOOT
+
+    log = AuditLog(log_path, capacity=64, clock=lambda: 9)
+    for _ in range(6):
+        log.log(EV_BOOT)
+
+    first = log_frames(log, 0, 6, 20)
+    next(first)
+    _, resume_at = next(first)
+    # Link dropped, client asks for the rest
+    rest = list(log_frames(log, resume_at, 6 - resume_at, 20))
+
+    assert resume_at == 2
+    assert [seq for _, seq in rest] == [3, 4, 5, 6]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,115 @@
+"""
+Unit tests for battery voltage monitor
+Uses a fake ADC and clock instead of the ESP32 battery divider
+"""
+
+import pytest
+from unittest.mock import Mock
+
+
+def fake_adc(mv, divider=2.0):
+    """ADC whose pin sits at mv/divider, with one outlier each way"""
+    adc = Mock()
+    uv = int(mv / divider * 1000)
+    reads = [uv] * 14 + [0, uv * 2]
+    adc.read_uv.side_effect = lambda: reads[adc.read_uv.call_count % 16 - 1]
+    return adc
+
+
+def test_percent_curve():
+    """Test interpolation on the LiPo curve"""
+    from battery_monitor import percent_from_mv
+
+    assert percent_from_mv('lipo', 4300) == 100
+    assert percent_from_mv('lipo', 3875) == 62
+    assert percent_from_mv('lipo', 3000) == 0
+    assert percent_from_mv('aa4', 5400) == 50
+
+
+def test_oversampled_read_drops_outliers(clock):
+    """Test extremes are discarded before averaging"""
+    from battery_monitor import BatteryMonitor
+
+    adc = fake_adc(3800)
+    monitor = BatteryMonitor(adc, clock=clock)
+
+    assert monitor.sample() == 3800
+    assert adc.read_uv.call_count == 16
+    assert monitor.percent() == 50
+
+
+def test_samples_are_cached(clock):
+    """Test the ADC is only read once per interval"""
+    from battery_monitor import BatteryMonitor
+
+    adc = fake_adc(3800)
+    monitor = BatteryMonitor(adc, interval_s=300, clock=clock)
+
+    assert monitor.poll() is True
+    assert monitor.poll() is False
+    clock.sleep(299)
+    assert monitor.poll() is False
+    clock.sleep(1)
+    assert monitor.poll() is True
+    assert adc.read_uv.call_count == 32
+
+
+def test_no_sample_under_load(clock):
+    """Test sampling is deferred while the relay is on"""
+    from battery_monitor import BatteryMonitor
+
+    adc = fake_adc(3800)
+    monitor = BatteryMonitor(adc, clock=clock)
+
+    assert monitor.poll(busy=True) is False
+    adc.read_uv.assert_not_called()
+
+
+def test_filter_smooths_steps(clock):
+    """Test a single low reading only moves the value a quarter of the way"""
+    from battery_monitor import BatteryMonitor
+
+    monitor = BatteryMonitor(fake_adc(4000), clock=clock)
+    monitor.sample()
+    monitor._adc = fake_adc(3600)
+
+    assert monitor.sample() == 3900
+
+
+def test_low_battery_hysteresis(clock):
+    """Test low mode is entered at the threshold and left 5% above it"""
+    from battery_monitor import BatteryMonitor
+
+    monitor = BatteryMonitor(fake_adc(3600), low_pct=20, clock=clock)
+    monitor.sample()
+    assert monitor.low is True
+
+    monitor.mv = 3680       # ~26%
+    monitor._update_low()
+    assert monitor.low is False
+
+    monitor.mv = 3650       # ~22%: above threshold but inside hysteresis band
+    monitor.low = True
+    monitor._update_low()
+    assert monitor.low is True
+
+
+def test_cached_value_survives_deep_sleep(clock):
+    """Test a wake reuses the RTC-cached value instead of sampling"""
+    from battery_monitor import BatteryMonitor, STATE_SIZE
+
+    state = bytearray(STATE_SIZE)
+    BatteryMonitor(fake_adc(3800), state=state, clock=clock).sample()
+
+    clock.sleep(60)
+    adc = fake_adc(3800)
+    woken = BatteryMonitor(adc, state=state, clock=clock)
+
+    assert woken.mv == 3800
+    assert woken.poll() is False
+    adc.read_uv.assert_not_called()
+    assert woken.status() == "BATT:3.80V,PCT:50,LOWPWR:0"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
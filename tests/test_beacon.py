@@ -0,0 +1,87 @@
+"""
+Unit tests for the duty-cycled BLE beacon
+Uses mocks to simulate machine wake reasons and the ticks clock
+"""
+
+import sys
+import pytest
+from unittest.mock import MagicMock
+
+
+@pytest.fixture
+def machine_mock(monkeypatch):
+    machine = MagicMock()
+    machine.DEEPSLEEP_RESET = 4
+    machine.TIMER_WAKE = 4
+    machine.EXT1_WAKE = 3
+    monkeypatch.setitem(sys.modules, 'machine', machine)
+    monkeypatch.delitem(sys.modules, 'adaptive_idle', raising=False)
+    monkeypatch.delitem(sys.modules, 'beacon', raising=False)
+    return machine
+
+
+def test_predicted_current(machine_mock):
+    """Test the duty-cycle average against a hand calculation"""
+    from beacon import predicted_ma
+
+    # 90 mAs wake + 25 mA x 2 s + 0.15 mA x 298 s over 300 s
+    assert predicted_ma(298000, 2000) == pytest.approx((90 + 50 + 44.7) / 300)
+    assert predicted_ma(0, 2000) == pytest.approx(0.15)
+    assert predicted_ma(600000, 2000) < predicted_ma(60000, 2000)
+
+
+def test_disabled_sleeps_until_key(machine_mock):
+    """Test either setting at 0 turns the timer wake off"""
+    from beacon import Beacon
+
+    assert Beacon(300000, 0).sleep_ms() is None
+    assert Beacon(0, 2000).sleep_ms() is None
+    assert Beacon(300000, 2000).sleep_ms() == 300000
+
+
+def test_timer_wake(machine_mock):
+    """Test only a deep-sleep timer wake opens a beacon window"""
+    from beacon import Beacon
+
+    beacon = Beacon(300000, 2000)
+    machine_mock.reset_cause.return_value = machine_mock.DEEPSLEEP_RESET
+    machine_mock.wake_reason.return_value = machine_mock.TIMER_WAKE
+    assert beacon.timer_wake() is True
+
+    machine_mock.wake_reason.return_value = machine_mock.EXT1_WAKE
+    assert beacon.timer_wake() is False
+
+    machine_mock.reset_cause.return_value = 1  # Power on
+    assert beacon.timer_wake() is False
+
+
+def test_listen_times_out(machine_mock, clock):
+    """Test an unanswered window ends after window_ms"""
+    from beacon import Beacon
+
+    beacon = Beacon(300000, 2000)
+
+    assert beacon.listen(lambda: False) is False
+    assert clock.now == 2000
+
+
+def test_listen_stays_awake(machine_mock, clock):
+    """Test a connection ends the window early"""
+    from beacon import Beacon
+
+    beacon = Beacon(300000, 2000)
+
+    assert beacon.listen(lambda: clock.now >= 500) is True
+    assert clock.now == 500
+
+
+def test_status(machine_mock):
+    """Test the BEACON reply"""
+    from beacon import Beacon
+
+    assert Beacon(300000, 2000).status() == "BEACON:300s,WINDOW:2000ms,PRED:0.61mA"
+    assert Beacon(300000, 0).status() == "BEACON:OFF,PRED:0.15mA"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -5,20 +5,6 @@ Uses mocks to test without actual Bluetooth hardware
 
 import pytest
 import struct
-from unittest.mock import Mock, patch
-
-
-# Mock MicroPython modules
-class MockMicropython:
-    @staticmethod
-    def const(value):
-        return value
-
-
-@pytest.fixture(autouse=True)
-def mock_micropython_modules(monkeypatch):
-    """Mock MicroPython-specific modules"""
-    monkeypatch.setitem(__builtins__.__dict__, 'micropython', MockMicropython())
 
 
 def test_advertising_payload_with_name():
@@ -41,11 +27,12 @@ def test_advertising_payload_with_services():
     """Test advertising payload with service UUIDs"""
     from ble_advertising import advertising_payload
 
-    # Mock a 128-bit UUID (16 bytes)
-    mock_uuid = Mock()
-    mock_uuid.__bytes__ = Mock(return_value=b'\x00' * 16)
+    # A 128-bit UUID (16 bytes); Mock cannot stand in for __bytes__
+    class Uuid128:
+        def __bytes__(self):
+            return b'\x00' * 16
 
-    payload = advertising_payload(services=[mock_uuid])
+    payload = advertising_payload(services=[Uuid128()])
 
     assert isinstance(payload, bytearray)
     assert len(payload) > 0
@@ -113,5 +100,15 @@ def test_appearance():
     assert len(payload) > 0
 
 
+def test_manufacturer_data():
+    """Test manufacturer-specific data is appended as an AD structure"""
+    from ble_advertising import advertising_payload
+
+    data = struct.pack("<HB", 0xFFFF, 0x03)
+    payload = advertising_payload(manufacturer=data)
+
+    assert bytes(payload).endswith(bytes([len(data) + 1, 0xFF]) + data)
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
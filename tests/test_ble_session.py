@@ -0,0 +1,136 @@
+"""
+Unit tests for authenticated BLE sessions
+Uses a fake ticks clock instead of ESP32 timing
+"""
+
+import hashlib
+from binascii import unhexlify
+import pytest
+
+
+def test_session_per_connection(clock):
+    """Test a session covers only the connection that authenticated"""
+    from ble_session import Sessions
+
+    sessions = Sessions()
+    sessions.start(1)
+
+    assert sessions.valid(1)
+    assert not sessions.valid(2)
+
+
+def test_session_expires(clock):
+    """Test a session ends after ttl_ms"""
+    from ble_session import Sessions
+
+    sessions = Sessions(ttl_ms=1000)
+    sessions.start(1)
+    clock.now += 999
+    assert sessions.valid(1)
+    assert sessions.status(1) == "SESSION:0s"
+
+    clock.now += 1
+    assert not sessions.valid(1)
+    assert sessions.status(1) == "SESSION:NONE"
+
+
+def test_end_on_disconnect(clock):
+    """Test end() drops the session and any open challenge"""
+    from ble_session import Sessions
+
+    sessions = Sessions()
+    sessions.start(1)
+    sessions.challenge(1)
+    sessions.end(1)
+
+    assert not sessions.valid(1)
+    assert sessions.expected(1, "1234") is None
+
+
+def test_challenge_response(clock):
+    """Test the expected answer is SHA-256 of the nonce bytes and the PIN"""
+    from ble_session import Sessions
+
+    sessions = Sessions()
+    nonce = sessions.challenge(1)
+    answer = hashlib.sha256(unhexlify(nonce) + b"1234").hexdigest()
+
+    assert sessions.expected(1, "1234") == answer
+
+
+def test_challenge_single_use(clock):
+    """Test a nonce cannot be answered twice or from another connection"""
+    from ble_session import Sessions
+
+    sessions = Sessions()
+    sessions.challenge(1)
+
+    assert sessions.expected(2, "1234") is None
+    assert sessions.expected(1, "1234") is not None
+    assert sessions.expected(1, "1234") is None
+
+
+def test_challenges_differ(clock):
+    """Test each challenge is a fresh nonce"""
+    from ble_session import Sessions, NONCE_SIZE
+
+    sessions = Sessions()
+    first = sessions.challenge(1)
+    second = sessions.challenge(1)
+
+    assert len(first) == NONCE_SIZE * 2
+    assert first != second
+
+
+def test_state_in_connection_table(clock):
+    """Test sessions live in the table entries and go with them"""
+    from ble_session import Sessions, Session
+
+    table = {1: Session()}
+    sessions = Sessions(table=table)
+    sessions.start(1)
+
+    assert table[1].auth is not None
+    assert not sessions.valid(2)
+    assert 2 not in table
+
+    del table[1]  # Disconnect
+    assert not sessions.valid(1)
+
+
+def test_link_outside_table(clock):
+    """Test a link the table does not know (the wired console) gets its own session"""
+    from ble_session import Sessions
+
+    table = {}
+    sessions = Sessions(table=table)
+    sessions.start(-1)
+
+    assert sessions.valid(-1)
+    assert -1 not in table
+    sessions.end(-1)
+    assert not sessions.valid(-1)
+
+
+def test_links_outside_table_expire(clock):
+    """Test entries for links outside the table go once their session has expired"""
+    from ble_session import Sessions, MAX_OWN
+
+    sessions = Sessions(ttl_ms=1000, table={})
+    sessions.start(-1)
+    sessions.start(-2)
+    sessions.challenge(-3)
+
+    clock.now += 1000
+    assert not sessions.valid(-1)
+    sessions.start(-4)
+    assert sorted(sessions._own) == [-4, -3]
+
+    for conn in range(-10, -10 - MAX_OWN, -1):
+        sessions.start(conn)
+    assert len(sessions._own) == MAX_OWN
+    assert sessions.valid(-10 - MAX_OWN + 1)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
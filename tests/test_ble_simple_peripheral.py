@@ -25,8 +25,12 @@ class MockBluetooth:
 
         def gatts_register_services(self, services):
             self.services = services
-            # Return mock handles
-            return [[(1, 2)]]
+            # One value handle per characteristic, numbered from 1 (TX=1, RX=2)
+            handles = []
+            for _, characteristics in services:
+                start = sum(len(h) for h in handles) + 1
+                handles.append(tuple(range(start, start + len(characteristics))))
+            return handles
 
         def gatts_notify(self, conn_handle, value_handle, data):
             pass
@@ -71,7 +75,7 @@ def test_ble_peripheral_init(mock_bluetooth, mock_advertising):
 
     assert peripheral is not None
     assert peripheral.device_name == "TestDevice"
-    assert len(peripheral._connections) == 0
+    assert len(peripheral.connections) == 0
 
 
 def test_ble_peripheral_init_error(monkeypatch):
@@ -88,10 +92,10 @@ def test_ble_peripheral_init_error(monkeypatch):
 
 def test_send_string_data(mock_bluetooth, mock_advertising):
     """Test sending string data (should convert to bytes)"""
-    from ble_simple_peripheral import BLESimplePeripheral
+    from ble_simple_peripheral import BLESimplePeripheral, Connection
 
     peripheral = BLESimplePeripheral(name="TestDevice")
-    peripheral._connections.add(1)
+    peripheral.connections[1] = Connection(1)
 
     # Mock gatts_notify
     peripheral._ble.gatts_notify = Mock()
@@ -107,10 +111,10 @@ def test_send_string_data(mock_bluetooth, mock_advertising):
 
 def test_send_bytes_data(mock_bluetooth, mock_advertising):
     """Test sending bytes data"""
-    from ble_simple_peripheral import BLESimplePeripheral
+    from ble_simple_peripheral import BLESimplePeripheral, Connection
 
     peripheral = BLESimplePeripheral(name="TestDevice")
-    peripheral._connections.add(1)
+    peripheral.connections[1] = Connection(1)
 
     peripheral._ble.gatts_notify = Mock()
 
@@ -125,12 +129,12 @@ def test_send_bytes_data(mock_bluetooth, mock_advertising):
 
 def test_send_to_multiple_connections(mock_bluetooth, mock_advertising):
     """Test sending data to multiple connections"""
-    from ble_simple_peripheral import BLESimplePeripheral
+    from ble_simple_peripheral import BLESimplePeripheral, Connection
 
-    peripheral = BLESimplePeripheral(name="TestDevice")
-    peripheral._connections.add(1)
-    peripheral._connections.add(2)
-    peripheral._connections.add(3)
+    peripheral = BLESimplePeripheral(name="TestDevice", max_connections=3)
+    peripheral.connections[1] = Connection(1)
+    peripheral.connections[2] = Connection(2)
+    peripheral.connections[3] = Connection(3)
 
     peripheral._ble.gatts_notify = Mock()
 
@@ -141,34 +145,54 @@ def test_send_to_multiple_connections(mock_bluetooth, mock_advertising):
 
 
 def test_send_error_handling(mock_bluetooth, mock_advertising):
-    """Test error handling when sending fails"""
-    from ble_simple_peripheral import BLESimplePeripheral
+    """Test a failed send closes the link but keeps the entry until it is gone"""
+    from ble_simple_peripheral import BLESimplePeripheral, Connection
 
     peripheral = BLESimplePeripheral(name="TestDevice")
-    peripheral._connections.add(1)
+    peripheral.connections[1] = Connection(1)
 
     # Mock send to raise exception
     peripheral._ble.gatts_notify = Mock(side_effect=Exception("Send failed"))
+    peripheral._ble.gap_disconnect = Mock()
 
     # Should not raise exception (error handled internally)
     peripheral.send("Test")
 
-    # Connection should be removed after error
-    assert len(peripheral._connections) == 0
+    peripheral._ble.gap_disconnect.assert_called_once_with(1)
+    assert peripheral.is_connected(1)
+
+    peripheral._irq(2, (1, None, None))
+    assert not peripheral.is_connected()
+
+
+def test_send_queue_full_keeps_connection(mock_bluetooth, mock_advertising):
+    """Test a full notify queue drops the message but not the central"""
+    import errno
+    from ble_simple_peripheral import BLESimplePeripheral, Connection
+
+    peripheral = BLESimplePeripheral(name="TestDevice")
+    peripheral.connections[1] = Connection(1)
+    peripheral._ble.gatts_notify = Mock(side_effect=OSError(errno.ENOMEM))
+    peripheral._ble.gap_disconnect = Mock()
+
+    peripheral.send("LOG:...")
+
+    peripheral._ble.gap_disconnect.assert_not_called()
+    assert peripheral.is_connected(1)
 
 
 def test_is_connected(mock_bluetooth, mock_advertising):
     """Test connection status check"""
-    from ble_simple_peripheral import BLESimplePeripheral
+    from ble_simple_peripheral import BLESimplePeripheral, Connection
 
     peripheral = BLESimplePeripheral(name="TestDevice")
 
     assert peripheral.is_connected() is False
 
-    peripheral._connections.add(1)
+    peripheral.connections[1] = Connection(1)
     assert peripheral.is_connected() is True
 
-    peripheral._connections.clear()
+    peripheral.connections.clear()
     assert peripheral.is_connected() is False
 
 
@@ -193,15 +217,15 @@ def test_irq_connect_event(mock_bluetooth, mock_advertising):
     # Simulate connection event (event=1)
     peripheral._irq(1, (123, None, None))
 
-    assert 123 in peripheral._connections
+    assert 123 in peripheral.connections
 
 
 def test_irq_disconnect_event(mock_bluetooth, mock_advertising):
     """Test IRQ handler for disconnection event"""
-    from ble_simple_peripheral import BLESimplePeripheral
+    from ble_simple_peripheral import BLESimplePeripheral, Connection
 
     peripheral = BLESimplePeripheral(name="TestDevice")
-    peripheral._connections.add(123)
+    peripheral.connections[123] = Connection(123)
 
     # Mock advertise
     peripheral._advertise = Mock()
@@ -209,7 +233,7 @@ def test_irq_disconnect_event(mock_bluetooth, mock_advertising):
     # Simulate disconnect event (event=2)
     peripheral._irq(2, (123, None, None))
 
-    assert 123 not in peripheral._connections
+    assert 123 not in peripheral.connections
     peripheral._advertise.assert_called_once()
 
 
@@ -221,11 +245,152 @@ def test_irq_write_event_with_callback(mock_bluetooth, mock_advertising):
 
     callback = Mock()
     peripheral.on_write(callback)
+    peripheral._irq(1, (123, None, None))
 
     # Simulate write event (event=3)
     peripheral._irq(3, (123, 2))  # 2 is RX handle
 
-    callback.assert_called_once()
+    callback.assert_called_once_with(b"test_data", 123)
+
+
+def test_reply_goes_to_requesting_connection(mock_bluetooth, mock_advertising):
+    """Test send() from a write callback notifies only the writer"""
+    from ble_simple_peripheral import BLESimplePeripheral
+
+    peripheral = BLESimplePeripheral(name="TestDevice", max_connections=2)
+    peripheral._ble.gatts_notify = Mock()
+    peripheral.on_write(lambda data, conn: peripheral.send("ERROR:WRONG_PASSWORD\n"))
+    peripheral._irq(1, (1, None, None))
+    peripheral._irq(1, (2, None, None))
+
+    peripheral._irq(3, (2, 2))
+    peripheral._ble.gatts_notify.assert_called_once_with(2, 1, b"ERROR:WRONG_PASSWORD\n")
+
+    # Outside a write: every central
+    peripheral._ble.gatts_notify.reset_mock()
+    peripheral.send("LOCKED\n")
+    assert peripheral._ble.gatts_notify.call_count == 2
+
+
+def test_connection_limit(mock_bluetooth, mock_advertising):
+    """Test a central past max_connections is disconnected"""
+    from ble_simple_peripheral import BLESimplePeripheral
+
+    peripheral = BLESimplePeripheral(name="TestDevice", max_connections=1)
+    peripheral._ble.gap_disconnect = Mock()
+    peripheral._irq(1, (1, None, None))
+    peripheral._irq(1, (2, None, None))
+
+    assert list(peripheral.connections) == [1]
+    peripheral._ble.gap_disconnect.assert_called_once_with(2)
+
+
+def test_command_split_across_writes(mock_bluetooth, mock_advertising):
+    """Test a full-size write without newline waits for the rest"""
+    from ble_simple_peripheral import BLESimplePeripheral
+
+    peripheral = BLESimplePeripheral(name="TestDevice")
+    callback = Mock()
+    peripheral.on_write(callback)
+    peripheral._irq(1, (1, None, None))
+    peripheral._ble.gatts_read = Mock(side_effect=[b"SCHEDULE:9999:1:ffff", b"ffff\n"])
+
+    peripheral._irq(3, (1, 2))
+    callback.assert_not_called()
+    peripheral._irq(3, (1, 2))
+    callback.assert_called_once_with(b"SCHEDULE:9999:1:ffffffff", 1)
+
+
+def test_chunked_writes_after_mtu_exchange(mock_bluetooth, mock_advertising):
+    """Test writes below the negotiated MTU end commands only until a newline is seen"""
+    from ble_simple_peripheral import BLESimplePeripheral
+
+    peripheral = BLESimplePeripheral(name="TestDevice")
+    callback = Mock()
+    peripheral.on_write(callback)
+    peripheral._irq(1, (1, None, None))
+    peripheral._irq(21, (1, 247))
+    command = b"SCHEDULE:9999:1:" + b"f" * 42
+    chunks = [command[i:i + 20] for i in range(0, len(command), 20)]
+    chunks[-1] += b"\n"
+    peripheral._ble.gatts_read = Mock(side_effect=[b"STATUS", b"AUTH:1234\n"] + chunks)
+
+    peripheral._irq(3, (1, 2))          # Unterminated, one command per write
+    peripheral._irq(3, (1, 2))
+    for _ in chunks:
+        peripheral._irq(3, (1, 2))
+
+    assert callback.call_args_list == [
+        call(b"STATUS", 1), call(b"AUTH:1234", 1), call(command, 1)]
+
+
+def test_pipelined_commands(mock_bluetooth, mock_advertising):
+    """Test several commands in one write run in order, replies to the writer"""
+    from ble_simple_peripheral import BLESimplePeripheral
+
+    peripheral = BLESimplePeripheral(name="TestDevice")
+    peripheral._ble.gatts_notify = Mock()
+    peripheral.on_write(lambda data, conn: peripheral.send(b"OK:" + data))
+    peripheral._irq(1, (1, None, None))
+    peripheral._ble.gatts_read = Mock(return_value=b"STATUS\r\n\nMEM\nCPU")
+
+    peripheral._irq(3, (1, 2))
+
+    assert peripheral._ble.gatts_notify.call_args_list == [
+        call(1, 1, b"OK:STATUS"), call(1, 1, b"OK:MEM"), call(1, 1, b"OK:CPU")]
+
+
+def test_command_too_long(mock_bluetooth, mock_advertising):
+    """Test an overlong command is dropped with an error"""
+    from ble_simple_peripheral import BLESimplePeripheral, RX_BUFFER_SIZE
+
+    peripheral = BLESimplePeripheral(name="TestDevice")
+    peripheral._ble.gatts_notify = Mock()
+    peripheral.on_write(Mock())
+    peripheral._irq(1, (1, None, None))
+    peripheral._irq(21, (1, 247))
+    peripheral._ble.gatts_read = Mock(return_value=b"X" * 244)
+
+    peripheral._irq(3, (1, 2))
+    peripheral._irq(3, (1, 2))
+
+    assert 244 * 2 > RX_BUFFER_SIZE
+    peripheral._ble.gatts_notify.assert_called_once_with(1, 1, b"ERROR:TOO_LONG\n")
+    peripheral._write_callback.assert_not_called()
+
+
+def test_command_too_long_skips_to_newline(mock_bluetooth, mock_advertising):
+    """Test the rest of an overlong command is dropped, not run on its own"""
+    from ble_simple_peripheral import BLESimplePeripheral
+
+    peripheral = BLESimplePeripheral(name="TestDevice")
+    peripheral._ble.gatts_notify = Mock()
+    callback = Mock()
+    peripheral.on_write(callback)
+    peripheral._irq(1, (1, None, None))
+    peripheral._irq(21, (1, 247))
+    peripheral._ble.gatts_read = Mock(side_effect=[
+        b"X" * 244, b"X" * 244, b"X" * 244, b"TAIL\nSTATUS\n"])
+
+    for _ in range(4):
+        peripheral._irq(3, (1, 2))
+
+    peripheral._ble.gatts_notify.assert_called_once_with(1, 1, b"ERROR:TOO_LONG\n")
+    callback.assert_called_once_with(b"STATUS", 1)
+
+
+def test_disconnect_callback(mock_bluetooth, mock_advertising):
+    """Test on_disconnect gets the handle of the central that left"""
+    from ble_simple_peripheral import BLESimplePeripheral, Connection
+
+    peripheral = BLESimplePeripheral(name="TestDevice")
+    peripheral.connections[123] = Connection(123)
+    callback = Mock()
+    peripheral.on_disconnect(callback)
+
+    peripheral._irq(2, (123, None, None))
+
+    callback.assert_called_once_with(123)
 
 
 def test_irq_error_handling(mock_bluetooth, mock_advertising):
@@ -241,5 +406,166 @@ def test_irq_error_handling(mock_bluetooth, mock_advertising):
     assert True
 
 
+def test_mtu_exchange_sets_payload_size(mock_bluetooth, mock_advertising):
+    """Test notification payload size follows the negotiated MTU"""
+    from ble_simple_peripheral import BLESimplePeripheral
+
+    peripheral = BLESimplePeripheral(name="TestDevice")
+    peripheral._irq(1, (7, None, None))
+
+    # Default ATT MTU
+    assert peripheral.payload_size() == 20
+
+    # Simulate MTU exchange event (event=21)
+    peripheral._irq(21, (7, 185))
+    assert peripheral.payload_size() == 182
+
+    peripheral._advertise = Mock()
+    peripheral._irq(2, (7, None, None))
+    assert 7 not in peripheral.connections
+
+
+def test_set_name_readvertises(mock_bluetooth, mock_advertising):
+    """Test changing the device name restarts advertising"""
+    from ble_simple_peripheral import BLESimplePeripheral
+
+    peripheral = BLESimplePeripheral(name="TestDevice")
+    peripheral._advertise = Mock()
+
+    peripheral.set_name("Locker-07")
+
+    assert peripheral.device_name == "Locker-07"
+    peripheral._advertise.assert_called_once()
+
+
+def test_manufacturer_data_readvertises_when_idle(mock_bluetooth, mock_advertising):
+    """Test status bytes are advertised only when they change"""
+    from ble_simple_peripheral import BLESimplePeripheral, Connection
+
+    peripheral = BLESimplePeripheral(name="TestDevice")
+    peripheral._advertise = Mock()
+
+    peripheral.set_manufacturer_data(b'\xff\xff\x01')
+    peripheral.set_manufacturer_data(b'\xff\xff\x01')
+    assert peripheral._advertise.call_count == 1
+
+    # Connected: keep the new data for the next advertising round
+    peripheral.connections[1] = Connection(1)
+    peripheral.set_manufacturer_data(b'\xff\xff\x03')
+    assert peripheral._advertise.call_count == 1
+    assert peripheral._manufacturer == b'\xff\xff\x03'
+
+
+def test_reap_idle_connection(mock_bluetooth, mock_advertising, clock):
+    """Test a silent central is told why and disconnected"""
+    from ble_simple_peripheral import BLESimplePeripheral
+
+    peripheral = BLESimplePeripheral(name="TestDevice")
+    peripheral._ble.gatts_notify = Mock()
+    peripheral._ble.gap_disconnect = Mock()
+    peripheral._irq(1, (4, None, None))
+
+    clock.now = 200000
+    peripheral._irq(3, (4, 2))          # Command keeps the link alive
+    clock.now = 400000
+    assert peripheral.reap_idle(300) is False
+
+    clock.now = 500000
+    assert peripheral.reap_idle(300) is True
+    peripheral._ble.gatts_notify.assert_called_with(4, 1, b"DISCONNECT:IDLE\n")
+    peripheral._ble.gap_disconnect.assert_called_once_with(4)
+
+
+def test_battery_service(mock_bluetooth, mock_advertising, monkeypatch):
+    """Test the Battery Service is registered and updated on request"""
+    from ble_simple_peripheral import BLESimplePeripheral
+
+    monkeypatch.setattr(mock_bluetooth.BLE, 'gatts_write', Mock(), raising=False)
+
+    peripheral = BLESimplePeripheral(name="TestDevice", battery=True)
+    peripheral.set_battery_level(78)
+
+    assert peripheral._handle_battery == 3
+    peripheral._ble.gatts_write.assert_called_once_with(3, bytes((78,)), True)
+
+
+def test_status_characteristics_write_on_change(mock_bluetooth, mock_advertising, monkeypatch):
+    """Test status values are written (and notified) only when they change"""
+    from ble_simple_peripheral import BLESimplePeripheral
+
+    monkeypatch.setattr(mock_bluetooth.BLE, 'gatts_write', Mock(), raising=False)
+
+    peripheral = BLESimplePeripheral(name="TestDevice", status=True)
+    peripheral.set_status(True, 2, 4500)
+    assert peripheral._ble.gatts_write.call_args_list == [
+        call(3, b"\x01", True), call(4, b"\x02", True), call(5, b"\x05\x00", True)]
+
+    # Same second left: nothing to send
+    peripheral._ble.gatts_write.reset_mock()
+    peripheral.set_status(True, 2, 4200)
+    peripheral._ble.gatts_write.assert_not_called()
+
+    peripheral.set_status(False, 2, 0)
+    assert peripheral._ble.gatts_write.call_args_list == [
+        call(3, b"\x00", True), call(5, b"\x00\x00", True)]
+
+
+def test_adv_interval_change(mock_bluetooth, mock_advertising):
+    """Test slower advertising restarts advertising only when idle"""
+    from ble_simple_peripheral import BLESimplePeripheral
+
+    peripheral = BLESimplePeripheral(name="TestDevice")
+    peripheral._advertise = Mock()
+
+    peripheral.set_adv_interval(2000000)
+    peripheral.set_adv_interval(2000000)
+
+    peripheral._advertise.assert_called_once()
+
+
+def test_bonding_secrets(mock_bluetooth, mock_advertising, monkeypatch):
+    """Test secret IRQs go to the bond store and bonded links are tracked"""
+    from ble_simple_peripheral import BLESimplePeripheral
+
+    monkeypatch.setattr(mock_bluetooth.BLE, 'config', Mock(), raising=False)
+    monkeypatch.setattr(mock_bluetooth.BLE, 'gap_pair', Mock(), raising=False)
+    bonds = Mock()
+    bonds.get.return_value = b"ltk"
+
+    peripheral = BLESimplePeripheral(name="TestDevice", bonds=bonds)
+    assert peripheral._irq(29, (2, 0, b"peer")) == b"ltk"
+    bonds.get.assert_called_once_with(2, 0, b"peer")
+    peripheral._irq(30, (2, b"peer", b"new"))
+    bonds.set.assert_called_once_with(2, b"peer", b"new")
+
+    peripheral._irq(1, (5, None, None))
+    peripheral._ble.gap_pair.assert_called_once_with(5)
+    peripheral._irq(28, (5, True, False, True, 16))
+    assert peripheral.is_bonded(5)
+
+    peripheral._advertise = Mock()
+    peripheral._irq(2, (5, None, None))
+    assert not peripheral.is_bonded(5)
+
+
+def test_fast_advertise_burst(mock_bluetooth, mock_advertising, clock):
+    """Test a fast advertising burst reverts to the normal interval"""
+    from ble_simple_peripheral import BLESimplePeripheral, FAST_ADV_US
+
+    peripheral = BLESimplePeripheral(name="TestDevice")
+    peripheral._ble.gap_advertise = Mock()
+
+    peripheral.fast_advertise(1000)
+    assert peripheral._ble.gap_advertise.call_args[0][0] == FAST_ADV_US
+
+    clock.now = 999
+    peripheral.step()
+    assert peripheral._ble.gap_advertise.call_count == 1
+
+    clock.now = 1000
+    peripheral.step()
+    assert peripheral._ble.gap_advertise.call_args[0][0] == 500000
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,181 @@
+"""
+Unit tests for the BLE bonding key store
+Runs against temporary files instead of ESP32 flash
+"""
+
+import pytest
+
+
+@pytest.fixture
+def bonds_path(tmp_path):
+    return str(tmp_path / "bonds.bin")
+
+
+PEER = b"\x00\x11\x22\x33\x44\x55\x66"
+OTHER = b"\x00\xaa\xbb\xcc\xdd\xee\xff"
+THIRD = b"\x01\x10\x20\x30\x40\x50\x60"
+
+
+def test_set_and_get_by_key(bonds_path):
+    """Test a secret comes back for its key and type only"""
+    from bond_store import BondStore, SEC_PEER, SEC_OUR
+
+    bonds = BondStore(bonds_path)
+    assert bonds.set(SEC_PEER, PEER, b"ltk-1") is True
+
+    assert bonds.get(SEC_PEER, 0, PEER) == b"ltk-1"
+    assert bonds.get(SEC_OUR, 0, PEER) is None
+    assert bonds.get(SEC_PEER, 0, OTHER) is None
+
+
+def test_get_by_index(bonds_path):
+    """Test key=None walks the secrets of one type in order"""
+    from bond_store import BondStore, SEC_PEER, SEC_OUR
+
+    bonds = BondStore(bonds_path)
+    bonds.set(SEC_PEER, PEER, b"a")
+    bonds.set(SEC_OUR, PEER, b"ours")
+    bonds.set(SEC_PEER, OTHER, b"b")
+
+    assert bonds.get(SEC_PEER, 0, None) == b"a"
+    assert bonds.get(SEC_PEER, 1, None) == b"b"
+    assert bonds.get(SEC_PEER, 2, None) is None
+    assert bonds.count() == 2
+
+
+def test_delete(bonds_path):
+    """Test a None value deletes, and deleting nothing reports False"""
+    from bond_store import BondStore, SEC_PEER
+
+    bonds = BondStore(bonds_path)
+    bonds.set(SEC_PEER, PEER, b"ltk")
+
+    assert bonds.set(SEC_PEER, PEER, None) is True
+    assert bonds.get(SEC_PEER, 0, PEER) is None
+    assert bonds.set(SEC_PEER, PEER, None) is False
+
+
+def test_oldest_evicted(bonds_path):
+    """Test the store keeps only the newest max_secrets entries"""
+    from bond_store import BondStore, SEC_PEER
+
+    bonds = BondStore(bonds_path, max_secrets=2)
+    for i in range(3):
+        bonds.set(SEC_PEER, bytes((i,)), b"ltk")
+
+    assert bonds.get(SEC_PEER, 0, b"\x00") is None
+    assert bonds.count() == 2
+
+
+def bond(bonds, addr):
+    """Secrets the stack stores when a central pairs and subscribes"""
+    from bond_store import SEC_OUR, SEC_PEER, SEC_CCCD
+
+    results = (bonds.set(SEC_OUR, addr, b"our-ltk"),
+               bonds.set(SEC_PEER, addr, b"peer-ltk"),
+               bonds.set(SEC_CCCD, addr + b"\x10\x00", b"\x01\x00"))
+    return all(results)
+
+
+def test_eviction_drops_whole_central(bonds_path):
+    """Test eviction forgets the least recently used central, all its entries"""
+    from bond_store import BondStore, SEC_OUR, SEC_PEER, SEC_CCCD
+
+    bonds = BondStore(bonds_path, max_secrets=6)
+    assert bond(bonds, PEER)
+    assert bond(bonds, OTHER)
+    bonds.get(SEC_PEER, 0, PEER)               # PEER reconnects
+
+    assert bond(bonds, THIRD)                  # OTHER is least recently used
+
+    assert bonds.get(SEC_OUR, 0, PEER) == b"our-ltk"
+    assert bonds.get(SEC_PEER, 0, PEER) == b"peer-ltk"
+    assert bonds.get(SEC_CCCD, 0, PEER + b"\x10\x00") == b"\x01\x00"
+    assert bonds.get(SEC_OUR, 0, OTHER) is None
+    assert bonds.get(SEC_PEER, 0, OTHER) is None
+    assert bonds.get(SEC_CCCD, 0, OTHER + b"\x10\x00") is None
+    assert bonds.status() == "BONDS:2,SECRETS:6"
+
+
+def test_many_phones_keep_bonding(bonds_path):
+    """Test a full table still accepts each new phone, keeping our IRK"""
+    from bond_store import BondStore, SEC_OUR_IRK, SEC_PEER, MAX_SECRETS
+
+    bonds = BondStore(bonds_path)
+    assert bonds.set(SEC_OUR_IRK, b"irk", b"\x05" * 16)
+    phones = [bytes((0, 0, 0, 0, 0, 0, i)) for i in range(20)]
+    for addr in phones:
+        assert bond(bonds, addr)
+
+    assert bonds.get(SEC_OUR_IRK, 0, b"irk") == b"\x05" * 16
+    assert bonds.get(SEC_PEER, 0, phones[-1]) == b"peer-ltk"
+    assert bonds.get(SEC_PEER, 0, phones[0]) is None
+    assert bonds.count() == (MAX_SECRETS - 1) // 3
+    assert bonds.status() == f"BONDS:{bonds.count()},SECRETS:{1 + 3 * bonds.count()}"
+
+
+def test_new_bond_not_evicted(bonds_path):
+    """Test the central being stored is never the one evicted"""
+    from bond_store import BondStore, SEC_OUR_IRK, SEC_OUR, SEC_PEER, SEC_CCCD
+
+    bonds = BondStore(bonds_path, max_secrets=3)
+    bonds.set(SEC_OUR_IRK, b"irk", b"irk")
+    assert bonds.set(SEC_OUR, OTHER, b"our-ltk") is True
+    assert bonds.set(SEC_PEER, OTHER, b"peer-ltk") is True
+
+    # OTHER is the only central that could go: refuse instead
+    assert bonds.set(SEC_CCCD, OTHER + b"\x10\x00", b"\x01\x00") is False
+    assert bonds.get(SEC_PEER, 0, OTHER) == b"peer-ltk"
+    assert bonds.get(SEC_OUR_IRK, 0, b"irk") == b"irk"
+    assert bonds.status() == "BONDS:1,SECRETS:3"
+
+
+def test_full_of_our_irk_refuses(bonds_path):
+    """Test a store holding only our IRK refuses a new secret"""
+    from bond_store import BondStore, SEC_OUR_IRK, SEC_PEER
+
+    bonds = BondStore(bonds_path, max_secrets=1)
+    assert bonds.set(SEC_OUR_IRK, b"irk", b"irk") is True
+
+    assert bonds.set(SEC_PEER, OTHER, b"ltk") is False
+    assert bonds.get(SEC_OUR_IRK, 0, b"irk") == b"irk"
+    assert bonds.get(SEC_PEER, 0, OTHER) is None
+
+
+def test_flush_and_reload(bonds_path):
+    """Test bonds survive a reboot once flushed, and only then"""
+    from bond_store import BondStore, SEC_PEER, SEC_CCCD
+
+    bonds = BondStore(bonds_path)
+    bonds.set(SEC_PEER, PEER, b"\x01" * 16)
+    bonds.set(SEC_CCCD, PEER, b"\x02\x00")
+    assert BondStore(bonds_path).count() == 0
+
+    assert bonds.pending() is True
+    assert bonds.flush() is True
+    assert bonds.pending() is False
+
+    reloaded = BondStore(bonds_path)
+    assert reloaded.get(SEC_PEER, 0, PEER) == b"\x01" * 16
+    assert reloaded.get(SEC_CCCD, 0, PEER) == b"\x02\x00"
+    assert reloaded.status() == "BONDS:1,SECRETS:2"
+
+
+def test_clear(bonds_path):
+    """Test clear() forgets every phone on the next flush, not our IRK"""
+    from bond_store import BondStore, SEC_PEER, SEC_OUR_IRK
+
+    bonds = BondStore(bonds_path)
+    bonds.set(SEC_OUR_IRK, b"irk", b"irk")
+    bonds.set(SEC_PEER, PEER, b"ltk")
+    bonds.flush()
+    bonds.clear()
+    bonds.flush()
+
+    reloaded = BondStore(bonds_path)
+    assert reloaded.count() == 0
+    assert reloaded.get(SEC_OUR_IRK, 0, b"irk") == b"irk"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
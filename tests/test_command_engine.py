@@ -0,0 +1,105 @@
+"""
+Unit tests for the transport-agnostic command engine
+Uses a fake byte stream instead of the ESP32 UART
+"""
+
+import pytest
+from unittest.mock import Mock
+
+
+class FakeStream:
+    """machine.UART stand-in: queued chunks in, bytes written out"""
+
+    def __init__(self, *chunks):
+        self.chunks = list(chunks)
+        self.out = b""
+
+    def any(self):
+        return len(self.chunks[0]) if self.chunks else 0
+
+    def readinto(self, buf, n):
+        chunk = self.chunks.pop(0)
+        take = chunk[:n]
+        if len(chunk) > n:
+            self.chunks.insert(0, chunk[n:])
+        buf[:len(take)] = take
+        return len(take)
+
+    def write(self, data):
+        self.out += data
+
+
+def echo(command, reply, conn):
+    reply(f"OK:{command}:{conn}\n")
+
+
+def test_loopback_request():
+    """Test a command round trip without any radio"""
+    from command_engine import CommandEngine, LoopbackTransport, CONSOLE
+
+    link = LoopbackTransport(CommandEngine(echo))
+
+    assert link.request("  STATUS\r\n") == [f"OK:STATUS:{CONSOLE}"]
+    assert link.request("\n") == []
+
+
+def test_handler_error_becomes_reply():
+    """Test an exception in a handler is answered, not raised"""
+    from command_engine import CommandEngine, LoopbackTransport
+
+    def broken(command, reply, conn):
+        raise ValueError("bad")
+
+    link = LoopbackTransport(CommandEngine(broken))
+
+    assert link.request("TIME:9999:x") == ["ERROR:EXCEPTION:bad"]
+
+
+def test_attach_replies_to_writer():
+    """Test BLE writes run through the engine with replies sent to that connection"""
+    from command_engine import CommandEngine
+
+    ble = Mock()
+    CommandEngine(echo).attach(ble)
+    on_write = ble.on_write.call_args[0][0]
+
+    on_write(b"MEM", 3)
+
+    ble.send.assert_called_once_with("OK:MEM:3\n", 3)
+
+
+def test_uart_lines_across_reads():
+    """Test commands split across reads and pipelined in one read"""
+    from command_engine import CommandEngine, UartTransport
+
+    stream = FakeStream(b"STA", b"TUS\r\nMEM\nC", b"PU\n")
+    uart = UartTransport(CommandEngine(echo), stream, conn=-1)
+
+    assert uart.poll() is True
+    assert stream.out == b"OK:STATUS:-1\nOK:MEM:-1\nOK:CPU:-1\n"
+    assert uart.poll() is False
+
+
+def test_uart_line_too_long():
+    """Test an overlong line is dropped once, then input resumes"""
+    from command_engine import CommandEngine, UartTransport
+
+    stream = FakeStream(b"X" * 20, b"X" * 10 + b"\nMEM\n")
+    uart = UartTransport(CommandEngine(echo), stream, conn=-1, size=8)
+
+    uart.poll()
+
+    assert stream.out == b"ERROR:TOO_LONG\nOK:MEM:-1\n"
+
+
+def test_console_pins_must_be_free():
+    """Test a UART console on a keypad or relay GPIO is refused before it opens"""
+    from command_engine import CommandEngine, open_console
+
+    with pytest.raises(ValueError):
+        open_console(CommandEngine(echo), 1, (21, 22), busy=[22, 21, 15])
+    assert open_console(CommandEngine(echo), None, (21, 22), busy=[22]) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
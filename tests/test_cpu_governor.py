@@ -0,0 +1,91 @@
+"""
+Unit tests for CPU frequency governor
+Uses mocks to simulate machine.freq and the ticks clock
+"""
+
+import sys
+import pytest
+from unittest.mock import MagicMock
+
+
+@pytest.fixture
+def machine_mock(monkeypatch):
+    machine = MagicMock()
+    machine.freq.return_value = 160000000
+    monkeypatch.setitem(sys.modules, 'machine', machine)
+    monkeypatch.delitem(sys.modules, 'cpu_governor', raising=False)
+    return machine
+
+
+def test_starts_at_low_clock(machine_mock, clock):
+    """Test the governor drops the default clock at startup"""
+    from cpu_governor import CpuGovernor
+
+    cpu = CpuGovernor()
+
+    machine_mock.freq.assert_called_with(80000000)
+    assert cpu.freq == 80000000
+    assert cpu.transitions == 1
+
+
+def test_boost_holds_then_relaxes(machine_mock, clock):
+    """Test the high clock is held for hold_ms after the last boost"""
+    from cpu_governor import CpuGovernor
+
+    cpu = CpuGovernor(hold_ms=500)
+    cpu.boost()
+    assert cpu.freq == 240000000
+
+    clock.now = 400
+    cpu.boost()      # Second command extends the hold
+    clock.now = 800
+    cpu.relax()
+    assert cpu.freq == 240000000
+
+    clock.now = 900
+    cpu.relax()
+    assert cpu.freq == 80000000
+    assert cpu.boosts == 1
+    assert cpu.high_ms == 900
+    assert cpu.transitions == 3
+
+
+def test_repeated_boost_does_not_touch_pll(machine_mock, clock):
+    """Test machine.freq() is only called on a real change"""
+    from cpu_governor import CpuGovernor
+
+    cpu = CpuGovernor()
+    cpu.boost()
+    calls = machine_mock.freq.call_count
+    cpu.boost()
+    cpu.boost()
+
+    assert machine_mock.freq.call_count == calls
+
+
+def test_set_range_pins_clock(machine_mock, clock):
+    """Test equal levels pin the clock (used by the benchmark)"""
+    from cpu_governor import CpuGovernor
+
+    cpu = CpuGovernor()
+    cpu.set_range(160000000, 160000000)
+    assert cpu.freq == 160000000
+
+    cpu.boost()
+    assert cpu.freq == 160000000
+
+    with pytest.raises(ValueError):
+        cpu.set_range(40000000, 240000000)
+
+
+def test_status(machine_mock, clock):
+    """Test status text"""
+    from cpu_governor import CpuGovernor
+
+    cpu = CpuGovernor()
+
+    assert cpu.status() == "CPU:80MHz,BOOSTS:0,HIGH:0s,TRANSITIONS:1"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,148 @@
+"""
+Unit tests for door contact sensor
+Uses mocks to simulate the reed switch pin and the ticks clock
+"""
+
+import sys
+import pytest
+from unittest.mock import Mock, MagicMock
+
+
+class FakePin:
+    """Reed switch input: 0 = door shut (contact closed), 1 = open"""
+
+    def __init__(self, level=0):
+        self.level = level
+        self.handler = None
+
+    def value(self):
+        return self.level
+
+    def irq(self, trigger=None, handler=None):
+        self.handler = handler
+
+    def edge(self, level):
+        self.level = level
+        self.handler(self)
+
+
+@pytest.fixture(autouse=True)
+def mock_micropython_modules(monkeypatch):
+    """Mock MicroPython-specific modules"""
+    monkeypatch.setitem(sys.modules, 'machine', MagicMock())
+    monkeypatch.delitem(sys.modules, 'door_sensor', raising=False)
+
+
+def settle(door, clock, ms=60):
+    clock.now += ms
+    return door.poll()
+
+
+def test_edge_is_debounced(clock):
+    """Test a change is only applied after the debounce period"""
+    from door_sensor import DoorSensor
+
+    pin = FakePin()
+    on_change = Mock()
+    door = DoorSensor(pin, Mock(), on_change)
+
+    pin.edge(1)
+    clock.now += 10
+    assert door.poll() is False
+    assert door.is_open is False
+
+    assert settle(door, clock) is True
+    assert door.is_open is True
+    on_change.assert_called_once_with(True)
+
+
+def test_bounce_back_is_ignored(clock):
+    """Test contact chatter that settles to the old level"""
+    from door_sensor import DoorSensor
+
+    pin = FakePin()
+    on_change = Mock()
+    door = DoorSensor(pin, Mock(), on_change)
+
+    pin.edge(1)
+    pin.edge(0)
+
+    assert settle(door, clock) is False
+    on_change.assert_not_called()
+
+
+def test_relock_when_door_shuts_after_unlock(clock):
+    """Test the early relock after an open/shut cycle"""
+    from door_sensor import DoorSensor, IDLE
+
+    pin = FakePin()
+    relock = Mock()
+    door = DoorSensor(pin, relock)
+
+    door.unlocked()
+    pin.edge(1)
+    settle(door, clock)
+    relock.assert_not_called()
+
+    clock.now += 1000
+    pin.edge(0)
+    settle(door, clock)
+
+    relock.assert_called_once()
+    assert door.state == IDLE
+    assert door.last_open_ms == 1060
+    assert door.opens == 1
+
+
+def test_no_relock_without_unlock(clock):
+    """Test door movement while locked only reports state"""
+    from door_sensor import DoorSensor
+
+    pin = FakePin()
+    relock = Mock()
+    door = DoorSensor(pin, relock)
+
+    pin.edge(1)
+    settle(door, clock)
+    pin.edge(0)
+    settle(door, clock)
+
+    relock.assert_not_called()
+
+
+def test_door_ajar_at_unlock(clock):
+    """Test a door already open at unlock relocks when it shuts"""
+    from door_sensor import DoorSensor
+
+    pin = FakePin(level=1)
+    relock = Mock()
+    door = DoorSensor(pin, relock)
+
+    door.unlocked()
+    pin.edge(0)
+    settle(door, clock)
+
+    relock.assert_called_once()
+
+
+def test_locked_cancels_cycle(clock):
+    """Test a timer relock ends the cycle before the door shuts"""
+    from door_sensor import DoorSensor
+
+    pin = FakePin()
+    relock = Mock()
+    door = DoorSensor(pin, relock)
+
+    door.unlocked()
+    pin.edge(1)
+    settle(door, clock)
+    door.locked()
+    pin.edge(0)
+    settle(door, clock)
+
+    relock.assert_not_called()
+    assert door.status() == "CLOSED"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,104 @@
+"""
+Unit tests for energy accounting
+Uses a fake tick counter and RTC clock instead of ESP32 timing
+"""
+
+import pytest
+
+
+def test_update_charges_tier_and_loads(clock):
+    """Test elapsed time goes to the tier and every active extra load"""
+    from energy_meter import EnergyMeter, STATE_SIZE, ACTIVE, LIGHT, CONNECTED, RELAY, LED
+
+    meter = EnergyMeter(bytearray(STATE_SIZE), clock=clock)
+    clock.now += 1000
+    meter.update(ACTIVE, connected=True, relay=True)
+    clock.now += 500
+    meter.update(LIGHT, led=True)
+
+    assert meter.ms[ACTIVE] == 1000
+    assert meter.ms[LIGHT] == 500
+    assert meter.ms[CONNECTED] == 1000
+    assert meter.ms[RELAY] == 1000
+    assert meter.ms[LED] == 500
+
+
+def test_deep_tier_while_awake_counts_as_light(clock):
+    """Test napping under a connection is not booked as deep sleep"""
+    from energy_meter import EnergyMeter, STATE_SIZE, LIGHT, DEEP
+
+    meter = EnergyMeter(bytearray(STATE_SIZE), clock=clock)
+    clock.now += 100
+    meter.update(DEEP)
+
+    assert meter.ms[LIGHT] == 100
+    assert meter.ms[DEEP] == 0
+
+
+def test_charge_uses_model(clock):
+    """Test mAs is time times the per-state current"""
+    from energy_meter import EnergyMeter, STATE_SIZE, ACTIVE, RELAY
+
+    model = (10.0, 1.0, 0.1, 5.0, 100.0, 2.0)
+    meter = EnergyMeter(bytearray(STATE_SIZE), model=model, clock=clock)
+    clock.now += 2000
+    meter.update(ACTIVE, relay=True)
+
+    assert meter.mas(ACTIVE) == pytest.approx(20.0)
+    assert meter.mas(RELAY) == pytest.approx(200.0)
+    assert meter.mas() == pytest.approx(220.0)
+
+
+def test_deep_sleep_measured_on_wake(clock):
+    """Test totals and the sleep span carry across deep sleep"""
+    from energy_meter import EnergyMeter, STATE_SIZE, ACTIVE, DEEP
+
+    state = bytearray(STATE_SIZE)
+    meter = EnergyMeter(state, clock=clock)
+    clock.now += 3000
+    meter.update(ACTIVE)
+    meter.sleeping()
+
+    clock.sleep(600)
+    woken = EnergyMeter(state, clock=clock)
+    assert woken.ms[ACTIVE] == 3000
+    assert woken.ms[DEEP] == 600000
+    assert woken.wakes == 1
+
+
+def test_days_remaining(clock):
+    """Test the projection from the average current"""
+    from energy_meter import EnergyMeter, STATE_SIZE, ACTIVE
+
+    model = (1.0, 1.0, 1.0, 0.0, 0.0, 0.0)
+    meter = EnergyMeter(bytearray(STATE_SIZE), model=model, capacity_mah=2400, clock=clock)
+    assert meter.days_remaining() is None  # Too early to tell
+
+    clock.now += 3600 * 1000
+    meter.update(ACTIVE)
+    assert meter.average_ma() == pytest.approx(1.0)
+    assert meter.days_remaining() == pytest.approx(2399 / 24)
+    assert meter.days_remaining(percent=50) == pytest.approx(50)
+
+
+def test_bad_model_rejected(clock):
+    """Test the model needs one current per state"""
+    from energy_meter import EnergyMeter, STATE_SIZE
+
+    with pytest.raises(ValueError):
+        EnergyMeter(bytearray(STATE_SIZE), model=(1.0, 2.0))
+
+
+def test_status(clock):
+    """Test the STATUS-style summary"""
+    from energy_meter import EnergyMeter, STATE_SIZE
+
+    meter = EnergyMeter(bytearray(STATE_SIZE), clock=clock)
+    status = meter.status()
+
+    assert status.startswith("ENERGY:0.0mAh,AVG:NONE,DAYS:NONE,ACTIVE:0s")
+    assert status.endswith("LED:0s,WAKES:0")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,110 @@
+"""
+Unit tests for write-behind flash store
+Runs against temporary files instead of ESP32 flash
+"""
+
+import os
+import pytest
+from unittest.mock import Mock
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "store.json")
+
+
+def test_put_stays_in_ram_until_commit(store_path):
+    """Test writes are deferred"""
+    from flash_store import WriteBehindStore
+
+    store = WriteBehindStore(store_path)
+    store.put('password', '5678')
+
+    assert store.dirty() is True
+    assert not os.path.exists(store_path)
+
+    assert store.commit() is True
+    assert store.dirty() is False
+    assert WriteBehindStore(store_path).get('password') == '5678'
+
+
+def test_repeated_writes_coalesce(store_path, monkeypatch):
+    """Test many puts to one key cost a single flash write"""
+    import flash_store
+    from flash_store import WriteBehindStore
+
+    writes = Mock(wraps=flash_store.atomic_write)
+    monkeypatch.setattr(flash_store, 'atomic_write', writes)
+
+    store = WriteBehindStore(store_path)
+    for pin in ('1111', '2222', '3333'):
+        store.put('password', pin)
+    store.commit()
+    store.commit()
+
+    assert writes.call_count == 1
+    assert WriteBehindStore(store_path).get('password') == '3333'
+
+
+def test_unchanged_value_is_not_dirty(store_path):
+    """Test re-writing the same value does not schedule a commit"""
+    from flash_store import WriteBehindStore
+
+    store = WriteBehindStore(store_path)
+    store.put('name', 'T8-SafeLock')
+    store.commit()
+    store.put('name', 'T8-SafeLock')
+
+    assert store.dirty() is False
+
+
+def test_commit_runs_flushers(store_path):
+    """Test registered writers are flushed in the same batch"""
+    from flash_store import WriteBehindStore
+
+    store = WriteBehindStore(store_path)
+    flusher = Mock(return_value=True)
+    store.add_flusher(flusher)
+
+    assert store.commit() is True
+    flusher.assert_called_once()
+
+    flusher.return_value = False
+    assert store.commit() is False
+
+
+def test_file_without_marker_is_ignored(store_path):
+    """Test a torn write (no commit marker) falls back to the last good copy"""
+    from flash_store import WriteBehindStore
+
+    store = WriteBehindStore(store_path)
+    store.put('password', '4321')
+    store.commit()
+
+    # Simulate power loss mid-way through writing the next commit
+    with open(store_path + ".tmp", 'w') as f:
+        f.write('{"password": "99')
+
+    assert WriteBehindStore(store_path).get('password') == '4321'
+
+    with open(store_path, 'w') as f:
+        f.write('{"password": "0000"}\n')
+    assert WriteBehindStore(store_path).get('password') is None
+
+
+def test_newest_complete_copy_wins(store_path):
+    """Test a complete temp file from an interrupted rename is recovered"""
+    from flash_store import WriteBehindStore
+
+    store = WriteBehindStore(store_path)
+    store.put('password', '1111')
+    store.commit()
+
+    with open(store_path + ".tmp", 'w') as f:
+        f.write('{"password": "2222"}\n#COMMIT 2\n')
+
+    assert WriteBehindStore(store_path).get('password') == '2222'
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,77 @@
+"""
+Unit tests for garbage collection scheduling
+Uses a mock gc module with a controllable allocation counter
+"""
+
+import sys
+import pytest
+from unittest.mock import MagicMock
+
+
+class FakeGc:
+    def __init__(self):
+        self.alloc = 10000
+        self.heap = 100000
+        self.collect = MagicMock(side_effect=self._collect)
+        self.threshold = MagicMock()
+
+    def _collect(self):
+        self.alloc = 10000
+
+    def mem_alloc(self):
+        return self.alloc
+
+    def mem_free(self):
+        return self.heap - self.alloc
+
+
+@pytest.fixture
+def fake_gc(monkeypatch):
+    fake = FakeGc()
+    monkeypatch.setitem(sys.modules, 'gc', fake)
+    monkeypatch.delitem(sys.modules, 'gc_scheduler', raising=False)
+    return fake
+
+
+def test_threshold_set(fake_gc):
+    """Test automatic GC is pushed out to a quarter of the heap"""
+    from gc_scheduler import GcScheduler
+
+    GcScheduler()
+
+    fake_gc.threshold.assert_called_once_with(25000)
+
+
+def test_idle_collects_after_budget(fake_gc):
+    """Test idle points only collect once the budget is allocated"""
+    from gc_scheduler import GcScheduler
+
+    sched = GcScheduler(budget=4096)
+    fake_gc.collect.reset_mock()
+
+    fake_gc.alloc += 4000
+    assert sched.idle() is False
+    fake_gc.collect.assert_not_called()
+
+    fake_gc.alloc += 100
+    assert sched.idle() is True
+    fake_gc.collect.assert_called_once()
+    assert sched.collections == 1
+
+
+def test_high_water_mark(fake_gc):
+    """Test the peak allocation is kept across collections"""
+    from gc_scheduler import GcScheduler
+
+    sched = GcScheduler(budget=4096)
+    fake_gc.alloc = 30000
+    sched.idle()
+    fake_gc.alloc = 12000
+    sched.idle()
+
+    assert sched.high_water == 30000
+    assert "HWM:30000" in sched.status()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
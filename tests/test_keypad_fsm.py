@@ -0,0 +1,251 @@
+"""
+Unit tests for the table-driven keypad state machine
+Runs the shared transition tables on the host with a fake ticks clock
+"""
+
+import pytest
+
+
+class Recorder:
+    def __init__(self, pin="1234"):
+        self.pin = pin
+        self.events = []
+
+    def notify(self, outcome, arg):
+        self.events.append((outcome, arg))
+
+    def secret(self):
+        return self.pin
+
+    def outcomes(self):
+        return [outcome for outcome, _ in self.events]
+
+
+def make(table_name, rec, clock=None, free=3, lockout_s=30, **kwargs):
+    import keypad_fsm
+    import throttle
+    guard = throttle.Throttle(bytearray(throttle.STATE_SIZE), free=free, base_s=lockout_s,
+                              clock=clock.time if clock else (lambda: 0))
+    return keypad_fsm.KeypadFsm(getattr(keypad_fsm, table_name), rec.notify, rec.secret,
+                                guard, **kwargs)
+
+
+def press(fsm, keys):
+    for key in keys:
+        fsm.key(key)
+
+
+def test_unlock(clock):
+    """Test the right PIN and # unlocks"""
+    from keypad_fsm import O_UNLOCK, O_DIGIT, IDLE
+
+    rec = Recorder()
+    fsm = make('BASIC', rec)
+    press(fsm, "1234#")
+
+    assert rec.outcomes() == [O_DIGIT] * 4 + [O_UNLOCK]
+    assert fsm.state == IDLE
+    assert len(fsm.entry) == 0
+
+
+def test_lockout_ignores_keys_until_it_expires(clock):
+    """Test max_attempts wrong PINs lock the keypad without blocking"""
+    from keypad_fsm import O_WRONG, O_LOCKOUT, O_LOCKED_OUT, O_UNLOCK
+
+    rec = Recorder()
+    fsm = make('BASIC', rec, clock, free=2, lockout_s=30)
+    press(fsm, "9#9#")
+    assert (O_WRONG, 1) in rec.events
+    assert (O_LOCKOUT, 30) in rec.events
+
+    rec.events.clear()
+    press(fsm, "1234#")
+    assert rec.outcomes() == [O_LOCKED_OUT] * 5
+    assert rec.events[0] == (O_LOCKED_OUT, 30)
+
+    clock.now += 30000
+    rec.events.clear()
+    press(fsm, "1234#")
+    assert rec.outcomes()[-1] == O_UNLOCK
+
+
+def test_verify_channels_are_separate(clock):
+    """Test a BLE lockout leaves the keypad alone"""
+    from keypad_fsm import O_WRONG, O_LOCKOUT, O_LOCKED_OUT, O_UNLOCK
+    from throttle import BLE
+
+    rec = Recorder()
+    fsm = make('BASIC', rec, clock, free=2)
+    press(fsm, "9#")
+
+    assert fsm.verify("0000", BLE) == O_WRONG
+    assert fsm.verify("0000", BLE) == O_LOCKOUT
+    assert fsm.verify("1234", BLE) == O_LOCKED_OUT
+    assert fsm.verify("1234") == O_UNLOCK
+
+
+def test_verify_expected_replaces_pin(clock):
+    """Test a challenge answer is matched instead of the PIN"""
+    from keypad_fsm import O_WRONG, O_UNLOCK
+    from throttle import BLE
+
+    rec = Recorder()
+    fsm = make('BASIC', rec, clock)
+
+    assert fsm.verify("1234", BLE, 1, expected="abcd") == O_WRONG
+    assert fsm.verify("abcd", BLE, 1, expected="abcd") == O_UNLOCK
+
+
+def test_allow_denies_right_pin(clock):
+    """Test a right PIN outside the schedule is refused without a strike"""
+    from keypad_fsm import O_DENIED
+    from throttle import KEYPAD
+
+    rec = Recorder()
+    fsm = make('BASIC', rec, allow=lambda: False)
+    press(fsm, "1234#")
+
+    assert rec.outcomes()[-1] == O_DENIED
+    assert fsm.throttle.failures(KEYPAD) == 0
+
+
+def test_basic_emergency_and_clear(clock):
+    """Test B opens and A clears in the basic table"""
+    from keypad_fsm import O_EMERGENCY, O_CLEARED
+
+    rec = Recorder()
+    fsm = make('BASIC', rec)
+    press(fsm, "12A")
+    assert rec.outcomes()[-1] == O_CLEARED
+    assert len(fsm.entry) == 0
+
+    fsm.key('B')
+    assert rec.outcomes()[-1] == O_EMERGENCY
+
+
+def test_password_change(clock):
+    """Test A, old PIN, new PIN twice changes the password"""
+    from keypad_fsm import O_CHANGE, O_OLD_OK, O_NEW_OK, O_CHANGED, IDLE
+
+    rec = Recorder()
+    fsm = make('MANAGED', rec)
+    press(fsm, "A1234#5678#5678#")
+
+    outcomes = [o for o in rec.outcomes() if o != 0]
+    assert outcomes == [O_CHANGE, O_OLD_OK, O_NEW_OK, O_CHANGED]
+    assert rec.events[-1] == (O_CHANGED, "5678")
+    assert fsm.state == IDLE
+
+
+def test_password_change_errors(clock):
+    """Test wrong old PIN, short and mismatched new PINs"""
+    from keypad_fsm import O_OLD_WRONG, O_TOO_SHORT, O_MISMATCH, IDLE, NEW
+
+    rec = Recorder()
+    fsm = make('MANAGED', rec)
+    press(fsm, "A9999#")
+    assert rec.outcomes()[-1] == O_OLD_WRONG
+    assert fsm.state == IDLE
+
+    press(fsm, "A1234#12#")
+    assert rec.outcomes()[-1] == O_TOO_SHORT
+    assert fsm.state == NEW
+
+    press(fsm, "5678#5679#")
+    assert rec.outcomes()[-1] == O_MISMATCH
+    assert fsm.state == NEW
+
+
+def test_cancel_change(clock):
+    """Test * leaves password change mode"""
+    from keypad_fsm import O_CANCELLED, IDLE
+
+    rec = Recorder()
+    fsm = make('MANAGED', rec)
+    press(fsm, "A12*")
+
+    assert rec.outcomes()[-1] == O_CANCELLED
+    assert fsm.state == IDLE
+
+
+def test_admin_reset(clock):
+    """Test the admin PIN then B resets, anything else is refused"""
+    from keypad_fsm import O_ADMIN_RESET, O_ADMIN_REQUIRED
+
+    rec = Recorder()
+    fsm = make('MANAGED', rec, admin="9999")
+    press(fsm, "1B")
+    assert rec.outcomes()[-1] == O_ADMIN_REQUIRED
+
+    press(fsm, "9999B")
+    assert rec.outcomes()[-1] == O_ADMIN_RESET
+
+
+def test_old_pin_guesses_lock_out(clock):
+    """Test wrong old PINs in a password change count towards the lockout"""
+    from keypad_fsm import O_OLD_WRONG, O_LOCKOUT, O_LOCKED_OUT, O_UNLOCK
+    from throttle import KEYPAD
+
+    rec = Recorder()
+    fsm = make('MANAGED', rec, clock, free=2, lockout_s=30)
+    press(fsm, "A9999#A9998#")
+    assert (O_OLD_WRONG, 2) in rec.events
+    assert (O_LOCKOUT, 30) in rec.events
+
+    rec.events.clear()
+    press(fsm, "1234#")
+    assert rec.outcomes() == [O_LOCKED_OUT] * 5
+    assert fsm.verify("1234") == O_LOCKED_OUT
+    assert fsm.throttle.failures(KEYPAD) == 2
+
+    clock.now += 30000
+    assert fsm.verify("1234") == O_UNLOCK
+
+
+def test_admin_guesses_lock_out(clock):
+    """Test wrong admin PINs before B lock the keypad like wrong PINs"""
+    from keypad_fsm import O_ADMIN_REQUIRED, O_ADMIN_RESET, O_LOCKOUT, O_LOCKED_OUT
+
+    rec = Recorder()
+    fsm = make('MANAGED', rec, clock, free=2, lockout_s=30, admin="9999")
+    press(fsm, "1111B2222B")
+    assert (O_ADMIN_REQUIRED, 1) in rec.events
+    assert (O_LOCKOUT, 30) in rec.events
+
+    rec.events.clear()
+    press(fsm, "9999B")
+    assert rec.outcomes() == [O_LOCKED_OUT] * 5
+    assert O_ADMIN_RESET not in rec.outcomes()
+
+
+def test_check_shares_the_remote_lockout(clock):
+    """Test remote admin or old PIN guesses lock out PIN checks on that connection"""
+    from keypad_fsm import O_WRONG, O_LOCKOUT, O_LOCKED_OUT, O_UNLOCK
+    from throttle import BLE
+
+    rec = Recorder()
+    fsm = make('MANAGED', rec, clock, free=2, admin="9999")
+
+    assert fsm.check("0000", "9999", BLE, 1) == O_WRONG
+    assert fsm.check("0001", "9999", BLE, 1) == O_LOCKOUT
+    assert fsm.check("9999", "9999", BLE, 1) == O_LOCKED_OUT
+    assert fsm.verify("1234", BLE, 1) == O_LOCKED_OUT
+    assert fsm.verify("1234", BLE, 2) == O_UNLOCK
+
+
+def test_unknown_pairs_ignored(clock):
+    """Test keys with no table entry leave the state alone"""
+    from keypad_fsm import OLD
+
+    rec = Recorder()
+    fsm = make('MANAGED', rec)
+    press(fsm, "A")
+    rec.events.clear()
+    fsm.key('B')
+
+    assert rec.events == []
+    assert fsm.state == OLD
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
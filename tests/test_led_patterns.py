@@ -0,0 +1,105 @@
+"""
+Unit tests for the non-blocking LED pattern engine
+Uses mocks to simulate machine.Timer and the LED pin
+"""
+
+import sys
+import pytest
+from unittest.mock import Mock, MagicMock
+
+
+@pytest.fixture
+def machine_mock(monkeypatch):
+    machine = MagicMock()
+    machine.Timer.ONE_SHOT = 0
+    monkeypatch.setitem(sys.modules, 'machine', machine)
+    monkeypatch.delitem(sys.modules, 'led_patterns', raising=False)
+    return machine
+
+
+def fire(machine_mock):
+    timer = machine_mock.Timer.return_value
+    timer.init.call_args.kwargs['callback'](timer)
+
+
+def test_blink_table(machine_mock):
+    """Test the compact on/off table helper"""
+    from led_patterns import blink
+
+    assert blink(2, 100) == (100, 100, 100, 100)
+    assert blink(1, 50, 200) == (50, 200)
+
+
+def test_play_returns_immediately(machine_mock):
+    """Test play() lights the pin and arms the first step"""
+    from led_patterns import PatternPlayer
+
+    pin = Mock()
+    player = PatternPlayer(pin)
+    player.play((100, 200))
+
+    pin.value.assert_called_with(1)
+    assert machine_mock.Timer.return_value.init.call_args.kwargs['period'] == 100
+    assert player.playing()
+
+
+def test_steps_alternate_then_finish(machine_mock):
+    """Test each timer fire advances one step and the pin ends off"""
+    from led_patterns import PatternPlayer
+
+    pin = Mock()
+    done = Mock()
+    player = PatternPlayer(pin)
+    player.play((100, 200, 300, 400), on_done=done)
+
+    levels = []
+    for _ in range(4):
+        fire(machine_mock)
+        levels.append(pin.value.call_args.args[0])
+
+    assert levels == [0, 1, 0, 0]
+    assert not player.playing()
+    done.assert_called_once()
+
+
+def test_new_pattern_replaces_running(machine_mock):
+    """Test play() restarts from the first step of the new pattern"""
+    from led_patterns import PatternPlayer
+
+    pin = Mock()
+    first_done = Mock()
+    player = PatternPlayer(pin)
+    player.play((100, 100, 100, 100), on_done=first_done)
+    fire(machine_mock)
+    player.play((500, 500))
+
+    assert machine_mock.Timer.return_value.init.call_args.kwargs['period'] == 500
+    pin.value.assert_called_with(1)
+    first_done.assert_not_called()
+
+
+def test_stop_forces_off(machine_mock):
+    """Test stop() cancels the timer and turns the pin off"""
+    from led_patterns import PatternPlayer
+
+    pin = Mock()
+    player = PatternPlayer(pin)
+    player.play((100, 100))
+    player.stop()
+
+    machine_mock.Timer.return_value.deinit.assert_called()
+    pin.value.assert_called_with(0)
+    assert not player.playing()
+
+
+def test_uses_timer_2(machine_mock):
+    """Test the engine keeps clear of the relay and relock timers"""
+    from led_patterns import PatternPlayer
+
+    PatternPlayer(Mock())
+
+    machine_mock.Timer.assert_called_with(2)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,230 @@
+"""
+Unit tests for runtime configuration module
+"""
+
+import pytest
+from unittest.mock import Mock
+
+
+class DictStore:
+    """In-memory stand-in for WriteBehindStore"""
+
+    def __init__(self, data=None):
+        self.data = data or {}
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def put(self, key, value):
+        self.data[key] = value
+
+
+OUTPUTS = (2, 4, 12, 13, 14, 15, 21, 22, 25, 26, 27, 32, 33)
+
+
+@pytest.fixture
+def schema():
+    from lock_config import INT, STR, PIN, PINS
+    return (
+        ('lock_open_time', INT, 5, 1, 60),
+        ('row_pins', PINS, (13, 12, 14), OUTPUTS, None),
+        ('relay_pin', PIN, 32, OUTPUTS, None),
+        ('door_pin', PIN, -1, (-1,) + OUTPUTS, None),
+        ('ble_name', STR, "T8-SafeLock", 1, 16),
+    )
+
+
+def test_defaults_loaded_as_attributes(schema):
+    """Test defaults are exposed as plain attributes"""
+    from lock_config import Config
+
+    cfg = Config(schema, DictStore())
+
+    assert cfg.lock_open_time == 5
+    assert cfg.row_pins == (13, 12, 14)
+    assert cfg.ble_name == "T8-SafeLock"
+
+
+def test_saved_values_override_defaults(schema):
+    """Test persisted overrides are validated at load"""
+    from lock_config import Config
+
+    store = DictStore({'config': {'lock_open_time': 8, 'row_pins': [22, 21, 15]}})
+    cfg = Config(schema, store)
+
+    assert cfg.lock_open_time == 8
+    assert cfg.row_pins == (22, 21, 15)
+
+
+def test_invalid_saved_value_falls_back(schema):
+    """Test out-of-range saved values are ignored"""
+    from lock_config import Config
+
+    store = DictStore({'config': {'lock_open_time': 999, 'ble_name': 7}})
+    cfg = Config(schema, store)
+
+    assert cfg.lock_open_time == 5
+    assert cfg.ble_name == "T8-SafeLock"
+
+
+def test_set_text_applies_and_persists(schema):
+    """Test set_text updates the object, store and listeners"""
+    from lock_config import Config
+
+    store = DictStore()
+    cfg = Config(schema, store)
+    listener = Mock()
+    cfg.on_change(listener)
+
+    cfg.set_text('row_pins', '22,21,15')
+
+    assert cfg.row_pins == (22, 21, 15)
+    assert store.data['config'] == {'row_pins': [22, 21, 15]}
+    listener.assert_called_once_with('row_pins', (22, 21, 15))
+    assert cfg.get_text('row_pins') == '22,21,15'
+
+
+def test_set_text_range_checks(schema):
+    """Test invalid values are rejected and nothing changes"""
+    from lock_config import Config
+
+    store = DictStore()
+    cfg = Config(schema, store)
+
+    with pytest.raises(ValueError):
+        cfg.set_text('lock_open_time', '0')
+    with pytest.raises(ValueError):
+        cfg.set_text('lock_open_time', 'abc')
+    with pytest.raises(ValueError):
+        cfg.set_text('row_pins', '2,4')         # wrong count
+    with pytest.raises(ValueError):
+        cfg.set_text('row_pins', '2,2,4')       # duplicate pin
+    with pytest.raises(ValueError):
+        cfg.set_text('row_pins', '2,4,40')      # not an output GPIO
+    with pytest.raises(ValueError):
+        cfg.set_text('row_pins', '2,4,6')       # flash pin
+    with pytest.raises(ValueError):
+        cfg.set_text('relay_pin', '-1')         # relay is required
+    with pytest.raises(ValueError):
+        cfg.set_text('ble_name', 'X' * 17)
+    with pytest.raises(KeyError):
+        cfg.set_text('unknown', '1')
+
+    assert cfg.lock_open_time == 5
+    assert 'config' not in store.data
+
+
+def test_pins_unique_across_settings(schema):
+    """Test a GPIO can't serve two settings or a reserved console pin"""
+    from lock_config import Config
+
+    store = DictStore()
+    cfg = Config(schema, store, reserved=(25, 26))
+
+    with pytest.raises(ValueError):
+        cfg.set_text('relay_pin', '12')         # a keypad row
+    with pytest.raises(ValueError):
+        cfg.set_text('row_pins', '2,4,32')      # the relay
+    with pytest.raises(ValueError):
+        cfg.set_text('door_pin', '25')          # the console
+    assert 'config' not in store.data
+
+    cfg.set_text('door_pin', '4')
+    cfg.set_text('door_pin', '-1')
+    cfg.set_text('relay_pin', '33')
+    assert cfg.relay_pin == 33
+
+
+def test_overlapping_saved_pins_revert(schema):
+    """Test saved pins that clash fall back to the default pins"""
+    from lock_config import Config
+
+    store = DictStore({'config': {'relay_pin': 22, 'row_pins': [22, 21, 15], 'lock_open_time': 8}})
+    cfg = Config(schema, store)
+
+    assert cfg.relay_pin == 32
+    assert cfg.row_pins == (13, 12, 14)
+    assert cfg.lock_open_time == 8
+
+
+def test_default_value_removes_override(schema):
+    """Test only non-default values are persisted"""
+    from lock_config import Config
+
+    store = DictStore()
+    cfg = Config(schema, store)
+    cfg.set_text('lock_open_time', '9')
+    cfg.set_text('lock_open_time', '5')
+
+    assert store.data['config'] == {}
+
+
+def test_choice_values():
+    """Test CHOICE settings only accept listed values"""
+    from lock_config import Config, CHOICE
+
+    schema = (('relay_profile', CHOICE, 'full', ('full', 'relay_module'), None),)
+    cfg = Config(schema, DictStore())
+
+    cfg.set_text('relay_profile', 'relay_module')
+    assert cfg.relay_profile == 'relay_module'
+
+    with pytest.raises(ValueError):
+        cfg.set_text('relay_profile', 'turbo')
+
+
+def test_ints_values():
+    """Test INTS settings keep their length and may repeat values"""
+    from lock_config import Config, INTS
+
+    store = DictStore()
+    schema = (('energy_ua', INTS, (40000, 3000, 150), 0, 1000000),)
+    cfg = Config(schema, store)
+
+    cfg.set_text('energy_ua', '5000,5000,100')
+    assert cfg.energy_ua == (5000, 5000, 100)
+    assert cfg.get_text('energy_ua') == '5000,5000,100'
+    assert store.data['config'] == {'energy_ua': [5000, 5000, 100]}
+
+    with pytest.raises(ValueError):
+        cfg.set_text('energy_ua', '1,2')
+    with pytest.raises(ValueError):
+        cfg.set_text('energy_ua', '1,2,-3')
+
+
+def idle_bounds(values):
+    if values['idle_min'] > values['idle_max']:
+        raise ValueError("idle bounds")
+
+
+def test_cross_field_check():
+    """Test a value valid alone is refused when it conflicts with another"""
+    from lock_config import Config, INT
+
+    store = DictStore()
+    schema = (('idle_min', INT, 5, 5, 3600), ('idle_max', INT, 120, 5, 3600))
+    cfg = Config(schema, store, check=idle_bounds)
+
+    with pytest.raises(ValueError):
+        cfg.set_text('idle_min', '600')
+    assert cfg.idle_min == 5
+    assert 'config' not in store.data
+
+    cfg.set_text('idle_max', '1200')
+    cfg.set_text('idle_min', '600')
+    assert store.data['config'] == {'idle_min': 600, 'idle_max': 1200}
+
+
+def test_conflicting_saved_values_revert():
+    """Test saved settings that fail the check fall back to the defaults"""
+    from lock_config import Config, INT
+
+    schema = (('idle_min', INT, 5, 5, 3600), ('idle_max', INT, 120, 5, 3600))
+    cfg = Config(schema, DictStore({'config': {'idle_min': 600}}), check=idle_bounds)
+
+    assert cfg.idle_min == 5
+    assert cfg.idle_max == 120
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
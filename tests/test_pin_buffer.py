@@ -0,0 +1,76 @@
+"""
+Unit tests for the fixed-capacity PIN entry buffer
+"""
+
+import pytest
+
+
+def test_append_and_match():
+    """Test typed digits match the stored PIN"""
+    from pin_buffer import PinBuffer
+
+    entry = PinBuffer()
+    for key in "1234":
+        entry.append(key)
+
+    assert len(entry) == 4
+    assert entry.matches("1234")
+    assert entry.matches(b"1234")
+    assert not entry.matches("1235")
+    assert not entry.matches("123")
+    assert not entry.matches("12345")
+
+
+def test_capacity():
+    """Test appends stop at the capacity"""
+    from pin_buffer import PinBuffer
+
+    entry = PinBuffer(capacity=4)
+    results = [entry.append(k) for k in "123456"]
+
+    assert results == [True] * 4 + [False] * 2
+    assert entry.text() == "1234"
+    assert not entry.matches("123456")
+
+
+def test_clear_in_place():
+    """Test clear() empties the buffer without replacing it"""
+    from pin_buffer import PinBuffer
+
+    entry = PinBuffer()
+    buf = entry._buf
+    for key in "99":
+        entry.append(key)
+    entry.clear()
+
+    assert len(entry) == 0
+    assert entry._buf is buf
+    assert bytes(buf) == bytes(len(buf))
+    assert entry.matches("")
+
+
+def test_mask_is_preallocated():
+    """Test the echo string comes from the prebuilt table"""
+    from pin_buffer import PinBuffer, MASKS
+
+    entry = PinBuffer()
+    for key in "123":
+        entry.append(key)
+
+    assert entry.mask() == "***"
+    assert entry.mask() is MASKS[3]
+
+
+def test_equal():
+    """Test the string comparison used for BLE-entered PINs"""
+    from pin_buffer import equal
+
+    assert equal("1234", "1234")
+    assert equal(b"1234", "1234")
+    assert not equal("1234", "1243")
+    assert not equal("123", "1234")
+    assert not equal("12345", "1234")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
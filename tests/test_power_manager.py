@@ -0,0 +1,118 @@
+"""
+Unit tests for tiered power manager
+Uses mocks to simulate machine.lightsleep and the ticks clock
+"""
+
+import sys
+import pytest
+from unittest.mock import Mock, MagicMock
+
+
+@pytest.fixture
+def machine_mock(monkeypatch, clock):
+    machine = MagicMock()
+    machine.lightsleep.side_effect = lambda ms: clock.sleep_ms(ms)
+    monkeypatch.setitem(sys.modules, 'machine', machine)
+    monkeypatch.delitem(sys.modules, 'power_manager', raising=False)
+    return machine
+
+
+def test_tiers_follow_idle_time(machine_mock, clock):
+    """Test ACTIVE -> LIGHT -> DEEP thresholds"""
+    from power_manager import PowerManager, ACTIVE, LIGHT, DEEP
+
+    power = PowerManager(5, 30)
+
+    assert power.tier() == ACTIVE
+    clock.now = 5000
+    assert power.tier() == LIGHT
+    clock.now = 30000
+    assert power.tier() == DEEP
+
+    power.activity()
+    assert power.tier() == ACTIVE
+
+
+def test_busy_stays_active(machine_mock, clock):
+    """Test no naps while the lock is open"""
+    from power_manager import PowerManager, ACTIVE
+
+    power = PowerManager(5, 30)
+    clock.now = 10000
+
+    assert power.step(busy=True) == ACTIVE
+    machine_mock.lightsleep.assert_not_called()
+
+
+def test_light_tier_naps_with_rows_low(machine_mock, clock):
+    """Test keypad rows are driven low only for the nap"""
+    from power_manager import PowerManager, LIGHT
+
+    power = PowerManager(5, 30, nap_ms=100)
+    rows = [Mock(), Mock()]
+    power.set_keypad(rows, [Mock()])
+    clock.now = 6000
+
+    assert power.step() == LIGHT
+
+    machine_mock.lightsleep.assert_called_once_with(100)
+    for row in rows:
+        assert [c.args for c in row.value.call_args_list] == [(0,), (1,)]
+    assert power.naps == 1
+    assert power.early_wakes == 0
+
+
+def test_early_wake_is_counted(machine_mock, clock):
+    """Test a key press cutting a nap short"""
+    from power_manager import PowerManager
+
+    machine_mock.lightsleep.side_effect = lambda ms: clock.sleep_ms(10)
+    power = PowerManager(1, 30)
+    clock.now = 2000
+    power.step()
+
+    assert power.early_wakes == 1
+
+
+def test_residency_counters(machine_mock, clock):
+    """Test time is attributed to the tier it was spent in"""
+    from power_manager import PowerManager, ACTIVE, LIGHT
+
+    power = PowerManager(1, 30, nap_ms=100, poll_ms=50)
+
+    for _ in range(20):     # 20 x 50ms polls = 1s active
+        power.step()
+    for _ in range(10):     # 10 x 100ms naps
+        power.step()
+    power.step()
+
+    assert power.residency[ACTIVE] == 1000
+    assert power.residency[LIGHT] == 1000
+    assert power.status().startswith("POWER:LIGHT,ACTIVE:1s,LIGHT:1s,NAPS:11")
+
+
+def test_deep_tier_naps_until_caller_sleeps(machine_mock, clock):
+    """Test the loop never spins when deep sleep is postponed"""
+    from power_manager import PowerManager, DEEP
+
+    power = PowerManager(5, 30)
+    clock.now = 40000
+
+    assert power.step() == DEEP
+    machine_mock.lightsleep.assert_called_once()
+
+
+def test_set_thresholds(machine_mock, clock):
+    """Test thresholds can be changed at runtime"""
+    from power_manager import PowerManager, ACTIVE, LIGHT
+
+    power = PowerManager(5, 30)
+    clock.now = 3000
+    assert power.tier() == ACTIVE
+
+    power.set_thresholds(2, 30)
+    assert power.tier() == LIGHT
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,124 @@
+"""
+Unit tests for relay economizer driver
+Uses mocks to simulate Pin, PWM and Timer
+"""
+
+import sys
+import pytest
+from unittest.mock import Mock, MagicMock
+
+
+@pytest.fixture
+def machine_mock(monkeypatch):
+    """Mock machine module with Pin/PWM/Timer"""
+    machine = MagicMock()
+    machine.Timer.ONE_SHOT = 0
+    monkeypatch.setitem(sys.modules, 'machine', machine)
+    monkeypatch.delitem(sys.modules, 'relay_driver', raising=False)
+    return machine
+
+
+def make_driver(machine_mock, profile, hold_duty=0):
+    from relay_driver import RelayDriver
+    pin = Mock()
+    return RelayDriver(pin, profile, hold_duty), pin
+
+
+def test_full_profile_never_uses_pwm(machine_mock, clock):
+    """Test legacy profile drives the pin fully for the whole time"""
+    driver, pin = make_driver(machine_mock, 'full')
+
+    driver.on()
+    pin.value.assert_called_with(1)
+    machine_mock.Timer.return_value.init.assert_not_called()
+
+    clock.now = 5000
+    driver.off()
+
+    machine_mock.PWM.assert_not_called()
+    assert driver.last_mas == pytest.approx(80 * 5.0)
+
+
+def test_economizer_switches_to_pwm_after_pull_in(machine_mock, clock):
+    """Test pull-in timer then PWM hold at profile duty"""
+    driver, pin = make_driver(machine_mock, 'relay_module')
+
+    driver.on()
+    timer = machine_mock.Timer.return_value
+    timer.init.assert_called_once()
+    assert timer.init.call_args.kwargs['period'] == 60
+
+    # Fire the one-shot timer
+    timer.init.call_args.kwargs['callback'](timer)
+    pwm_kwargs = machine_mock.PWM.call_args.kwargs
+    assert pwm_kwargs['duty_u16'] == 45 * 65535 // 100
+    assert pwm_kwargs['freq'] == 20000
+
+    clock.now = 5000
+    driver.off()
+
+    machine_mock.PWM.return_value.deinit.assert_called_once()
+    pin.init.assert_called_once()
+    pin.value.assert_called_with(0)
+    # 60ms at full power + 4940ms at 45%
+    assert driver.last_mas == pytest.approx(80 * (60 + 4940 * 0.45) / 1000)
+
+
+def test_economizer_saves_energy(machine_mock, clock):
+    """Test economizer spends less than full drive for the same window"""
+    full, _ = make_driver(machine_mock, 'full')
+    eco, _ = make_driver(machine_mock, 'relay_module')
+
+    for driver in (full, eco):
+        clock.now = 0
+        driver.on()
+        clock.now = 5000
+        driver.off()
+
+    assert eco.last_mas < full.last_mas * 0.5
+
+
+def test_hold_duty_override(machine_mock, clock):
+    """Test configurable hold duty"""
+    driver, _ = make_driver(machine_mock, 'solenoid_6v', hold_duty=60)
+
+    driver.on()
+    timer = machine_mock.Timer.return_value
+    timer.init.call_args.kwargs['callback'](timer)
+
+    assert machine_mock.PWM.call_args.kwargs['duty_u16'] == 60 * 65535 // 100
+
+
+def test_totals_accumulate(machine_mock, clock):
+    """Test energy counters across unlocks"""
+    driver, _ = make_driver(machine_mock, 'full')
+
+    for _ in range(3):
+        clock.now = 0
+        driver.on()
+        clock.now = 1000
+        driver.off()
+
+    assert driver.activations == 3
+    assert driver.total_mas == pytest.approx(3 * 80.0)
+    assert "N:3" in driver.status()
+
+
+def test_off_when_idle_does_not_count(machine_mock, clock):
+    """Test off() without on() adds no energy"""
+    driver, _ = make_driver(machine_mock, 'full')
+
+    driver.off()
+
+    assert driver.activations == 0
+    assert driver.is_on() is False
+
+
+def test_unknown_profile_rejected(machine_mock):
+    """Test invalid profile names"""
+    with pytest.raises(ValueError):
+        make_driver(machine_mock, 'turbo')
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
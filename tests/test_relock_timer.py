@@ -0,0 +1,133 @@
+"""
+Unit tests for hardware-timer relock
+Uses mocks to simulate machine.Timer and the ticks clock
+"""
+
+import sys
+import pytest
+from unittest.mock import Mock, MagicMock
+
+
+@pytest.fixture
+def machine_mock(monkeypatch):
+    machine = MagicMock()
+    machine.Timer.ONE_SHOT = 0
+    monkeypatch.setitem(sys.modules, 'machine', machine)
+    monkeypatch.delitem(sys.modules, 'relock_timer', raising=False)
+    return machine
+
+
+def fire(machine_mock):
+    timer = machine_mock.Timer.return_value
+    timer.init.call_args.kwargs['callback'](timer)
+
+
+def test_arm_schedules_one_shot(machine_mock, clock):
+    """Test arming programs the timer for the open window"""
+    from relock_timer import RelockTimer
+
+    callback = Mock()
+    relock = RelockTimer(callback)
+    relock.arm(5)
+
+    timer = machine_mock.Timer.return_value
+    assert timer.init.call_args.kwargs['period'] == 5000
+    assert relock.armed() is True
+
+    clock.now = 1200
+    assert relock.remaining_ms() == 3800
+
+
+def test_fire_calls_close(machine_mock, clock):
+    """Test the timer callback relocks and disarms"""
+    from relock_timer import RelockTimer
+
+    callback = Mock()
+    relock = RelockTimer(callback)
+    relock.arm(5)
+    fire(machine_mock)
+
+    callback.assert_called_once()
+    assert relock.armed() is False
+    assert relock.remaining_ms() == 0
+
+
+def test_extend_moves_deadline(machine_mock, clock):
+    """Test extending the window re-programs the timer"""
+    from relock_timer import RelockTimer
+
+    relock = RelockTimer(Mock())
+    relock.arm(5)
+    clock.now = 2000
+
+    remaining = relock.extend(10)
+
+    assert remaining == 13000
+    timer = machine_mock.Timer.return_value
+    assert timer.init.call_args.kwargs['period'] == 13000
+
+
+def test_extend_is_capped(machine_mock, clock):
+    """Test the maximum open time bound"""
+    from relock_timer import RelockTimer
+
+    relock = RelockTimer(Mock())
+    relock.arm(50)
+
+    assert relock.extend(30, max_seconds=60) == 60000
+
+
+def test_extend_cap_counts_from_unlock(machine_mock, clock):
+    """Test repeated extends cannot hold the lock open past the cap"""
+    from relock_timer import RelockTimer
+
+    relock = RelockTimer(Mock())
+    relock.arm(5)
+    for now in (4000, 30000, 59000):
+        clock.now = now
+        relock.extend(60, max_seconds=60)
+
+    assert relock.remaining_ms() == 1000
+
+    # Never shortens the window either
+    clock.now = 59500
+    assert relock.extend(60, max_seconds=60) == 500
+
+
+def test_extend_rejects_non_positive(machine_mock, clock):
+    """Test zero or negative seconds are refused, not used to shorten"""
+    from relock_timer import RelockTimer
+
+    relock = RelockTimer(Mock())
+    relock.arm(5)
+
+    for seconds in (0, -3):
+        with pytest.raises(ValueError):
+            relock.extend(seconds)
+    assert relock.remaining_ms() == 5000
+
+
+def test_extend_when_closed_does_nothing(machine_mock, clock):
+    """Test extend() on a closed lock"""
+    from relock_timer import RelockTimer
+
+    relock = RelockTimer(Mock())
+
+    assert relock.extend(10) == 0
+    machine_mock.Timer.return_value.init.assert_not_called()
+
+
+def test_cancel(machine_mock, clock):
+    """Test cancelling the deadline stops the timer"""
+    from relock_timer import RelockTimer
+
+    relock = RelockTimer(Mock())
+    relock.arm(5)
+    relock.cancel()
+
+    machine_mock.Timer.return_value.deinit.assert_called_once()
+    assert relock.armed() is False
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
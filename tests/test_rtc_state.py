@@ -0,0 +1,81 @@
+"""
+Unit tests for RTC user-memory state
+Uses a fake RTC that keeps memory between instances (deep sleep)
+"""
+
+import sys
+import pytest
+from unittest.mock import Mock
+
+
+class FakeRTC:
+    def __init__(self):
+        self.data = b""
+
+    def memory(self, data=None):
+        if data is None:
+            return self.data
+        self.data = bytes(data)
+
+
+@pytest.fixture(autouse=True)
+def mock_micropython_modules(monkeypatch):
+    """Mock MicroPython-specific modules"""
+    monkeypatch.setitem(sys.modules, 'machine', Mock())
+    monkeypatch.delitem(sys.modules, 'rtc_state', raising=False)
+
+
+LAYOUT = (('idle', 10), ('throttle', 6))
+
+
+def test_cold_boot_is_zeroed():
+    """Test empty RTC memory starts with zeroed regions"""
+    from rtc_state import RtcState
+
+    state = RtcState(LAYOUT, FakeRTC())
+
+    assert state.restored is False
+    assert bytes(state.region('idle')) == bytes(10)
+    assert len(state.region('throttle')) == 6
+
+
+def test_regions_survive_save():
+    """Test data written to a region is restored after deep sleep"""
+    from rtc_state import RtcState
+
+    rtc = FakeRTC()
+    state = RtcState(LAYOUT, rtc)
+    state.region('throttle')[0] = 42
+    state.region('idle')[9] = 7
+    state.save()
+
+    restored = RtcState(LAYOUT, rtc)
+    assert restored.restored is True
+    assert restored.region('throttle')[0] == 42
+    assert restored.region('idle')[9] == 7
+
+
+def test_layout_change_discards_memory():
+    """Test new firmware with a different layout starts clean"""
+    from rtc_state import RtcState
+
+    rtc = FakeRTC()
+    state = RtcState(LAYOUT, rtc)
+    state.region('idle')[0] = 1
+    state.save()
+
+    changed = RtcState((('idle', 12),), rtc)
+    assert changed.restored is False
+    assert changed.region('idle')[0] == 0
+
+
+def test_layout_too_large():
+    """Test layouts beyond RTC user memory are rejected"""
+    from rtc_state import RtcState
+
+    with pytest.raises(ValueError):
+        RtcState((('big', 4096),), FakeRTC())
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,108 @@
+"""
+Unit tests for brute-force throttling
+Uses a fake wall clock instead of the ESP32 RTC
+"""
+
+import pytest
+
+
+def make(clock, state=None, **kwargs):
+    from throttle import Throttle, STATE_SIZE
+    return Throttle(state if state is not None else bytearray(STATE_SIZE), clock=clock, **kwargs)
+
+
+def test_backoff_doubles_and_caps(clock):
+    """Test free attempts, then base_s doubling up to max_s"""
+    from throttle import backoff_s
+
+    assert [backoff_s(n, 3, 30, 200) for n in range(1, 7)] == [0, 0, 30, 60, 120, 200]
+    assert backoff_s(1000, 3, 30, 3600) == 3600
+
+
+def test_lockout_rejects_until_deadline(clock):
+    """Test a lockout counts down on the clock and then lets attempts in"""
+    from throttle import KEYPAD
+
+    guard = make(clock, free=2, base_s=30)
+    assert guard.failed(KEYPAD) == 0
+    assert guard.failed(KEYPAD) == 30
+    clock.sleep(10)
+    assert guard.retry_after(KEYPAD) == 20
+
+    clock.sleep(20)
+    assert guard.retry_after(KEYPAD) == 0
+    assert guard.failed(KEYPAD) == 60  # Still over free, so it doubles
+
+
+def test_success_resets(clock):
+    """Test a right PIN clears the channel's failures"""
+    from throttle import KEYPAD
+
+    guard = make(clock, free=3)
+    guard.failed(KEYPAD)
+    guard.failed(KEYPAD)
+    guard.succeeded(KEYPAD)
+
+    assert guard.failures(KEYPAD) == 0
+    assert guard.failed(KEYPAD) == 0
+
+
+def test_channels_are_separate(clock):
+    """Test keypad failures do not lock BLE out"""
+    from throttle import KEYPAD, BLE
+
+    guard = make(clock, free=1)
+    guard.failed(KEYPAD)
+
+    assert guard.retry_after(KEYPAD) == 30
+    assert guard.retry_after(BLE) == 0
+
+
+def test_connection_backoff(clock):
+    """Test one connection is locked out while others and the channel still work"""
+    from throttle import BLE, BLE_FACTOR
+
+    guard = make(clock, free=2)
+    guard.failed(BLE, conn=1)
+    assert guard.failed(BLE, conn=1) == 30
+    assert guard.retry_after(BLE, conn=1) == 30
+    assert guard.retry_after(BLE, conn=2) == 0
+
+    # Reconnecting only resets the connection, the channel keeps counting
+    clock.sleep(1000)
+    guard.drop(1)
+    for conn in range(2, 2 + BLE_FACTOR):
+        guard.failed(BLE, conn=conn)
+        guard.failed(BLE, conn=conn)
+    assert guard.retry_after(BLE, conn=9) > 0
+
+
+def test_deadlines_survive_restart(clock):
+    """Test channel state is written to the region and read back"""
+    from throttle import KEYPAD, STATE_SIZE
+
+    state = bytearray(STATE_SIZE)
+    saves = []
+    guard = make(clock, state, free=1, save=lambda: saves.append(1))
+    guard.failed(KEYPAD)
+    assert saves
+
+    clock.sleep(5)
+    restored = make(clock, bytes(state), free=1)
+    assert restored.failures(KEYPAD) == 1
+    assert restored.retry_after(KEYPAD) == 25
+
+
+def test_clock_set_backwards_is_capped(clock):
+    """Test a clock jump cannot lengthen a lockout past max_s"""
+    from throttle import KEYPAD
+
+    guard = make(clock, free=1, base_s=30, max_s=300)
+    guard.failed(KEYPAD)
+    clock.epoch -= 100000
+
+    assert guard.retry_after(KEYPAD) == 300
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
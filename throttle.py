@@ -0,0 +1,115 @@
+"""
+Brute-force throttling for ESP32 MicroPython
+Exponential backoff per channel and per BLE connection, never blocks the loop
+"""
+
+from micropython import const
+import struct
+import time
+
+# Channels (persisted in the RTC region)
+KEYPAD = const(0)
+BLE = const(1)
+CHANNELS = const(2)
+
+MAX_CONNS = const(4)       # Connection entries kept, the oldest is dropped
+BLE_FACTOR = const(3)      # The BLE channel allows free * BLE_FACTOR across connections
+MAX_SHIFT = const(16)
+
+# RTC region: per channel failures (uint16) and deadline (uint32 s, 0 = none)
+_SLOT = "<HI"
+_SLOT_SIZE = const(6)
+STATE_SIZE = const(12)
+
+
+def backoff_s(failures, free, base_s, max_s):
+    """Lockout after failures: none while under free, then base_s doubling"""
+    if failures < free:
+        return 0
+    return min(base_s << min(failures - free, MAX_SHIFT), max_s)
+
+
+class Throttle:
+    """Failed-attempt counters with lockout deadlines
+
+    A failure on a BLE connection counts on that connection and on the
+    BLE channel, so one client is backed off after free failures while
+    reconnecting only buys BLE_FACTOR times as many. Deadlines are wall
+    clock seconds (the RTC keeps counting in deep sleep), written to the
+    state region on every change so a lockout survives sleep and reset.
+    Connection entries live in RAM; drop() them on disconnect.
+    """
+
+    def __init__(self, state, free=3, base_s=30, max_s=3600, clock=time.time, save=None):
+        self._state = state
+        self.free = free
+        self.base_s = base_s
+        self.max_s = max_s
+        self._clock = clock
+        self._save = save
+        self._failures = [0] * CHANNELS
+        self._deadlines = [0] * CHANNELS
+        for ch in range(CHANNELS):
+            self._failures[ch], self._deadlines[ch] = struct.unpack_from(_SLOT, state, ch * _SLOT_SIZE)
+        self._conns = {}  # conn_handle: [failures, deadline]
+
+    def _remaining(self, deadline):
+        if not deadline:
+            return 0
+        # A clock set backwards must not stretch a lockout past max_s
+        return min(max(deadline - self._clock(), 0), self.max_s)
+
+    def retry_after(self, channel, conn=None):
+        """Seconds until the next attempt is accepted, 0 if it is now"""
+        wait = self._remaining(self._deadlines[channel])
+        entry = self._conns.get(conn) if conn is not None else None
+        if entry is not None:
+            wait = max(wait, self._remaining(entry[1]))
+        return wait
+
+    def failures(self, channel, conn=None):
+        if conn is not None:
+            entry = self._conns.get(conn)
+            return entry[0] if entry else 0
+        return self._failures[channel]
+
+    def failed(self, channel, conn=None):
+        """Count a wrong attempt; returns the retry_after it causes"""
+        now = self._clock()
+        free = self.free * BLE_FACTOR if conn is not None else self.free
+        self._failures[channel] += 1
+        wait = backoff_s(self._failures[channel], free, self.base_s, self.max_s)
+        self._deadlines[channel] = now + wait if wait else 0
+        if conn is not None:
+            entry = self._conns.pop(conn, None) or [0, 0]
+            if len(self._conns) >= MAX_CONNS:
+                del self._conns[next(iter(self._conns))]
+            self._conns[conn] = entry  # Most recent last
+            entry[0] += 1
+            conn_wait = backoff_s(entry[0], self.free, self.base_s, self.max_s)
+            entry[1] = now + conn_wait if conn_wait else 0
+            wait = max(wait, conn_wait)
+        self._write(channel)
+        return wait
+
+    def succeeded(self, channel, conn=None):
+        if conn is not None:
+            self._conns.pop(conn, None)
+        if self._failures[channel] or self._deadlines[channel]:
+            self._failures[channel] = 0
+            self._deadlines[channel] = 0
+            self._write(channel)
+
+    def drop(self, conn):
+        """Forget a connection (its failures still count on the channel)"""
+        self._conns.pop(conn, None)
+
+    def _write(self, channel):
+        struct.pack_into(_SLOT, self._state, channel * _SLOT_SIZE,
+                         min(self._failures[channel], 0xFFFF), self._deadlines[channel])
+        if self._save is not None:
+            self._save()
+
+    def status(self):
+        return (f"KEYPAD:{self._failures[KEYPAD]}/{self.retry_after(KEYPAD)}s,"
+                f"BLE:{self._failures[BLE]}/{self.retry_after(BLE)}s,CONNS:{len(self._conns)}")